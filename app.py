@@ -4,6 +4,7 @@ import os
 import tempfile
 from werkzeug.utils import secure_filename
 from legal_name_comparison import LegalNameComparator
+from serving import request_model_reload
 import json
 import plotly.graph_objs as go
 import plotly.utils
@@ -20,6 +21,19 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 # Global variable to store the trained model
 comparator = None
 
+def load_active_model():
+    """Load the last trained model, if there is one"""
+    global comparator
+    
+    model_path = os.path.join(app.config['UPLOAD_FOLDER'], 'trained_model.pkl')
+    if not os.path.exists(model_path):
+        return False
+    
+    new_comparator = LegalNameComparator()
+    new_comparator.load_model(model_path)
+    comparator = new_comparator
+    return True
+
 def allowed_file(filename):
     """Check if uploaded file has allowed extension"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'xlsx', 'xls'}
@@ -88,6 +102,9 @@ def upload_file():
         model_path = os.path.join(app.config['UPLOAD_FOLDER'], 'trained_model.pkl')
         comparator.save_model(model_path)
         
+        # Have the other workers pick up the new model when running under serve.py
+        request_model_reload()
+        
         # Get feature importance
         importance = comparator.get_feature_importance()
         
@@ -8,6 +8,7 @@ import os
 import json
 import logging
 import time
+import uuid
 from datetime import datetime
 from functools import wraps
 import pandas as pd
@@ -21,6 +22,9 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import secrets
 
 from legal_name_comparison import LegalNameComparator
+from feedback_store import FeedbackStore, GroupCommitBuffer
+from request_profiler import ProfileStore, profile_request, track_memory, memory_stage
+from serving import request_model_reload
 
 # Configure logging
 logging.basicConfig(
@@ -37,6 +41,14 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(32))
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MODEL_FOLDER'] = 'models'
 
+# Feedback group commit: flush every N items or after M milliseconds
+app.config['FEEDBACK_FLUSH_MAX_ITEMS'] = int(os.environ.get('FEEDBACK_FLUSH_MAX_ITEMS', 100))
+app.config['FEEDBACK_FLUSH_INTERVAL_MS'] = int(os.environ.get('FEEDBACK_FLUSH_INTERVAL_MS', 5))
+
+# Request profiling (?profile=1, admins only)
+app.config['PROFILE_FOLDER'] = os.environ.get('PROFILE_FOLDER', 'profiles')
+app.config['PROFILE_SAMPLE_INTERVAL_MS'] = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 5))
+
 # Authentication configuration
 app.config['ADMIN_USERNAME'] = os.environ.get('ADMIN_USERNAME', 'admin')
 app.config['ADMIN_PASSWORD'] = os.environ.get('ADMIN_PASSWORD', 'admin123')  # Change in production
@@ -62,127 +74,63 @@ CORS(app)
 comparator = None
 
 # Database setup
+feedback_store = FeedbackStore('feedback.db')
+feedback_buffer = GroupCommitBuffer(
+    feedback_store.save_feedback_batch,
+    max_items=app.config['FEEDBACK_FLUSH_MAX_ITEMS'],
+    max_delay_ms=app.config['FEEDBACK_FLUSH_INTERVAL_MS'],
+    name='feedback-writer'
+)
+
+profile_store = ProfileStore(app.config['PROFILE_FOLDER'])
+
 def init_db():
     """Initialize SQLite database for feedback"""
-    conn = sqlite3.connect('feedback.db')
-    cursor = conn.cursor()
-    
-    # Create feedback table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS feedback (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            prediction_id TEXT,
-            name1 TEXT NOT NULL,
-            name2 TEXT NOT NULL,
-            original_prediction BOOLEAN NOT NULL,
-            user_correction BOOLEAN NOT NULL,
-            confidence_score REAL,
-            feedback_text TEXT,
-            processed BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create model versions table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS model_versions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            version TEXT NOT NULL,
-            accuracy REAL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_active BOOLEAN DEFAULT FALSE
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    feedback_store.init_schema()
 
 def get_db_connection():
-    """Get database connection"""
-    return sqlite3.connect('feedback.db')
+    """Get this thread's reusable database connection"""
+    return feedback_store.connection()
 
 # Feedback collection
 def save_feedback(name1, name2, original_prediction, user_correction, confidence_score, feedback_text=""):
-    """Save user feedback to database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO feedback (name1, name2, original_prediction, user_correction, confidence_score, feedback_text)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (name1, name2, original_prediction, user_correction, confidence_score, feedback_text))
-    
-    feedback_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    
-    return feedback_id
+    """Save user feedback to database, returning once its group commit is durable"""
+    return feedback_buffer.submit(
+        (name1, name2, original_prediction, user_correction, confidence_score, feedback_text)
+    ).wait()
 
 def get_unprocessed_feedback(limit=100):
     """Get unprocessed feedback for retraining"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT name1, name2, original_prediction, user_correction, confidence_score
-        FROM feedback 
-        WHERE processed = FALSE
-        ORDER BY created_at DESC
-        LIMIT ?
-    ''', (limit,))
-    
-    feedback = cursor.fetchall()
-    conn.close()
-    
-    return feedback
+    return feedback_store.get_unprocessed_feedback(limit)
 
 def mark_feedback_processed(feedback_ids):
     """Mark feedback as processed"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    return feedback_store.mark_feedback_processed(feedback_ids)
+
+def load_active_model():
+    """Load the most recently saved model from the model folder, if there is one"""
+    global comparator
     
-    for feedback_id in feedback_ids:
-        cursor.execute('UPDATE feedback SET processed = TRUE WHERE id = ?', (feedback_id,))
+    folder = app.config['MODEL_FOLDER']
+    if not os.path.isdir(folder):
+        return False
+    model_files = [os.path.join(folder, name) for name in os.listdir(folder) if name.endswith('.pkl')]
+    if not model_files:
+        return False
     
-    conn.commit()
-    conn.close()
+    new_comparator = LegalNameComparator()
+    new_comparator.load_model(max(model_files, key=os.path.getmtime))
+    comparator = new_comparator
+    return True
 
 def save_model_version(accuracy):
     """Save model version information"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Deactivate previous model
-    cursor.execute('UPDATE model_versions SET is_active = FALSE')
-    
-    # Save new model version
-    version = datetime.now().strftime('%Y%m%d_%H%M%S')
-    cursor.execute('''
-        INSERT INTO model_versions (version, accuracy, is_active)
-        VALUES (?, ?, TRUE)
-    ''', (version, accuracy))
-    
-    model_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    
-    return model_id
+    return feedback_store.save_model_version(accuracy)
 
 # Retraining logic
 def should_retrain_model():
     """Check if model should be retrained based on feedback"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Count unprocessed feedback
-    cursor.execute('SELECT COUNT(*) FROM feedback WHERE processed = FALSE')
-    unprocessed_count = cursor.fetchone()[0]
-    
-    # Count total feedback
-    cursor.execute('SELECT COUNT(*) FROM feedback')
-    total_feedback = cursor.fetchone()[0]
-    
-    conn.close()
+    unprocessed_count, total_feedback = feedback_store.feedback_counts()
     
     logger.info(f"Feedback check: {unprocessed_count} unprocessed, {total_feedback} total")
     
@@ -236,16 +184,13 @@ def retrain_model_with_feedback():
         
         # Update global comparator
         comparator = new_comparator
+        request_model_reload()
         
         # Save model version
         save_model_version(accuracy)
         
         # Mark feedback as processed
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE feedback SET processed = TRUE WHERE processed = FALSE')
-        conn.commit()
-        conn.close()
+        feedback_store.mark_all_processed()
         
         logger.info(f"Model retrained with {len(feedback_data)} feedback items. New accuracy: {accuracy:.4f}")
         return True
@@ -263,6 +208,31 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def is_admin():
+    """Whether the logged-in user has the admin role"""
+    return session.get('role') == 'admin'
+
+def admin_required(f):
+    """Decorator to require the admin role"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def profiled(endpoint):
+    """Profile the view when an admin passes ?profile=1"""
+    return profile_request(
+        endpoint, profile_store, is_admin,
+        current_user=lambda: session.get('username'),
+        interval_ms=app.config['PROFILE_SAMPLE_INTERVAL_MS']
+    )
+
+def memory_tracked(endpoint):
+    """Trace allocations per stage when an admin passes ?memory=1"""
+    return track_memory(endpoint, is_admin)
+
 def init_auth_db():
     """Initialize authentication database"""
     conn = sqlite3.connect('auth.db')
@@ -296,8 +266,7 @@ def health_check():
     """Health check endpoint"""
     try:
         # Check database connection
-        conn = get_db_connection()
-        conn.close()
+        get_db_connection().execute('SELECT 1')
         
         return jsonify({
             'status': 'healthy',
@@ -368,6 +337,8 @@ def index():
 
 @app.route('/upload', methods=['POST'])
 @login_required
+@profiled('upload')
+@memory_tracked('upload')
 def upload_file():
     """Handle file upload and model training"""
     global comparator
@@ -385,12 +356,15 @@ def upload_file():
             return jsonify({'error': 'Invalid file type. Please upload Excel file'}), 400
         
         # Save uploaded file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        with memory_stage('upload'):
+            filename = secure_filename(file.filename)
+            # Unique path per request so concurrent uploads of the same file name don't collide
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
+            file.save(filepath)
         
         # Read Excel file
-        df = pd.read_excel(filepath)
+        with memory_stage('parse'):
+            df = pd.read_excel(filepath)
         logger.info(f"Processing file: {filename}, Shape: {df.shape}")
         
         # Validate required columns
@@ -404,13 +378,23 @@ def upload_file():
         
         # Initialize comparator and train model
         comparator = LegalNameComparator()
-        X, y = comparator.create_training_data(df)
+        with memory_stage('features'):
+            X, y = comparator.create_training_data(df)
         
         if len(X) == 0:
             return jsonify({'error': 'No valid data pairs found'}), 400
         
         # Train model
-        accuracy = comparator.train_model(X, y)
+        with memory_stage('training'):
+            accuracy = comparator.train_model(X, y)
+        
+        # Save model so other workers and restarts can load it
+        model_path = os.path.join(
+            app.config['MODEL_FOLDER'], f"model_upload_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pkl"
+        )
+        os.makedirs(app.config['MODEL_FOLDER'], exist_ok=True)
+        comparator.save_model(model_path)
+        request_model_reload()
         
         # Save model version
         save_model_version(accuracy)
@@ -430,6 +414,8 @@ def upload_file():
 
 @app.route('/predict', methods=['POST'])
 @login_required
+@profiled('predict')
+@memory_tracked('predict')
 def predict():
     """Handle prediction requests"""
     global comparator
@@ -443,12 +429,15 @@ def predict():
             return jsonify({'error': 'No file selected'}), 400
         
         # Save uploaded file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        with memory_stage('upload'):
+            filename = secure_filename(file.filename)
+            # Unique path per request so concurrent uploads of the same file name don't collide
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
+            file.save(filepath)
         
         # Read Excel file
-        df = pd.read_excel(filepath)
+        with memory_stage('parse'):
+            df = pd.read_excel(filepath)
         
         # Validate required columns
         required_columns = ['name1', 'name2']
@@ -480,22 +469,23 @@ def predict():
             name1_col = 0
             name2_col = 1
         
-        for _, row in df.iterrows():
-            name1 = str(row[name1_col])
-            name2 = str(row[name2_col])
+        with memory_stage('predict'):
+            for _, row in df.iterrows():
+                name1 = str(row[name1_col])
+                name2 = str(row[name2_col])
             
-            prediction, probabilities = comparator.predict_materiality(name1, name2)
+                prediction, probabilities = comparator.predict_materiality(name1, name2)
             
-            result = {
-                'name1': name1,
-                'name2': name2,
-                'prediction': 'Material' if prediction else 'Immaterial',
-                'is_material': prediction,
-                'materiality_probability': float(probabilities[1]),
-                'immateriality_probability': float(probabilities[0]),
-                'prediction_id': f"{name1}_{name2}_{int(time.time())}"  # Simple ID generation
-            }
-            results.append(result)
+                result = {
+                    'name1': name1,
+                    'name2': name2,
+                    'prediction': 'Material' if prediction else 'Immaterial',
+                    'is_material': prediction,
+                    'materiality_probability': float(probabilities[1]),
+                    'immateriality_probability': float(probabilities[0]),
+                    'prediction_id': f"{name1}_{name2}_{int(time.time())}"  # Simple ID generation
+                }
+                results.append(result)
         
         # Generate summary
         total_predictions = len(results)
@@ -611,28 +601,14 @@ def submit_feedback():
 def get_feedback_stats():
     """Get feedback statistics"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get total feedback count
-        cursor.execute('SELECT COUNT(*) FROM feedback')
-        total_feedback = cursor.fetchone()[0]
-        
-        # Get unprocessed feedback count
-        cursor.execute('SELECT COUNT(*) FROM feedback WHERE processed = FALSE')
-        unprocessed_feedback = cursor.fetchone()[0]
-        
-        # Get feedback accuracy (how often user corrections differ from original predictions)
-        cursor.execute('''
-            SELECT COUNT(*) FROM feedback 
-            WHERE original_prediction != user_correction
-        ''')
-        corrections_count = cursor.fetchone()[0]
+        # Single aggregated scan, cached briefly and invalidated on feedback writes
+        stats = feedback_store.feedback_stats()
+        total_feedback = stats['total_feedback']
+        unprocessed_feedback = stats['unprocessed_feedback']
+        corrections_count = stats['corrections_count']
         
         correction_rate = (corrections_count / total_feedback * 100) if total_feedback > 0 else 0
         
-        conn.close()
-        
         return jsonify({
             'success': True,
             'stats': {
@@ -694,25 +670,7 @@ def debug_retrain():
 def get_model_versions():
     """Get model version history"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT version, accuracy, created_at, is_active
-            FROM model_versions
-            ORDER BY created_at DESC
-        ''')
-        
-        versions = []
-        for row in cursor.fetchall():
-            versions.append({
-                'version': row[0],
-                'accuracy': row[1],
-                'created_at': row[2],
-                'is_active': bool(row[3])
-            })
-        
-        conn.close()
+        versions = feedback_store.get_model_versions()
         
         return jsonify({
             'success': True,
@@ -723,7 +681,44 @@ def get_model_versions():
         logger.error(f"Model versions error: {str(e)}")
         return jsonify({'error': f'Error fetching model versions: {str(e)}'}), 500
 
-if __name__ == '__main__':
+@app.route('/admin/profiles', methods=['GET'])
+@login_required
+@admin_required
+def list_profiles():
+    """List stored request profiles, newest first"""
+    try:
+        limit = int(request.args.get('limit', 50))
+        return jsonify({
+            'success': True,
+            'profiles': profile_store.list(limit)
+        })
+    
+    except Exception as e:
+        logger.error(f"Profile list error: {str(e)}")
+        return jsonify({'error': f'Error listing profiles: {str(e)}'}), 500
+
+@app.route('/admin/profiles/<profile_id>', methods=['GET'])
+@login_required
+@admin_required
+def get_profile(profile_id):
+    """Get a profile's top-N summary, or its collapsed stacks with ?format=collapsed"""
+    if request.args.get('format') == 'collapsed':
+        path = profile_store.collapsed_path(profile_id)
+        if path is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        return send_file(path, mimetype='text/plain', as_attachment=True,
+                         download_name=f"{profile_id}.collapsed")
+    
+    summary = profile_store.get(profile_id)
+    if summary is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify({
+        'success': True,
+        'profile': summary
+    })
+
+def init_app():
+    """Create databases and working directories"""
     # Initialize database
     init_db()
     init_auth_db() # Initialize authentication database
@@ -731,6 +726,9 @@ if __name__ == '__main__':
     # Create uploads directory
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['MODEL_FOLDER'], exist_ok=True) # Ensure models directory exists
+
+if __name__ == '__main__':
+    init_app()
     
     # Run the application
     port = int(os.environ.get('PORT', 5001))
@@ -0,0 +1,1038 @@
+#!/usr/bin/env python3
+"""
+Asynchronous Legal Name Comparison Service
+asyncio variant of enterprise_app.py with the same routes and request/response
+contracts. Postgres (asyncpg) and Redis (redis.asyncio) are awaited on the event
+loop; Excel parsing, feature extraction, inference and training run in bounded
+executors so I/O waits never hold inference capacity.
+
+Run with: hypercorn async_app:app --bind 0.0.0.0:5001 --workers 4
+"""
+
+import os
+import io
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import wraps, partial
+
+import pandas as pd
+from quart import Quart, request, jsonify, send_file, g
+from quart_cors import cors
+import asyncpg
+import redis.asyncio as aioredis
+import jwt
+from werkzeug.utils import secure_filename
+import prometheus_client
+from prometheus_client import Counter, Histogram, Gauge
+
+from legal_name_comparison import LegalNameComparator, source_records
+from batch_scorer import BatchScorer
+from blocking import MinHashLSH, find_duplicates
+from registry_index import RegistryIndex
+from clustering import cluster_pairs, group_clusters
+from snapshot_diff import prepare_snapshot, diff_snapshots
+from cpu_budget import CpuBudget
+from monitoring import SystemMetricsSampler, StageTimer
+from request_profiler import ProfileStore
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('app.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Initialize Quart app
+app = Quart(__name__)
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
+app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+
+# Prediction persistence: 'copy' uses binary COPY, 'values' uses executemany INSERTs.
+# 'deferred' mode writes after the response has been returned.
+app.config['PREDICTION_WRITE_METHOD'] = os.environ.get('PREDICTION_WRITE_METHOD', 'copy')
+app.config['PREDICTION_WRITE_MODE'] = os.environ.get('PREDICTION_WRITE_MODE', 'sync')
+app.config['PREDICTION_WRITE_CHUNK_SIZE'] = int(os.environ.get('PREDICTION_WRITE_CHUNK_SIZE', 5000))
+
+# Profiles written by the synchronous apps can be browsed here too
+app.config['PROFILE_FOLDER'] = os.environ.get('PROFILE_FOLDER', 'profiles')
+
+# Reference registry index for nearest-name lookups (built with registry_index.py)
+app.config['REGISTRY_INDEX_PATH'] = os.environ.get('REGISTRY_INDEX_PATH', 'registry_index')
+
+# Rate limiting can be switched off for local load tests
+app.config['RATELIMIT_ENABLED'] = os.environ.get('RATELIMIT_ENABLED', 'true').lower() == 'true'
+
+# Executors for CPU-bound work: requests beyond this many wait in the executor queue
+app.config['CPU_EXECUTOR_WORKERS'] = int(os.environ.get('CPU_EXECUTOR_WORKERS', 2))
+app.config['TRAINING_EXECUTOR_WORKERS'] = int(os.environ.get('TRAINING_EXECUTOR_WORKERS', 1))
+
+# Connection pool size and how often to check the database for a newly promoted model
+app.config['DB_POOL_MIN_SIZE'] = int(os.environ.get('DB_POOL_MIN_SIZE', 2))
+app.config['DB_POOL_MAX_SIZE'] = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+app.config['MODEL_REFRESH_SECONDS'] = float(os.environ.get('MODEL_REFRESH_SECONDS', 30))
+
+# Enable CORS
+app = cors(app)
+
+# Connections are created per worker once the event loop is running
+db_pool = None
+redis_client = None
+
+cpu_executor = ThreadPoolExecutor(
+    max_workers=app.config['CPU_EXECUTOR_WORKERS'], thread_name_prefix='cpu-worker'
+)
+training_executor = ThreadPoolExecutor(
+    max_workers=app.config['TRAINING_EXECUTOR_WORKERS'], thread_name_prefix='training-worker'
+)
+
+# Each executor thread may be running inference at once
+cpu_budget = CpuBudget.from_env()
+cpu_budget.threads = app.config['CPU_EXECUTOR_WORKERS']
+
+# Initialize ML model
+comparator = None
+active_model_version = 'latest'
+
+# Registry index, memory-mapped on first lookup
+registry_index = None
+
+# Large prediction batches are scored across a persistent pool of scorer processes
+batch_scorer = BatchScorer.from_env()
+
+# Deferred prediction writes still running, and the model refresh loop
+background_tasks = set()
+model_refresh_task = None
+
+# Prometheus metrics
+REQUEST_COUNT = Counter('requests_total', 'Total requests', ['endpoint', 'method'])
+REQUEST_DURATION = Histogram('request_duration_seconds', 'Request duration')
+PREDICTION_COUNT = Counter('predictions_total', 'Total predictions', ['model_version'])
+PREDICTION_ACCURACY = Gauge('prediction_accuracy', 'Model accuracy')
+
+# System metrics are sampled by a background thread, never on the request path
+metrics_sampler = SystemMetricsSampler(
+    interval_seconds=float(os.environ.get('METRICS_SAMPLE_INTERVAL', 15))
+)
+
+async def run_cpu(func, *args, **kwargs):
+    """Run CPU-bound work on the bounded executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, partial(func, *args, **kwargs))
+
+async def run_training(func, *args, **kwargs):
+    """Run model training on its own executor so it cannot take every inference slot"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(training_executor, partial(func, *args, **kwargs))
+
+# Rate limiting
+class RateLimiter:
+    """Fixed-window rate limits counted in Redis, shared by every worker.
+
+    Limits use the flask_limiter notation ("10 per minute"). Routes without
+    their own limit get the default limits."""
+
+    PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+    def __init__(self, default_limits):
+        self.default_limits = [self.parse(spec) for spec in default_limits]
+
+    @classmethod
+    def parse(cls, spec):
+        count, _, period = spec.partition(' per ')
+        return int(count), cls.PERIODS[period.strip().rstrip('s')], spec
+
+    async def exceeded(self, scope, limits):
+        """First limit the caller has exceeded in this window, or None"""
+        if not app.config['RATELIMIT_ENABLED']:
+            return None
+        now = int(time.time())
+        try:
+            for count, seconds, spec in limits:
+                key = f"ratelimit:{scope}:{spec}:{request.remote_addr}:{now // seconds}"
+                async with redis_client.pipeline(transaction=True) as pipe:
+                    hits, _ = await pipe.incr(key).expire(key, seconds).execute()
+                if hits > count:
+                    return spec
+        except Exception as e:
+            # Fail open: an unavailable Redis should not take the API down
+            logger.error(f"Rate limit check failed: {str(e)}")
+        return None
+
+    def limit(self, spec):
+        """Decorator applying a route-specific limit instead of the defaults"""
+        limits = [self.parse(spec)]
+        def decorator(f):
+            @wraps(f)
+            async def decorated_function(*args, **kwargs):
+                exceeded = await self.exceeded(request.endpoint, limits)
+                if exceeded:
+                    return jsonify({'error': f'Rate limit exceeded: {exceeded}'}), 429
+                return await f(*args, **kwargs)
+            decorated_function.rate_limited = True
+            return decorated_function
+        return decorator
+
+limiter = RateLimiter(["200 per day", "50 per hour"])
+
+@app.before_request
+async def apply_default_limits():
+    """Apply the default limits to routes without their own"""
+    view = app.view_functions.get(request.endpoint)
+    if view is None or getattr(view, 'rate_limited', False):
+        return None
+    exceeded = await limiter.exceeded('default', limiter.default_limits)
+    if exceeded:
+        return jsonify({'error': f'Rate limit exceeded: {exceeded}'}), 429
+    return None
+
+# Authentication decorator
+def require_auth(f):
+    """Decorator to require authentication"""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        token = request.headers.get('Authorization')
+        if not token:
+            return jsonify({'error': 'No token provided'}), 401
+
+        token = token.replace('Bearer ', '')
+        try:
+            payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+            request.user = payload
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token expired'}), 401
+        except jwt.InvalidTokenError:
+            return jsonify({'error': 'Invalid token'}), 401
+
+        return await f(*args, **kwargs)
+    return decorated_function
+
+def is_admin():
+    """Whether the authenticated user has the admin role"""
+    user = getattr(request, 'user', None)
+    return bool(user) and user.get('role') == 'admin'
+
+def require_admin(f):
+    """Decorator to require the admin role (use after require_auth)"""
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        if not is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        return await f(*args, **kwargs)
+    return decorated_function
+
+profile_store = ProfileStore(app.config['PROFILE_FOLDER'])
+
+# Metrics decorator
+def track_metrics(endpoint):
+    """Decorator to track request metrics and per-stage latency"""
+    def decorator(f):
+        @wraps(f)
+        async def decorated_function(*args, **kwargs):
+            start_time = time.time()
+            g.stage_timer = StageTimer(endpoint, active_model_version)
+
+            try:
+                result = await f(*args, **kwargs)
+                duration = time.time() - start_time
+
+                REQUEST_COUNT.labels(endpoint=endpoint, method=request.method).inc()
+                REQUEST_DURATION.observe(duration)
+
+                return result
+            except Exception as e:
+                duration = time.time() - start_time
+                REQUEST_DURATION.observe(duration)
+                raise e
+            finally:
+                g.stage_timer.publish()
+
+        return decorated_function
+    return decorator
+
+def debug_requested():
+    """Whether the caller asked for debug details (?debug=1)"""
+    return request.args.get('debug', '').lower() in ('1', 'true', 'yes')
+
+def stage_response(payload):
+    """Serialize a JSON payload as the 'serialize' stage, adding the stage breakdown in debug mode"""
+    timer = g.stage_timer
+    if debug_requested():
+        payload['debug'] = {'stages_ms': timer.breakdown()}
+    with timer.stage('serialize'):
+        return jsonify(payload)
+
+async def read_upload(timer, excel_only=False, field='file', allow_csv=False, **read_options):
+    """Read an uploaded Excel (or, with allow_csv, CSV) file into a DataFrame; returns (df, error response)"""
+    files = await request.files
+    if field not in files:
+        return None, (jsonify({'error': 'No file uploaded' if field == 'file' else f'No {field} file uploaded'}), 400)
+
+    file = files[field]
+    if file.filename == '':
+        return None, (jsonify({'error': 'No file selected'}), 400)
+
+    # Validate file type
+    if excel_only and not file.filename.endswith(('.xlsx', '.xls')):
+        return None, (jsonify({'error': 'Invalid file type. Please upload Excel file'}), 400)
+
+    # Parse from memory: no shared upload path, so concurrent uploads cannot collide
+    with timer.stage('upload'):
+        content = file.read()
+
+    with timer.stage('parse'):
+        reader = pd.read_csv if allow_csv and file.filename.endswith('.csv') else pd.read_excel
+        df = await run_cpu(reader, io.BytesIO(content), **read_options)
+    logger.info(f"Processing file: {secure_filename(file.filename)}, Shape: {df.shape}")
+    return df, None
+
+# Health check endpoint
+@app.route('/health')
+async def health_check():
+    """Health check endpoint"""
+    try:
+        # Check database connection
+        await db_pool.fetchval("SELECT 1")
+
+        # Check Redis connection
+        await redis_client.ping()
+
+        return jsonify({
+            'status': 'healthy',
+            'timestamp': datetime.utcnow().isoformat(),
+            'version': '1.0.0'
+        })
+    except Exception as e:
+        logger.error(f"Health check failed: {str(e)}")
+        return jsonify({
+            'status': 'unhealthy',
+            'error': str(e),
+            'timestamp': datetime.utcnow().isoformat()
+        }), 500
+
+# Ready check endpoint
+@app.route('/ready')
+async def ready_check():
+    """Ready check endpoint for Kubernetes"""
+    return jsonify({'status': 'ready'})
+
+# Metrics endpoint for Prometheus
+@app.route('/metrics')
+async def metrics():
+    """Prometheus metrics endpoint"""
+    return prometheus_client.generate_latest()
+
+# Authentication endpoints
+@app.route('/auth/login', methods=['POST'])
+@track_metrics('auth_login')
+async def login():
+    """User login endpoint"""
+    data = await request.get_json()
+    email = data.get('email')
+    password = data.get('password')
+
+    if not email or not password:
+        return jsonify({'error': 'Email and password required'}), 400
+
+    try:
+        # In production, use proper password hashing
+        user = await db_pool.fetchrow(
+            "SELECT id, email, name, role FROM users WHERE email = $1 AND password = $2",
+            email, password  # Use proper password hashing in production
+        )
+
+        if user:
+            token = jwt.encode(
+                {
+                    'user_id': str(user['id']),
+                    'email': user['email'],
+                    'role': user['role'],
+                    'exp': datetime.utcnow() + timedelta(hours=24)
+                },
+                app.config['SECRET_KEY'],
+                algorithm='HS256'
+            )
+
+            return jsonify({
+                'token': token,
+                'user': {
+                    'id': str(user['id']),
+                    'email': user['email'],
+                    'name': user['name'],
+                    'role': user['role']
+                }
+            })
+        else:
+            return jsonify({'error': 'Invalid credentials'}), 401
+
+    except Exception as e:
+        logger.error(f"Login error: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+# Main application endpoints
+@app.route('/')
+async def index():
+    """Serve the main application"""
+    return await send_file('templates/index.html')
+
+@app.route('/api/upload', methods=['POST'])
+@require_auth
+@limiter.limit("10 per minute")
+@track_metrics('upload')
+async def upload_file():
+    """Handle file upload and model training"""
+    global comparator, active_model_version
+
+    try:
+        timer = g.stage_timer
+        df, error = await read_upload(timer, excel_only=True)
+        if error:
+            return error
+
+        # Validate required columns
+        required_columns = ['source1', 'source2', 'source3', 'is_material']
+        missing_columns = [col for col in required_columns if col not in df.columns]
+
+        if missing_columns:
+            return jsonify({
+                'error': f'Missing required columns: {", ".join(missing_columns)}'
+            }), 400
+
+        # Initialize comparator and train model
+        new_comparator = LegalNameComparator(cpu_budget=cpu_budget)
+        with timer.stage('features'):
+            X, y = await run_training(new_comparator.create_training_data, df)
+
+        if len(X) == 0:
+            return jsonify({'error': 'No valid data pairs found'}), 400
+
+        # Train model
+        with timer.stage('training'):
+            accuracy = await run_training(new_comparator.train_model, X, y)
+
+        # Save model to database
+        with timer.stage('persistence'):
+            model_id, version = await save_model_to_db(new_comparator, accuracy, request.user['user_id'])
+        comparator = new_comparator
+        active_model_version = version
+        timer.model_version = active_model_version
+
+        # Log prediction metrics
+        PREDICTION_ACCURACY.set(accuracy)
+
+        return stage_response({
+            'success': True,
+            'message': f'Model trained successfully with {len(X)} data pairs',
+            'accuracy': round(accuracy, 4),
+            'model_id': str(model_id)
+        })
+
+    except Exception as e:
+        logger.error(f"Upload error: {str(e)}")
+        return jsonify({'error': f'Error processing file: {str(e)}'}), 500
+
+def score_pairs(model, names1, names2, stage_timer):
+    """Score name pairs with the pool for large batches, in this thread otherwise"""
+    if batch_scorer.should_use(len(names1)):
+        return batch_scorer.predict_batch(model, names1, names2, stage_timer=stage_timer)
+    return model.predict_batch(names1, names2, stage_timer=stage_timer)
+
+@app.route('/api/predict', methods=['POST'])
+@require_auth
+@limiter.limit("100 per minute")
+@track_metrics('predict')
+async def predict():
+    """Handle prediction requests"""
+    try:
+        timer = g.stage_timer
+        df, error = await read_upload(timer)
+        if error:
+            return error
+
+        # Validate required columns
+        required_columns = ['name1', 'name2']
+        missing_columns = [col for col in required_columns if col not in df.columns]
+
+        if missing_columns:
+            return jsonify({
+                'error': f'Missing required columns: {", ".join(missing_columns)}'
+            }), 400
+
+        # Score with the model active when the request arrived, even if a refresh swaps it meanwhile
+        model, model_version = comparator, active_model_version
+        if model is None:
+            return jsonify({'error': 'No trained model available. Please train a model first.'}), 400
+
+        # Make predictions (normalize/features/inference, or scoring for pooled batches, are timed inside)
+        names1 = [str(name) for name in df['name1']]
+        names2 = [str(name) for name in df['name2']]
+        predictions, probabilities = await run_cpu(score_pairs, model, names1, names2, timer)
+
+        with timer.stage('response'):
+            results = []
+            for name1, name2, prediction, probability in zip(names1, names2, predictions, probabilities):
+                prediction = bool(prediction)
+                result = {
+                    'name1': name1,
+                    'name2': name2,
+                    'prediction': 'Material' if prediction else 'Immaterial',
+                    'is_material': prediction,
+                    'materiality_probability': float(probability[1]),
+                    'immateriality_probability': float(probability[0])
+                }
+                results.append(result)
+
+        # Save predictions to database
+        with timer.stage('persistence'):
+            if app.config['PREDICTION_WRITE_MODE'] == 'deferred':
+                task = asyncio.create_task(
+                    save_predictions_in_background(results, request.user['user_id'], model_version)
+                )
+                background_tasks.add(task)
+                task.add_done_callback(background_tasks.discard)
+            else:
+                await save_predictions_to_db(results, request.user['user_id'], model_version)
+
+        # Update metrics
+        PREDICTION_COUNT.labels(model_version=model_version).inc()
+
+        # Generate summary
+        total_predictions = len(results)
+        material_count = sum(1 for r in results if r['is_material'])
+        immaterial_count = total_predictions - material_count
+        material_percentage = (material_count / total_predictions * 100) if total_predictions > 0 else 0
+
+        return stage_response({
+            'success': True,
+            'results': results,
+            'summary': {
+                'total_predictions': total_predictions,
+                'material_count': material_count,
+                'immaterial_count': immaterial_count,
+                'material_percentage': round(material_percentage, 2)
+            }
+        })
+
+    except Exception as e:
+        logger.error(f"Prediction error: {str(e)}")
+        return jsonify({'error': f'Error processing predictions: {str(e)}'}), 500
+
+@app.route('/api/predict/records', methods=['POST'])
+@require_auth
+@track_metrics('predict_records')
+async def predict_records():
+    """Score every pair of source names within multi-source records, with a consensus per record"""
+    try:
+        timer = g.stage_timer
+
+        # JSON {"records": [[name, ...], ...]} or an Excel file with source1..sourceN columns
+        if request.is_json:
+            records = ((await request.get_json()) or {}).get('records')
+            if not isinstance(records, list) or not all(isinstance(r, list) for r in records):
+                return jsonify({'error': 'records must be a list of lists of names'}), 400
+            # Names are hashed and normalized as text; null entries count as blank sources
+            if not all(name is None or isinstance(name, (str, int, float)) for r in records for name in r):
+                return jsonify({'error': 'record names must be strings, numbers or null'}), 400
+        else:
+            df, error = await read_upload(timer)
+            if error:
+                return error
+            records = source_records(df)
+
+        model, model_version = comparator, active_model_version
+        if model is None:
+            return jsonify({'error': 'No trained model available. Please train a model first.'}), 400
+
+        results = await run_cpu(model.predict_records, records, stage_timer=timer)
+
+        PREDICTION_COUNT.labels(model_version=model_version).inc()
+
+        return stage_response({
+            'success': True,
+            'results': results,
+            'summary': {
+                'total_records': len(results),
+                'total_pairs': sum(len(r['pairs']) for r in results),
+                'material_records': sum(1 for r in results if r['consensus'] == 'Material'),
+                'immaterial_records': sum(1 for r in results if r['consensus'] == 'Immaterial')
+            }
+        })
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Record prediction error: {str(e)}")
+        return jsonify({'error': f'Error processing records: {str(e)}'}), 500
+
+@app.route('/api/dedupe', methods=['POST'])
+@require_auth
+@limiter.limit("10 per minute")
+@track_metrics('dedupe')
+async def dedupe():
+    """Find and score likely-duplicate pairs within one uploaded list of names"""
+    try:
+        timer = g.stage_timer
+        df, error = await read_upload(timer)
+        if error:
+            return error
+
+        if 'name' not in df.columns:
+            return jsonify({'error': 'Missing required columns: name'}), 400
+
+        model, model_version = comparator, active_model_version
+        if model is None:
+            return jsonify({'error': 'No trained model available. Please train a model first.'}), 400
+
+        # Blocking tuning: lower threshold finds more pairs and scores more candidates
+        lsh = MinHashLSH(
+            num_perm=int(request.args.get('num_perm', 128)),
+            threshold=float(request.args.get('threshold', 0.5))
+        )
+        min_similarity = request.args.get('min_similarity')
+        duplicates_only = request.args.get('duplicates_only', 'true').lower() == 'true'
+
+        names = df['name'].dropna().astype(str).tolist()
+        results, report = await run_cpu(
+            find_duplicates, model, names, lsh,
+            min_similarity=float(min_similarity) if min_similarity is not None else None,
+            recall_sample=int(request.args.get('recall_sample', 0)),
+            scorer=batch_scorer,
+            stage_timer=timer
+        )
+        if request.args.get('cluster', 'false').lower() == 'true':
+            # Group names into entities over the confident Immaterial pairs
+            with timer.stage('clustering'):
+                clusters, cluster_summary = await run_cpu(
+                    cluster_pairs, results, min_confidence=float(request.args.get('min_confidence', 0.5))
+                )
+            report['clusters'] = cluster_summary
+        else:
+            clusters = None
+        if duplicates_only:
+            results = [r for r in results if not r['is_material']]
+
+        PREDICTION_COUNT.labels(model_version=model_version).inc()
+
+        response = {
+            'success': True,
+            'results': results,
+            'summary': report
+        }
+        if clusters is not None:
+            response['clusters'] = group_clusters(clusters)
+        return stage_response(response)
+
+    except Exception as e:
+        logger.error(f"Dedupe error: {str(e)}")
+        return jsonify({'error': f'Error finding duplicates: {str(e)}'}), 500
+
+def get_registry_index():
+    """The registry index, opened on first use; None when none has been built"""
+    global registry_index
+    if registry_index is None and os.path.exists(os.path.join(app.config['REGISTRY_INDEX_PATH'], 'meta.json')):
+        registry_index = RegistryIndex.load(app.config['REGISTRY_INDEX_PATH'])
+    return registry_index
+
+@app.route('/api/registry/lookup', methods=['GET'])
+@require_auth
+@track_metrics('registry_lookup')
+async def registry_lookup():
+    """Find the registry names closest to a name, re-ranked by the model"""
+    try:
+        name = request.args.get('name', '').strip()
+        if not name:
+            return jsonify({'error': 'Name required'}), 400
+
+        model = comparator
+        if model is None:
+            return jsonify({'error': 'No trained model available. Please train a model first.'}), 400
+
+        index = get_registry_index()
+        if index is None:
+            return jsonify({'error': 'No registry index available'}), 400
+
+        results, summary = await run_cpu(
+            index.lookup, model, name,
+            k=int(request.args.get('k', 10)),
+            rerank=int(request.args.get('rerank', 20))
+        )
+
+        return stage_response({
+            'success': True,
+            'query': name,
+            'results': results,
+            'summary': summary
+        })
+
+    except Exception as e:
+        logger.error(f"Registry lookup error: {str(e)}")
+        return jsonify({'error': f'Error looking up name: {str(e)}'}), 500
+
+@app.route('/api/snapshots/diff', methods=['POST'])
+@require_auth
+@limiter.limit("10 per minute")
+@track_metrics('snapshot_diff')
+async def snapshot_diff():
+    """Flag entities whose legal name changed materially between two keyed snapshots"""
+    try:
+        timer = g.stage_timer
+        id_column = request.args.get('id_column', 'id')
+        name_column = request.args.get('name_column', 'name')
+
+        snapshots = {}
+        for field in ('previous', 'current'):
+            df, error = await read_upload(timer, field=field, allow_csv=True,
+                                          dtype={name_column: str}, keep_default_na=False)
+            if error:
+                return error
+            snapshots[field] = prepare_snapshot(df, id_column, name_column)
+
+        model, model_version = comparator, active_model_version
+        if model is None:
+            return jsonify({'error': 'No trained model available. Please train a model first.'}), 400
+
+        flagged, summary = await run_cpu(
+            diff_snapshots, model, snapshots['previous'], snapshots['current'],
+            min_probability=float(request.args.get('min_probability', 0.5)),
+            scorer=batch_scorer,
+            stage_timer=timer
+        )
+
+        PREDICTION_COUNT.labels(model_version=model_version).inc()
+
+        return stage_response({
+            'success': True,
+            'results': flagged.to_dict('records'),
+            'summary': summary
+        })
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Snapshot diff error: {str(e)}")
+        return jsonify({'error': f'Error comparing snapshots: {str(e)}'}), 500
+
+@app.route('/api/feedback', methods=['POST'])
+@require_auth
+@track_metrics('feedback')
+async def submit_feedback():
+    """Submit feedback on predictions"""
+    try:
+        data = await request.get_json()
+        prediction_id = data.get('prediction_id')
+        user_correction = data.get('user_correction')
+        confidence_score = data.get('confidence_score', 0.0)
+        feedback_text = data.get('feedback_text', '')
+
+        if not prediction_id or user_correction is None:
+            return jsonify({'error': 'Prediction ID and user correction required'}), 400
+
+        # Save feedback to database
+        feedback_id = await save_feedback_to_db(
+            prediction_id, user_correction, confidence_score, feedback_text, request.user['user_id']
+        )
+
+        return jsonify({
+            'success': True,
+            'feedback_id': str(feedback_id),
+            'message': 'Feedback submitted successfully'
+        })
+
+    except Exception as e:
+        logger.error(f"Feedback error: {str(e)}")
+        return jsonify({'error': f'Error submitting feedback: {str(e)}'}), 500
+
+@app.route('/api/analytics/daily', methods=['GET'])
+@require_auth
+@track_metrics('analytics_daily')
+async def get_daily_analytics():
+    """Get daily analytics"""
+    try:
+        days = int(request.args.get('days', 30))
+        model_version = request.args.get('model_version')
+
+        # Read pre-aggregated daily rollups rather than scanning raw predictions
+        results = await db_pool.fetch("""
+        SELECT
+            day as date,
+            SUM(total_predictions) as total_predictions,
+            SUM(confidence_sum) / NULLIF(SUM(total_predictions), 0) as avg_confidence,
+            SUM(material_count) as material_count,
+            SUM(immaterial_count) as immaterial_count
+        FROM prediction_daily_rollups
+        WHERE day >= CURRENT_DATE - $1::integer
+          AND ($2::varchar IS NULL OR model_version = $2)
+        GROUP BY day
+        ORDER BY day
+        """, days, model_version)
+
+        return jsonify({
+            'success': True,
+            'data': [daily_analytics_row(row) for row in results]
+        })
+
+    except Exception as e:
+        logger.error(f"Analytics error: {str(e)}")
+        return jsonify({'error': f'Error fetching analytics: {str(e)}'}), 500
+
+@app.route('/api/admin/profiles', methods=['GET'])
+@require_auth
+@require_admin
+async def list_profiles():
+    """List stored request profiles, newest first"""
+    try:
+        limit = int(request.args.get('limit', 50))
+        return jsonify({
+            'success': True,
+            'profiles': profile_store.list(limit)
+        })
+
+    except Exception as e:
+        logger.error(f"Profile list error: {str(e)}")
+        return jsonify({'error': f'Error listing profiles: {str(e)}'}), 500
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+@require_auth
+@require_admin
+async def get_profile(profile_id):
+    """Get a profile's top-N summary, or its collapsed stacks with ?format=collapsed"""
+    if request.args.get('format') == 'collapsed':
+        path = profile_store.collapsed_path(profile_id)
+        if path is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        return await send_file(path, mimetype='text/plain', as_attachment=True,
+                               attachment_filename=f"{profile_id}.collapsed")
+
+    summary = profile_store.get(profile_id)
+    if summary is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify({
+        'success': True,
+        'profile': summary
+    })
+
+# Database helper functions
+def read_model(model_path):
+    """Load a saved model file into a new comparator"""
+    new_comparator = LegalNameComparator(cpu_budget=cpu_budget)
+    new_comparator.load_model(model_path)
+    return new_comparator
+
+async def load_active_model():
+    """Load the most recent active model recorded in the database if it is not already loaded"""
+    global comparator, active_model_version
+
+    row = await db_pool.fetchrow("""
+        SELECT version, model_path FROM models
+        WHERE is_active
+        ORDER BY created_at DESC
+        LIMIT 1
+    """)
+
+    if row is None or not os.path.exists(row['model_path']):
+        return False
+    if comparator is not None and row['version'] == active_model_version:
+        return True
+
+    new_comparator = await run_training(read_model, row['model_path'])
+    comparator = new_comparator
+    active_model_version = row['version']
+    logger.info(f"Loaded model version {active_model_version}")
+    return True
+
+async def refresh_model_periodically():
+    """Pick up models promoted by other workers or processes"""
+    while True:
+        await asyncio.sleep(app.config['MODEL_REFRESH_SECONDS'])
+        try:
+            await load_active_model()
+        except Exception as e:
+            logger.error(f"Model refresh failed: {str(e)}")
+
+async def save_model_to_db(comparator, accuracy, user_id):
+    """Save model to database"""
+    # Save model file
+    version = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    model_path = f"models/model_{version}.pkl"
+    os.makedirs('models', exist_ok=True)
+    await run_training(comparator.save_model, model_path)
+
+    # Save to database
+    model_id = await db_pool.fetchval("""
+        INSERT INTO models (name, version, model_path, accuracy, created_at, is_active)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        RETURNING id
+    """,
+        'legal_name_comparison',
+        version,
+        model_path,
+        accuracy,
+        datetime.utcnow(),
+        True
+    )
+
+    return model_id, version
+
+PREDICTION_COLUMNS = ('user_id', 'name1', 'name2', 'prediction', 'confidence')
+
+def iter_prediction_chunks(results, user_id, chunk_size):
+    """Yield prediction rows in bounded chunks"""
+    chunk = []
+    for result in results:
+        chunk.append((
+            user_id,
+            result['name1'],
+            result['name2'],
+            result['is_material'],
+            result['materiality_probability']
+        ))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+async def copy_prediction_chunk(conn, rows):
+    """Stream a chunk of prediction rows into Postgres with binary COPY"""
+    await conn.copy_records_to_table('predictions', records=rows, columns=PREDICTION_COLUMNS)
+
+async def insert_prediction_chunk(conn, rows):
+    """Insert a chunk of prediction rows with a prepared multi-row INSERT"""
+    await conn.executemany(
+        "INSERT INTO predictions (%s) VALUES ($1, $2, $3, $4, $5)" % ', '.join(PREDICTION_COLUMNS),
+        rows
+    )
+
+def daily_analytics_row(row):
+    """JSON-ready daily rollup row; Postgres returns SUM over bigint as numeric (Decimal)"""
+    avg_confidence = row['avg_confidence']
+    return {
+        'date': row['date'],
+        'total_predictions': int(row['total_predictions']),
+        'avg_confidence': float(avg_confidence) if avg_confidence is not None else None,
+        'material_count': int(row['material_count']),
+        'immaterial_count': int(row['immaterial_count'])
+    }
+
+async def update_daily_rollup(conn, results, model_version):
+    """Fold a batch of predictions into today's rollup row for the model"""
+    material_count = sum(1 for r in results if r['is_material'])
+    confidence_sum = sum(float(r['materiality_probability']) for r in results)
+
+    await conn.execute("""
+        INSERT INTO prediction_daily_rollups
+            (day, model_version, total_predictions, confidence_sum, material_count, immaterial_count)
+        VALUES (CURRENT_DATE, $1, $2, $3, $4, $5)
+        ON CONFLICT (day, model_version) DO UPDATE SET
+            total_predictions = prediction_daily_rollups.total_predictions + EXCLUDED.total_predictions,
+            confidence_sum = prediction_daily_rollups.confidence_sum + EXCLUDED.confidence_sum,
+            material_count = prediction_daily_rollups.material_count + EXCLUDED.material_count,
+            immaterial_count = prediction_daily_rollups.immaterial_count + EXCLUDED.immaterial_count
+    """,
+        model_version,
+        len(results),
+        confidence_sum,
+        material_count,
+        len(results) - material_count
+    )
+
+async def save_predictions_to_db(results, user_id, model_version='latest'):
+    """Save predictions to database in chunks using COPY, falling back to INSERTs"""
+    chunk_size = app.config['PREDICTION_WRITE_CHUNK_SIZE']
+    write_chunk = copy_prediction_chunk
+    if app.config['PREDICTION_WRITE_METHOD'] != 'copy':
+        write_chunk = insert_prediction_chunk
+
+    async with db_pool.acquire() as conn:
+        try:
+            async with conn.transaction():
+                for rows in iter_prediction_chunks(results, user_id, chunk_size):
+                    await write_chunk(conn, rows)
+                if results:
+                    await update_daily_rollup(conn, results, model_version)
+        except asyncpg.PostgresError as e:
+            if write_chunk is not copy_prediction_chunk:
+                raise
+            # COPY can be unavailable behind some poolers/proxies; retry the batch with INSERTs
+            logger.warning(f"COPY failed, falling back to multi-row INSERT: {str(e)}")
+            async with conn.transaction():
+                for rows in iter_prediction_chunks(results, user_id, chunk_size):
+                    await insert_prediction_chunk(conn, rows)
+                if results:
+                    await update_daily_rollup(conn, results, model_version)
+
+async def save_predictions_in_background(results, user_id, model_version='latest'):
+    """Persist predictions after the response has been sent"""
+    try:
+        start_time = time.time()
+        await save_predictions_to_db(results, user_id, model_version)
+        logger.info(f"Saved {len(results)} predictions in {time.time() - start_time:.3f}s (deferred)")
+    except Exception as e:
+        logger.error(f"Deferred prediction save failed: {str(e)}")
+
+async def save_feedback_to_db(prediction_id, user_correction, confidence_score, feedback_text, user_id):
+    """Save feedback to database"""
+    return await db_pool.fetchval("""
+        INSERT INTO feedback (prediction_id, user_correction, confidence_score, feedback_text)
+        VALUES ($1, $2, $3, $4)
+        RETURNING id
+    """, prediction_id, user_correction, confidence_score, feedback_text)
+
+def init_app():
+    """Create working directories"""
+    # Create uploads directory
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+@app.before_serving
+async def startup():
+    """Open the database pool and Redis client, load the active model and start background work"""
+    global db_pool, redis_client, model_refresh_task
+    init_app()
+
+    db_pool = await asyncpg.create_pool(
+        host=os.environ.get('DB_HOST', 'localhost'),
+        database=os.environ.get('DB_NAME', 'legal_name_comparison'),
+        user=os.environ.get('DB_USER', 'postgres'),
+        password=os.environ.get('DB_PASSWORD', 'password'),
+        min_size=app.config['DB_POOL_MIN_SIZE'],
+        max_size=app.config['DB_POOL_MAX_SIZE']
+    )
+    redis_client = aioredis.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379'))
+
+    try:
+        if not await load_active_model():
+            logger.info("No trained model found")
+    except Exception as e:
+        logger.error(f"Error loading active model: {str(e)}")
+
+    model_refresh_task = asyncio.create_task(refresh_model_periodically())
+    metrics_sampler.ensure_running()
+
+@app.after_serving
+async def shutdown():
+    """Finish deferred writes and release connections and executors"""
+    model_refresh_task.cancel()
+    if background_tasks:
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+    await db_pool.close()
+    await redis_client.aclose()
+    batch_scorer.close()
+    cpu_executor.shutdown(wait=False)
+    training_executor.shutdown(wait=False)
+    metrics_sampler.stop()
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    # Run the application
+    config = Config()
+    config.bind = [f"0.0.0.0:{int(os.environ.get('PORT', 5001))}"]
+    asyncio.run(serve(app, config))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Batch Scorer
+Persistent pool of scorer processes for large prediction batches. Each process
+loads the model once; name columns reach the workers through shared memory and
+each worker writes its chunk's probabilities straight into a shared result array.
+"""
+
+import os
+import threading
+import logging
+import multiprocessing
+from contextlib import nullcontext
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from cpu_budget import CpuBudget, default_budget
+
+logger = logging.getLogger(__name__)
+
+# Comparator loaded by each scorer process
+_worker_comparator = None
+
+def _init_worker(model_data):
+    """Pool initializer: load the model once per scorer process"""
+    global _worker_comparator
+    from legal_name_comparison import LegalNameComparator
+
+    # The pool already provides the parallelism, so each process predicts single-threaded
+    _worker_comparator = LegalNameComparator(cpu_budget=CpuBudget(cores=1))
+    _worker_comparator.set_model_data(model_data)
+
+def _attach(name):
+    """Attach to a segment the parent owns and unlinks.
+
+    Spawned pool processes share the parent's resource tracker, so attaching
+    here does not leave a second registration behind."""
+    return shared_memory.SharedMemory(name=name)
+
+def _read_names(buf, offsets, start, end):
+    """Decode names start..end from a UTF-8 blob and its offsets"""
+    return [bytes(buf[offsets[i]:offsets[i + 1]]).decode('utf-8') for i in range(start, end)]
+
+def _score_chunk(task):
+    """Score pairs start..end and write their material probabilities into the result array"""
+    input_name, result_name, n_rows, blob_length, start, end = task
+    input_shm = _attach(input_name)
+    result_shm = _attach(result_name)
+    try:
+        offsets = np.ndarray((2, n_rows + 1), dtype=np.int64, buffer=input_shm.buf)
+        blobs = input_shm.buf[offsets.nbytes:offsets.nbytes + blob_length]
+        names1 = _read_names(blobs, offsets[0], start, end)
+        names2 = _read_names(blobs, offsets[1], start, end)
+
+        _, probabilities = _worker_comparator.predict_batch(names1, names2)
+
+        results = np.ndarray((n_rows,), dtype=np.float32, buffer=result_shm.buf)
+        results[start:end] = probabilities[:, 1]
+        del offsets, results
+        blobs.release()
+    finally:
+        input_shm.close()
+        result_shm.close()
+    return end - start
+
+def _encode_column(names):
+    """UTF-8 encode a name column into (offsets, blob)"""
+    encoded = [name.encode('utf-8') for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, b''.join(encoded)
+
+class BatchScorer:
+    """Scores name pairs across a pool of processes that outlive individual requests.
+
+    The pool starts on first use, in the process that uses it (so a prefork
+    server's workers each get their own), and is replaced when the comparator
+    is given a different model; requests still scoring on the old pool finish
+    before it is shut down."""
+
+    def __init__(self, processes=None, chunk_size=2000, min_rows=10000):
+        self.processes = processes or default_budget().per_request_threads
+        self.chunk_size = max(1, chunk_size)
+        self.min_rows = min_rows
+        self._pool = None
+        self._pool_pid = None
+        self._pool_model = None
+        # Requests currently mapping on each pool owned by this process
+        self._pool_users = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a scorer from BATCH_SCORER_* settings"""
+        return cls(
+            processes=int(os.environ.get('BATCH_SCORER_PROCESSES', 0)) or None,
+            chunk_size=int(os.environ.get('BATCH_SCORER_CHUNK_SIZE', 2000)),
+            min_rows=int(os.environ.get('BATCH_SCORER_MIN_ROWS', 10000))
+        )
+
+    def should_use(self, n_rows):
+        """Whether a batch of n_rows is worth sending to the pool"""
+        return self.processes > 1 and n_rows >= self.min_rows
+
+    def _acquire_pool(self, comparator):
+        """Running pool holding comparator's model, started or replaced as needed.
+
+        The caller counts as a user of the returned pool until it calls
+        _release_pool, so a model change never stops a pool mid-map."""
+        retire = None
+        with self._lock:
+            if self._pool is not None and self._pool_pid != os.getpid():
+                # A pool inherited across fork belongs to the parent; leave it alone
+                self._pool = None
+                self._pool_users = {}
+            elif self._pool is not None and self._pool_model is not comparator.model:
+                # Swap in a new pool; the old one is retired once its last user is done
+                if self._pool_users.get(self._pool, 0) == 0:
+                    self._pool_users.pop(self._pool, None)
+                    retire = self._pool
+                self._pool = None
+
+            if self._pool is None:
+                # spawn: scorer processes must not inherit server threads or sockets
+                context = multiprocessing.get_context('spawn')
+                self._pool = context.Pool(
+                    self.processes,
+                    initializer=_init_worker,
+                    initargs=(comparator.get_model_data(),)
+                )
+                self._pool_pid = os.getpid()
+                self._pool_model = comparator.model
+                logger.info(f"Started batch scorer pool with {self.processes} processes")
+
+            pool = self._pool
+            self._pool_users[pool] = self._pool_users.get(pool, 0) + 1
+
+        if retire is not None:
+            self._retire(retire)
+        return pool
+
+    def _release_pool(self, pool):
+        """Drop a use of pool, retiring it if it was replaced and this was the last user"""
+        with self._lock:
+            if pool not in self._pool_users:
+                # Already stopped by close()
+                return
+            self._pool_users[pool] -= 1
+            retire = pool is not self._pool and self._pool_users[pool] == 0
+            if retire:
+                del self._pool_users[pool]
+        if retire:
+            self._retire(pool)
+
+    def _retire(self, pool):
+        """Let a replaced pool's processes exit once their queued work is done"""
+        pool.close()
+        pool.join()
+        logger.info("Retired replaced batch scorer pool")
+
+    def predict_batch(self, comparator, names1, names2, stage_timer=None):
+        """Same contract as LegalNameComparator.predict_batch, scored across the pool"""
+        if comparator.model is None:
+            raise ValueError("Model not trained. Please train the model first.")
+
+        n_rows = len(names1)
+        if n_rows == 0:
+            return np.zeros(0, dtype=bool), np.zeros((0, 2))
+
+        pool = self._acquire_pool(comparator)
+        try:
+            return self._score(pool, n_rows, names1, names2, stage_timer)
+        finally:
+            self._release_pool(pool)
+
+    def _score(self, pool, n_rows, names1, names2, stage_timer=None):
+        """Map the pairs over pool through shared memory"""
+        offsets1, blob1 = _encode_column(names1)
+        offsets2, blob2 = _encode_column(names2)
+        # Second column's offsets continue after the first column's bytes
+        offsets = np.vstack([offsets1, offsets2 + len(blob1)])
+        blob_length = len(blob1) + len(blob2)
+
+        input_shm = shared_memory.SharedMemory(create=True, size=max(1, offsets.nbytes + blob_length))
+        result_shm = shared_memory.SharedMemory(create=True, size=n_rows * 4)
+        try:
+            input_shm.buf[:offsets.nbytes] = offsets.tobytes()
+            input_shm.buf[offsets.nbytes:offsets.nbytes + len(blob1)] = blob1
+            input_shm.buf[offsets.nbytes + len(blob1):offsets.nbytes + blob_length] = blob2
+
+            tasks = [
+                (input_shm.name, result_shm.name, n_rows, blob_length, start, min(start + self.chunk_size, n_rows))
+                for start in range(0, n_rows, self.chunk_size)
+            ]
+            with (stage_timer.stage('scoring') if stage_timer is not None else nullcontext()):
+                pool.map(_score_chunk, tasks)
+
+            material = np.ndarray((n_rows,), dtype=np.float32, buffer=result_shm.buf).copy()
+        finally:
+            input_shm.close()
+            input_shm.unlink()
+            result_shm.close()
+            result_shm.unlink()
+
+        probabilities = np.column_stack([1.0 - material, material])
+        predictions = probabilities[:, 1] > 0.5
+        return predictions, probabilities
+
+    def close(self):
+        """Stop every pool this process started, including retired ones still in use"""
+        with self._lock:
+            pools = set(self._pool_users)
+            if self._pool is not None:
+                pools.add(self._pool)
+            if self._pool_pid != os.getpid():
+                pools = set()
+            self._pool = None
+            self._pool_users = {}
+        for pool in pools:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the legal name comparison pipeline
+Measures throughput, p50/p99 latency and peak RSS for preprocessing, feature
+extraction, inference and training, and compares runs against a saved baseline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from legal_name_comparison import LegalNameComparator
+from generate_comprehensive_data import (
+    generate_realistic_legal_names,
+    create_material_changes,
+    create_immaterial_changes
+)
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+
+# Feature rows actually extracted for train_model; larger sizes resample these
+TRAIN_FEATURE_SAMPLE = 5000
+
+CASES = [
+    'preprocess_legal_name',
+    'extract_features',
+    'predict_materiality',
+    'predict_batch',
+    'create_training_data',
+    'train_model'
+]
+
+def make_pairs(num_pairs, seed=42):
+    """Generate labelled (name1, name2, is_material) pairs, half material and half immaterial"""
+    random.seed(seed)
+    base_names = generate_realistic_legal_names()
+
+    pairs = []
+    for i in range(num_pairs):
+        name = random.choice(base_names)
+        if i % 2 == 0:
+            name1, name2 = create_material_changes(name)
+            pairs.append((name1, name2, 1))
+        else:
+            name1, name2 = create_immaterial_changes(name)
+            pairs.append((name1, name2, 0))
+    return pairs
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def train_reference_model(seed, model_path):
+    """Train the model used by the inference benchmarks"""
+    comparator = LegalNameComparator()
+    pairs = make_pairs(2000, seed)
+    data = pd.DataFrame({
+        'source1': [p[0] for p in pairs],
+        'source2': [p[1] for p in pairs],
+        'source3': [''] * len(pairs),
+        'is_material': [p[2] for p in pairs]
+    })
+    X, y = comparator.create_training_data(data)
+    with contextlib.redirect_stdout(io.StringIO()):
+        comparator.train_model(X, y)
+    comparator.save_model(model_path)
+
+def time_each(func, items):
+    """Call func on every item, returning per-call latencies in seconds"""
+    clock = time.perf_counter
+    latencies = np.empty(len(items))
+    for i, item in enumerate(items):
+        start = clock()
+        func(item)
+        latencies[i] = clock() - start
+    return latencies
+
+def time_calls(func, repeat):
+    """Call func repeat times, returning per-call latencies in seconds"""
+    latencies = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies[i] = time.perf_counter() - start
+    return latencies
+
+def run_case(case, size, seed, model_path, repeat):
+    """Run one benchmark case and return its measurements"""
+    comparator = LegalNameComparator()
+    if model_path:
+        comparator.load_model(model_path)
+
+    pairs = make_pairs(size, seed)
+    names1 = [p[0] for p in pairs]
+    names2 = [p[1] for p in pairs]
+    rss_before = peak_rss_mb()
+
+    if case == 'preprocess_legal_name':
+        latencies = time_each(comparator.preprocess_legal_name, names1)
+        items = size
+    elif case == 'extract_features':
+        latencies = time_each(lambda p: comparator.extract_features(p[0], p[1]), pairs)
+        items = size
+    elif case == 'predict_materiality':
+        latencies = time_each(lambda p: comparator.predict_materiality(p[0], p[1]), pairs)
+        items = size
+    elif case == 'predict_batch':
+        latencies = time_calls(lambda: comparator.predict_batch(names1, names2), repeat)
+        items = size * repeat
+    elif case == 'create_training_data':
+        data = pd.DataFrame({
+            'source1': names1,
+            'source2': names2,
+            'source3': [''] * size,
+            'is_material': [p[2] for p in pairs]
+        })
+        latencies = time_calls(lambda: comparator.create_training_data(data), repeat)
+        items = size * repeat
+    elif case == 'train_model':
+        # Extract a bounded sample and resample it up to the requested size
+        sample = pairs[:TRAIN_FEATURE_SAMPLE]
+        X = pd.DataFrame([comparator.extract_features(p[0], p[1]) for p in sample])
+        y = np.array([p[2] for p in sample])
+        rows = np.random.RandomState(seed).randint(0, len(sample), size)
+        X, y = X.iloc[rows].reset_index(drop=True), y[rows]
+
+        def train():
+            with contextlib.redirect_stdout(io.StringIO()):
+                LegalNameComparator().train_model(X, y)
+
+        latencies = time_calls(train, repeat)
+        items = size * repeat
+    else:
+        raise ValueError(f"Unknown benchmark case: {case}")
+
+    total_seconds = float(latencies.sum())
+    return {
+        'case': case,
+        'size': size,
+        'items': items,
+        'seconds': round(total_seconds, 4),
+        'throughput_per_sec': round(items / total_seconds, 2) if total_seconds > 0 else None,
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 4),
+        'p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 4),
+        'peak_rss_mb': peak_rss_mb(),
+        'baseline_rss_mb': rss_before
+    }
+
+def run_benchmarks(cases, sizes, seed=42, repeat=3, isolate=True):
+    """Run every case at every size, each in a fresh process so peak RSS is per case"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        model_path = os.path.join(tmpdir, 'benchmark_model.pkl')
+        print("Training reference model...")
+        train_reference_model(seed, model_path)
+
+        for size in sizes:
+            for case in cases:
+                print(f"Running {case} at {size:,} pairs...", flush=True)
+                if isolate:
+                    context = multiprocessing.get_context('spawn')
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        result = executor.submit(run_case, case, size, seed, model_path, repeat).result()
+                else:
+                    result = run_case(case, size, seed, model_path, repeat)
+                print(f"  {result['throughput_per_sec']} items/s, p50 {result['p50_ms']} ms, "
+                      f"p99 {result['p99_ms']} ms, peak RSS {result['peak_rss_mb']} MB")
+                results.append(result)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': seed,
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+def compare_to_baseline(current, baseline, tolerance=0.10):
+    """Compare a run with a baseline; returns a list of regression descriptions"""
+    baseline_results = {(r['case'], r['size']): r for r in baseline['results']}
+    regressions = []
+
+    print(f"\n{'case':<24}{'size':>10}{'throughput':>14}{'p99':>12}")
+    for result in current['results']:
+        key = (result['case'], result['size'])
+        previous = baseline_results.get(key)
+        if previous is None:
+            continue
+
+        throughput_change = result['throughput_per_sec'] / previous['throughput_per_sec'] - 1
+        p99_change = result['p99_ms'] / previous['p99_ms'] - 1 if previous['p99_ms'] else 0.0
+        print(f"{key[0]:<24}{key[1]:>10,}{throughput_change:>+14.1%}{p99_change:>+12.1%}")
+
+        if throughput_change < -tolerance:
+            regressions.append(f"{key[0]} @ {key[1]:,}: throughput {throughput_change:+.1%}")
+        if p99_change > tolerance:
+            regressions.append(f"{key[0]} @ {key[1]:,}: p99 latency {p99_change:+.1%}")
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the legal name comparison pipeline')
+    parser.add_argument('--cases', default=','.join(CASES),
+                        help='Comma-separated cases to run (default: all)')
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help='Comma-separated pair counts (default: 1000,100000,1000000)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for generated data')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions for batch cases')
+    parser.add_argument('--output', default=None, help='Write results JSON here')
+    parser.add_argument('--baseline', default=None, help='Baseline results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed fractional throughput drop / p99 increase (default: 0.10)')
+    parser.add_argument('--in-process', action='store_true',
+                        help='Run cases in this process (faster startup, shared peak RSS)')
+    args = parser.parse_args()
+
+    cases = [c.strip() for c in args.cases.split(',') if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(unknown)}")
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    results = run_benchmarks(cases, sizes, args.seed, args.repeat, isolate=not args.in_process)
+
+    output = args.output or f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("\nPerformance regressions:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+if __name__ == "__main__":
+    main()
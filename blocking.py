@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Candidate Blocking
+Finds likely-duplicate pairs within a single list of names without comparing
+every pair: MinHash signatures over character shingles of the normalized names,
+LSH banding to turn similar signatures into candidate pairs, and the model to
+score only those candidates
+"""
+
+import argparse
+import random
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from legal_name_comparison import LegalNameComparator
+from batch_scorer import BatchScorer
+
+# Universal hashing modulo a Mersenne prime keeps a * x + b inside uint64
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+# Default signature-agreement check sits this far below the LSH threshold, since
+# the 128-hash estimate of a pair's similarity is off by about 0.04 either way
+SIMILARITY_SLACK = 0.1
+
+# Similarities the recall curve is reported at
+CURVE_POINTS = (0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+
+def shingles(text, size=3):
+    """Character shingles of a normalized name (the whole name when it is shorter)"""
+    if not text:
+        return set()
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def jaccard(set1, set2):
+    """Jaccard similarity of two shingle sets"""
+    union = len(set1 | set2)
+    return len(set1 & set2) / union if union > 0 else 0
+
+def candidate_probability(similarity, bands, rows):
+    """Chance that two names with this shingle Jaccard share at least one band"""
+    return 1 - (1 - similarity ** rows) ** bands
+
+def choose_bands(num_perm, threshold):
+    """(bands, rows) using all num_perm hashes whose S-curve midpoint is closest to threshold"""
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+class MinHashLSH:
+    """MinHash signatures and LSH banding over character shingles.
+
+    Hashing is deterministic (crc32 shingles, seeded permutations), so
+    signatures and band keys are stable across processes and runs. Raising
+    threshold (or rows per band) trades recall for fewer candidates."""
+
+    def __init__(self, num_perm=128, threshold=0.5, bands=None, shingle_size=3, max_bucket_size=1000, seed=1):
+        if bands is None:
+            bands, rows = choose_bands(num_perm, threshold)
+        else:
+            rows = num_perm // bands
+        self.num_perm = bands * rows
+        self.bands = bands
+        self.rows = rows
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.max_bucket_size = max_bucket_size
+        self.seed = seed
+
+        state = np.random.RandomState(seed)
+        self._a = state.randint(1, int(MERSENNE_PRIME), size=self.num_perm).astype(np.uint64)
+        self._b = state.randint(0, int(MERSENNE_PRIME), size=self.num_perm).astype(np.uint64)
+        # Multipliers combining a band's rows into one 64-bit key (uint64 arithmetic wraps)
+        self._band_multipliers = state.randint(1, 2 ** 62, size=rows, dtype=np.int64).astype(np.uint64) | np.uint64(1)
+
+    def signature(self, shingle_set):
+        """MinHash signature (num_perm uint32 values) of one shingle set, or None when it is empty"""
+        if not shingle_set:
+            return None
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode('utf-8')) for shingle in shingle_set),
+            dtype=np.uint64, count=len(shingle_set)
+        ) % MERSENNE_PRIME
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def signatures(self, shingle_sets):
+        """(n, num_perm) signature matrix and a mask of the names that had shingles"""
+        matrix = np.zeros((len(shingle_sets), self.num_perm), dtype=np.uint32)
+        valid = np.zeros(len(shingle_sets), dtype=bool)
+        for i, shingle_set in enumerate(shingle_sets):
+            signature = self.signature(shingle_set)
+            if signature is not None:
+                matrix[i] = signature
+                valid[i] = True
+        return matrix, valid
+
+    def band_keys(self, signatures):
+        """(n, bands) uint64 keys; names sharing any band key become candidates"""
+        keys = np.empty((len(signatures), self.bands), dtype=np.uint64)
+        for band in range(self.bands):
+            rows = signatures[:, band * self.rows:(band + 1) * self.rows].astype(np.uint64)
+            keys[:, band] = (rows * self._band_multipliers).sum(axis=1)
+        return keys
+
+    def estimated_similarity(self, signatures, left, right, chunk_size=100000):
+        """Share of equal MinHash values per pair, an estimate of shingle Jaccard"""
+        similarity = np.empty(len(left), dtype=np.float32)
+        for start in range(0, len(left), chunk_size):
+            end = start + chunk_size
+            similarity[start:end] = (signatures[left[start:end]] == signatures[right[start:end]]).mean(axis=1)
+        return similarity
+
+    def candidate_pairs(self, signatures, valid=None, min_similarity=0.0):
+        """Candidate (left, right) index arrays with left < right, and banding statistics.
+
+        Buckets larger than max_bucket_size (usually one name repeated many
+        times) are skipped and counted rather than expanded quadratically.
+        Pairs whose signatures agree on less than min_similarity of their
+        values are dropped before scoring."""
+        n = len(signatures)
+        indices = np.arange(n) if valid is None else np.flatnonzero(valid)
+        keys = self.band_keys(signatures[indices])
+
+        codes = []
+        oversized_buckets = 0
+        skipped_pairs = 0
+        for band in range(self.bands):
+            order = np.argsort(keys[:, band], kind='stable')
+            sorted_keys = keys[order, band]
+            # Runs of equal keys are the band's buckets
+            boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(sorted_keys)]))
+            shared = ends - starts > 1
+            for start, end in zip(starts[shared], ends[shared]):
+                size = end - start
+                if size > self.max_bucket_size:
+                    oversized_buckets += 1
+                    skipped_pairs += size * (size - 1) // 2
+                    continue
+                members = np.sort(indices[order[start:end]])
+                left, right = np.triu_indices(size, k=1)
+                codes.append(members[left].astype(np.int64) * n + members[right])
+
+        codes = np.unique(np.concatenate(codes)) if codes else np.zeros(0, dtype=np.int64)
+        left, right = codes // n, codes % n
+        banded_pairs = len(codes)
+        if min_similarity > 0:
+            keep = self.estimated_similarity(signatures, left, right) >= min_similarity
+            left, right = left[keep], right[keep]
+
+        stats = {
+            'names': n,
+            'blocked_names': int(len(indices)),
+            'banded_pairs': int(banded_pairs),
+            'candidate_pairs': int(len(left)),
+            'all_pairs': n * (n - 1) // 2,
+            'oversized_buckets': oversized_buckets,
+            'skipped_bucket_pairs': int(skipped_pairs)
+        }
+        return left, right, stats
+
+    def recall_curve(self, points=CURVE_POINTS):
+        """Expected share of pairs found at each shingle Jaccard similarity"""
+        return {f"{s:.1f}": round(candidate_probability(s, self.bands, self.rows), 4) for s in points}
+
+    def describe(self):
+        """Banding parameters for reports"""
+        return {
+            'num_perm': self.num_perm,
+            'bands': self.bands,
+            'rows': self.rows,
+            'threshold': self.threshold,
+            # Similarity at which a pair has roughly even odds of becoming a candidate
+            'effective_threshold': round((1 / self.bands) ** (1 / self.rows), 4),
+            'shingle_size': self.shingle_size
+        }
+
+def measure_recall(shingle_sets, left, right, threshold, sample_size=2000, seed=42):
+    """Measured recall on a sample: the share of sampled pairs at or above the
+    similarity threshold that blocking made candidates"""
+    n = len(shingle_sets)
+    population = [i for i in range(n) if shingle_sets[i]]
+    sample = sorted(random.Random(seed).sample(population, min(sample_size, len(population))))
+    candidates = set((left.astype(np.int64) * n + right).tolist())
+
+    similar = 0
+    found = 0
+    for position, i in enumerate(sample):
+        for j in sample[position + 1:]:
+            if jaccard(shingle_sets[i], shingle_sets[j]) >= threshold:
+                similar += 1
+                found += (i * n + j) in candidates
+    return {
+        'sample_names': len(sample),
+        'similar_pairs': similar,
+        'found_pairs': found,
+        'recall': round(found / similar, 4) if similar else None
+    }
+
+def find_duplicates(comparator, names, lsh=None, min_similarity=None, recall_sample=0,
+                    scorer=None, stage_timer=None):
+    """Block, then score candidate pairs within one list of names.
+
+    Returns (results, report): one result per candidate pair with the model's
+    verdict (Immaterial means the names are judged the same entity), and a
+    report with candidate counts, the expected recall curve and, when
+    recall_sample > 0, recall measured on a sample of names. Banded pairs are
+    checked against min_similarity (default: SIMILARITY_SLACK below the LSH
+    threshold, 0 keeps every banded pair) before scoring. A BatchScorer
+    passed as scorer scores large candidate sets across its process pool."""
+    lsh = lsh or MinHashLSH()
+    if min_similarity is None:
+        min_similarity = max(0.0, lsh.threshold - SIMILARITY_SLACK)
+    timings = {}
+
+    start = time.perf_counter()
+    processed = [comparator.preprocess_legal_name(name) for name in names]
+    shingle_sets = [shingles(text, lsh.shingle_size) for text in processed]
+    signatures, valid = lsh.signatures(shingle_sets)
+    timings['signatures'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    left, right, stats = lsh.candidate_pairs(signatures, valid, min_similarity)
+    timings['banding'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    names1 = [names[i] for i in left]
+    names2 = [names[j] for j in right]
+    if scorer is not None and scorer.should_use(len(names1)):
+        predictions, probabilities = scorer.predict_batch(comparator, names1, names2, stage_timer=stage_timer)
+    else:
+        predictions, probabilities = comparator.predict_batch(names1, names2, stage_timer=stage_timer)
+    timings['scoring'] = time.perf_counter() - start
+
+    results = [{
+        'index1': int(i),
+        'index2': int(j),
+        'name1': name1,
+        'name2': name2,
+        'similarity': round(jaccard(shingle_sets[i], shingle_sets[j]), 4),
+        'prediction': 'Material' if prediction else 'Immaterial',
+        'is_material': bool(prediction),
+        'materiality_probability': float(probability[1])
+    } for i, j, name1, name2, prediction, probability in zip(left, right, names1, names2, predictions, probabilities)]
+
+    report = dict(stats, **lsh.describe())
+    report['min_similarity'] = min_similarity
+    report['reduction'] = round(1 - stats['candidate_pairs'] / stats['all_pairs'], 6) if stats['all_pairs'] else 0
+    report['duplicate_pairs'] = sum(1 for r in results if not r['is_material'])
+    report['expected_recall'] = lsh.recall_curve()
+    if recall_sample:
+        report['measured_recall'] = measure_recall(shingle_sets, left, right, lsh.threshold, recall_sample)
+    report['timings_ms'] = {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
+    return results, report
+
+def load_names(filepath, column='name'):
+    """Load one column of names from an Excel or CSV file"""
+    if filepath.endswith('.csv'):
+        df = pd.read_csv(filepath)
+    else:
+        df = pd.read_excel(filepath)
+
+    if column not in df.columns:
+        raise ValueError(f'Input file must have a {column} column')
+    return df[column].dropna().astype(str).tolist()
+
+def main():
+    parser = argparse.ArgumentParser(description='Find and score likely-duplicate names within one list')
+    parser.add_argument('names', help='Excel/CSV file with a column of names')
+    parser.add_argument('--column', default='name', help='Column holding the names')
+    parser.add_argument('--model', default='legal_name_model.pkl', help='Trained model to score candidates with')
+    parser.add_argument('--output', default='duplicate_pairs.csv', help='CSV file for the scored candidate pairs')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='Shingle Jaccard similarity the banding is tuned for (lower finds more, slower)')
+    parser.add_argument('--num-perm', type=int, default=128, help='MinHash permutations')
+    parser.add_argument('--bands', type=int, default=None, help='LSH bands (default: derived from --threshold)')
+    parser.add_argument('--shingle-size', type=int, default=3, help='Characters per shingle')
+    parser.add_argument('--min-similarity', type=float, default=None,
+                        help='Drop banded pairs whose MinHash signatures agree on less than this share '
+                             f'(default: {SIMILARITY_SLACK} below --threshold; 0 scores every banded pair)')
+    parser.add_argument('--max-bucket-size', type=int, default=1000, help='Skip LSH buckets larger than this')
+    parser.add_argument('--recall-sample', type=int, default=0,
+                        help='Measure recall exhaustively on this many sampled names')
+    parser.add_argument('--duplicates-only', action='store_true', help='Only write pairs judged Immaterial')
+    parser.add_argument('--processes', type=int, default=1, help='Score candidates across this many processes')
+    args = parser.parse_args()
+
+    comparator = LegalNameComparator()
+    comparator.load_model(args.model)
+
+    names = load_names(args.names, args.column)
+    lsh = MinHashLSH(args.num_perm, args.threshold, args.bands, args.shingle_size, args.max_bucket_size)
+    print(f"Blocking {len(names)} names ({lsh.bands} bands x {lsh.rows} rows)...")
+    scorer = BatchScorer(processes=args.processes, min_rows=0) if args.processes > 1 else None
+    try:
+        results, report = find_duplicates(comparator, names, lsh, args.min_similarity, args.recall_sample, scorer)
+    finally:
+        if scorer is not None:
+            scorer.close()
+
+    if args.duplicates_only:
+        results = [r for r in results if not r['is_material']]
+    pd.DataFrame(results).to_csv(args.output, index=False)
+
+    print(f"Candidate pairs: {report['candidate_pairs']:,} of {report['all_pairs']:,} "
+          f"({report['reduction']:.4%} pruned; {report['banded_pairs']:,} before the similarity check)")
+    print(f"Duplicate pairs: {report['duplicate_pairs']:,}")
+    if report['oversized_buckets']:
+        print(f"Skipped {report['oversized_buckets']} oversized buckets "
+              f"({report['skipped_bucket_pairs']:,} pairs)")
+    print("Expected recall by shingle similarity: " +
+          ', '.join(f"{s}: {p:.1%}" for s, p in report['expected_recall'].items()))
+    if 'measured_recall' in report:
+        measured = report['measured_recall']
+        recall = 'n/a' if measured['recall'] is None else f"{measured['recall']:.1%}"
+        print(f"Measured recall at >= {lsh.threshold}: {recall} "
+              f"({measured['found_pairs']}/{measured['similar_pairs']} pairs in a {measured['sample_names']}-name sample)")
+    print(f"Timings (ms): {report['timings_ms']}")
+    print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
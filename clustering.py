@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Entity Clustering
+Groups names into entities from scored pairs: every Immaterial pair at or above
+a confidence threshold is an edge, and the connected components of those edges
+are the entities. Components are found with an array-backed union-find (union
+by size, path halving), so tens of millions of edges cluster in near-linear
+time with a few bytes of memory per name.
+"""
+
+import argparse
+import time
+from array import array
+
+import numpy as np
+import pandas as pd
+
+PAIR_COLUMNS = ['name1', 'name2', 'materiality_probability']
+
+class UnionFind:
+    """Disjoint sets over dense integer ids, stored in flat typed arrays"""
+
+    def __init__(self, n=0):
+        self.parent = array('q', range(n))
+        self.size = array('q', [1]) * n
+
+    def __len__(self):
+        return len(self.parent)
+
+    def grow(self, n):
+        """Make sure ids 0..n-1 exist"""
+        current = len(self.parent)
+        if n > current:
+            self.parent.extend(range(current, n))
+            self.size.extend(array('q', [1]) * (n - current))
+
+    def find(self, x):
+        """Root of x's set, halving the path on the way up"""
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        """Merge the sets of a and b; returns False if they were already joined"""
+        root_a = self.find(a)
+        root_b = self.find(b)
+        if root_a == root_b:
+            return False
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return True
+
+    def union_many(self, left, right):
+        """Merge every (left[i], right[i]) pair; returns how many merges happened"""
+        find = self.find
+        parent = self.parent
+        size = self.size
+        merges = 0
+        for a, b in zip(left.tolist(), right.tolist()):
+            root_a = find(a)
+            root_b = find(b)
+            if root_a == root_b:
+                continue
+            if size[root_a] < size[root_b]:
+                root_a, root_b = root_b, root_a
+            parent[root_b] = root_a
+            size[root_a] += size[root_b]
+            merges += 1
+        return merges
+
+    def labels(self):
+        """Dense component id per element, numbered largest component first"""
+        # Pointer jumping over a copy of the parent array until every id points at its root
+        roots = np.frombuffer(self.parent, dtype=np.int64).copy()
+        while True:
+            jumped = roots[roots]
+            if np.array_equal(jumped, roots):
+                break
+            roots = jumped
+        _, inverse, counts = np.unique(roots, return_inverse=True, return_counts=True)
+        # Renumber so cluster 0 is the largest; ties keep root order
+        order = np.argsort(-counts, kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        return rank[inverse], counts[order]
+
+class NameIds:
+    """Assigns dense integer ids to names as they are first seen"""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def encode(self, values):
+        """Ids for an array of names, adding unseen names"""
+        for name in pd.unique(values):
+            if name not in self.ids:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+        return pd.Series(values).map(self.ids).to_numpy(dtype=np.int64)
+
+def edge_mask(materiality_probabilities, min_confidence=0.5):
+    """Pairs judged the same entity with at least min_confidence (1 - materiality probability).
+
+    Only Immaterial pairs (materiality probability at most 0.5) qualify, so a
+    min_confidence below 0.5 never lets a Material pair merge two entities."""
+    probabilities = np.asarray(materiality_probabilities, dtype=np.float64)
+    return (probabilities <= 0.5) & (1.0 - probabilities >= min_confidence)
+
+class PairClusterer:
+    """Accumulates scored pair chunks and clusters the names they connect"""
+
+    def __init__(self, min_confidence=0.5):
+        self.min_confidence = min_confidence
+        self.names = NameIds()
+        self.union_find = UnionFind()
+        self.pairs = 0
+        self.edges = 0
+        self.merges = 0
+
+    def add(self, chunk):
+        """Add a chunk of scored pairs; only confident Immaterial pairs become edges"""
+        missing = [col for col in PAIR_COLUMNS if col not in chunk.columns]
+        if missing:
+            raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+        self.pairs += len(chunk)
+        edges = chunk[edge_mask(chunk['materiality_probability'], self.min_confidence)]
+        left = self.names.encode(edges['name1'].astype(str).to_numpy())
+        right = self.names.encode(edges['name2'].astype(str).to_numpy())
+        self.union_find.grow(len(self.names))
+        self.edges += len(edges)
+        self.merges += self.union_find.union_many(left, right)
+
+    def result(self, min_size=2):
+        """(clusters frame, summary) for the pairs added so far"""
+        labels, sizes = self.union_find.labels()
+        clusters = pd.DataFrame({
+            'name': self.names.names,
+            'cluster_id': labels,
+            'cluster_size': sizes[labels] if len(labels) else np.zeros(0, dtype=np.int64)
+        })
+        clusters = clusters[clusters['cluster_size'] >= min_size].sort_values(['cluster_id', 'name'])
+
+        summary = {
+            'pairs': self.pairs,
+            'edges': self.edges,
+            'names': len(self.names),
+            'merges': self.merges,
+            'clusters': int((sizes >= min_size).sum()),
+            'largest_cluster': int(sizes[0]) if len(sizes) else 0,
+            'min_confidence': self.min_confidence
+        }
+        return clusters.reset_index(drop=True), summary
+
+def cluster_pairs(pairs, min_confidence=0.5, min_size=2):
+    """Cluster one frame or list of scored pairs (name1, name2, materiality_probability).
+
+    Returns (clusters, summary): a frame of name, cluster_id and cluster_size
+    for every name in a cluster of at least min_size, and summary counts."""
+    clusterer = PairClusterer(min_confidence)
+    frame = pd.DataFrame(pairs)
+    clusterer.add(frame if len(frame) else pd.DataFrame(columns=PAIR_COLUMNS))
+    return clusterer.result(min_size)
+
+def group_clusters(clusters):
+    """Clusters frame as a list of {cluster_id, size, names}, largest first"""
+    groups = []
+    for cluster_id, members in clusters.groupby('cluster_id', sort=True)['name']:
+        names = members.tolist()
+        groups.append({'cluster_id': int(cluster_id), 'size': len(names), 'names': names})
+    return groups
+
+def main():
+    parser = argparse.ArgumentParser(description='Cluster names into entities from scored pairs')
+    parser.add_argument('pairs', help='CSV or Excel file of scored pairs with name1, name2 and '
+                                      'materiality_probability (blocking.py or batch prediction output)')
+    parser.add_argument('--output', default='clusters.csv', help='CSV file for name, cluster_id, cluster_size')
+    parser.add_argument('--min-confidence', type=float, default=0.5,
+                        help='Use Immaterial pairs with at least this confidence (1 - materiality probability)')
+    parser.add_argument('--min-size', type=int, default=2, help='Only write clusters with at least this many names')
+    parser.add_argument('--chunk-size', type=int, default=1000000, help='CSV rows read per chunk')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    clusterer = PairClusterer(args.min_confidence)
+    if args.pairs.endswith('.csv'):
+        for chunk in pd.read_csv(args.pairs, usecols=PAIR_COLUMNS, chunksize=args.chunk_size):
+            clusterer.add(chunk)
+    else:
+        clusterer.add(pd.read_excel(args.pairs, usecols=PAIR_COLUMNS))
+    clusters, summary = clusterer.result(args.min_size)
+    clusters.to_csv(args.output, index=False)
+
+    print(f"Pairs: {summary['pairs']:,}, edges: {summary['edges']:,}, names: {summary['names']:,}")
+    print(f"Clusters of {args.min_size}+ names: {summary['clusters']:,} (largest: {summary['largest_cluster']:,})")
+    print(f"Finished in {time.time() - start_time:.1f}s -> {args.output}")
+
+if __name__ == "__main__":
+    main()
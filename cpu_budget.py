@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+CPU Budget
+Decides how many threads XGBoost may use for inference and training, so that
+concurrent requests across workers do not oversubscribe the machine
+"""
+
+import math
+import os
+
+from serving import WORKERS_ENV, THREADS_ENV
+
+def available_cores():
+    """Cores this process may run on (respects CPU affinity / container cpusets)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+class CpuBudget:
+    """Thread allowances for inference and training.
+
+    Every worker thread may be serving a request at the same time, so a request
+    gets at most cores / (workers * threads) inference threads, and only when its
+    batch is large enough to benefit. Training gets a fixed share of the cores."""
+
+    def __init__(self, cores=None, workers=1, threads=1, training_share=0.25, rows_per_thread=2000):
+        self.cores = cores or available_cores()
+        self.workers = max(1, workers)
+        self.threads = max(1, threads)
+        self.training_share = training_share
+        self.rows_per_thread = max(1, rows_per_thread)
+
+    @classmethod
+    def from_env(cls):
+        """Build the budget from CPU_BUDGET_* settings and the serve.py worker layout"""
+        return cls(
+            cores=int(os.environ.get('CPU_BUDGET_CORES', 0)) or None,
+            workers=int(os.environ.get(WORKERS_ENV, 1)),
+            threads=int(os.environ.get(THREADS_ENV, 1)),
+            training_share=float(os.environ.get('CPU_BUDGET_TRAINING_SHARE', 0.25)),
+            rows_per_thread=int(os.environ.get('CPU_BUDGET_ROWS_PER_THREAD', 2000))
+        )
+
+    @property
+    def per_request_threads(self):
+        """Most threads one request may use when every serving thread is busy"""
+        return max(1, self.cores // (self.workers * self.threads))
+
+    def inference_threads(self, n_rows):
+        """Threads for predicting n_rows pairs: 1 for small batches, scaling with batch size"""
+        wanted = math.ceil(n_rows / self.rows_per_thread)
+        return max(1, min(self.per_request_threads, wanted))
+
+    def training_threads(self):
+        """Threads for training, capped so retraining cannot starve serving"""
+        return max(1, int(self.cores * self.training_share))
+
+    def describe(self):
+        """Budget summary for logs and health output"""
+        return {
+            'cores': self.cores,
+            'workers': self.workers,
+            'threads_per_worker': self.threads,
+            'per_request_threads': self.per_request_threads,
+            'training_threads': self.training_threads(),
+            'rows_per_thread': self.rows_per_thread
+        }
+
+_default_budget = None
+
+def default_budget():
+    """Process-wide budget, read from the environment on first use"""
+    global _default_budget
+    if _default_budget is None:
+        _default_budget = CpuBudget.from_env()
+    return _default_budget
@@ -5,28 +5,41 @@ Production-ready Flask application with monitoring, feedback loops, and automati
 """
 
 import os
+import io
+import csv
 import json
 import logging
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from functools import wraps
 from typing import Dict, List, Optional
 
 import pandas as pd
 import numpy as np
-from flask import Flask, request, jsonify, send_file, session
+from flask import Flask, request, jsonify, send_file, session, g
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import redis
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import jwt
 from werkzeug.utils import secure_filename
 import prometheus_client
 from prometheus_client import Counter, Histogram, Gauge
 
-from legal_name_comparison import LegalNameComparator
+from legal_name_comparison import LegalNameComparator, source_records
+from batch_scorer import BatchScorer
+from blocking import MinHashLSH, find_duplicates
+from registry_index import RegistryIndex
+from clustering import cluster_pairs, group_clusters
+from snapshot_diff import prepare_snapshot, diff_snapshots
+from feedback_store import GroupCommitBuffer
+from monitoring import SystemMetricsSampler, StageTimer, publish_memory_report
+from request_profiler import ProfileStore, profile_request, track_memory
+from serving import request_model_reload
 
 # Configure logging
 logging.basicConfig(
@@ -45,6 +58,26 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Prediction persistence: 'copy' streams rows with COPY, 'values' uses multi-row INSERTs.
+# 'deferred' mode writes after the response has been returned.
+app.config['PREDICTION_WRITE_METHOD'] = os.environ.get('PREDICTION_WRITE_METHOD', 'copy')
+app.config['PREDICTION_WRITE_MODE'] = os.environ.get('PREDICTION_WRITE_MODE', 'sync')
+app.config['PREDICTION_WRITE_CHUNK_SIZE'] = int(os.environ.get('PREDICTION_WRITE_CHUNK_SIZE', 5000))
+
+# Request profiling (?profile=1, admins only)
+app.config['PROFILE_FOLDER'] = os.environ.get('PROFILE_FOLDER', 'profiles')
+app.config['PROFILE_SAMPLE_INTERVAL_MS'] = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 5))
+
+# Feedback group commit: flush every N items or after M milliseconds
+app.config['FEEDBACK_FLUSH_MAX_ITEMS'] = int(os.environ.get('FEEDBACK_FLUSH_MAX_ITEMS', 100))
+app.config['FEEDBACK_FLUSH_INTERVAL_MS'] = int(os.environ.get('FEEDBACK_FLUSH_INTERVAL_MS', 5))
+
+# Reference registry index for nearest-name lookups (built with registry_index.py)
+app.config['REGISTRY_INDEX_PATH'] = os.environ.get('REGISTRY_INDEX_PATH', 'registry_index')
+
+# Rate limiting can be switched off for local load tests
+app.config['RATELIMIT_ENABLED'] = os.environ.get('RATELIMIT_ENABLED', 'true').lower() == 'true'
+
 # Enable CORS
 CORS(app)
 
@@ -71,14 +104,28 @@ def get_db_connection():
 
 # Initialize ML model
 comparator = None
+active_model_version = 'latest'
+
+# Background writer for deferred prediction persistence
+prediction_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix='prediction-writer')
+
+# Registry index, memory-mapped on first lookup
+registry_index = None
+
+# Large prediction batches are scored across a persistent pool of scorer processes
+# (BATCH_SCORER_PROCESSES, BATCH_SCORER_CHUNK_SIZE, BATCH_SCORER_MIN_ROWS)
+batch_scorer = BatchScorer.from_env()
 
 # Prometheus metrics
 REQUEST_COUNT = Counter('requests_total', 'Total requests', ['endpoint', 'method'])
 REQUEST_DURATION = Histogram('request_duration_seconds', 'Request duration')
 PREDICTION_COUNT = Counter('predictions_total', 'Total predictions', ['model_version'])
 PREDICTION_ACCURACY = Gauge('prediction_accuracy', 'Model accuracy')
-CPU_USAGE = Gauge('cpu_usage_percent', 'CPU usage')
-MEMORY_USAGE = Gauge('memory_usage_percent', 'Memory usage')
+
+# System metrics are sampled by a background thread, never on the request path
+metrics_sampler = SystemMetricsSampler(
+    interval_seconds=float(os.environ.get('METRICS_SAMPLE_INTERVAL', 15))
+)
 
 # Authentication decorator
 def require_auth(f):
@@ -101,13 +148,43 @@ def require_auth(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def is_admin():
+    """Whether the authenticated user has the admin role"""
+    user = getattr(request, 'user', None)
+    return bool(user) and user.get('role') == 'admin'
+
+def require_admin(f):
+    """Decorator to require the admin role (use after require_auth)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_admin():
+            return jsonify({'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Request profiling
+profile_store = ProfileStore(app.config['PROFILE_FOLDER'])
+
+def profiled(endpoint):
+    """Profile the view when an admin passes ?profile=1"""
+    return profile_request(
+        endpoint, profile_store, is_admin,
+        current_user=lambda: request.user.get('email'),
+        interval_ms=app.config['PROFILE_SAMPLE_INTERVAL_MS']
+    )
+
+def memory_tracked(endpoint):
+    """Trace allocations per stage when an admin passes ?memory=1"""
+    return track_memory(endpoint, is_admin, on_report=publish_memory_report)
+
 # Metrics decorator
 def track_metrics(endpoint):
-    """Decorator to track request metrics"""
+    """Decorator to track request metrics and per-stage latency"""
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             start_time = time.time()
+            g.stage_timer = StageTimer(endpoint, active_model_version)
             
             try:
                 result = f(*args, **kwargs)
@@ -121,10 +198,24 @@ def track_metrics(endpoint):
                 duration = time.time() - start_time
                 REQUEST_DURATION.observe(duration)
                 raise e
+            finally:
+                g.stage_timer.publish()
         
         return decorated_function
     return decorator
 
+def debug_requested():
+    """Whether the caller asked for debug details (?debug=1)"""
+    return request.args.get('debug', '').lower() in ('1', 'true', 'yes')
+
+def stage_response(payload):
+    """Serialize a JSON payload as the 'serialize' stage, adding the stage breakdown in debug mode"""
+    timer = g.stage_timer
+    if debug_requested():
+        payload['debug'] = {'stages_ms': timer.breakdown()}
+    with timer.stage('serialize'):
+        return jsonify(payload)
+
 # Health check endpoint
 @app.route('/health')
 def health_check():
@@ -226,9 +317,10 @@ def index():
 @require_auth
 @limiter.limit("10 per minute")
 @track_metrics('upload')
+@memory_tracked('upload')
 def upload_file():
     """Handle file upload and model training"""
-    global comparator
+    global comparator, active_model_version
     
     try:
         if 'file' not in request.files:
@@ -242,13 +334,18 @@ def upload_file():
         if not file.filename.endswith(('.xlsx', '.xls')):
             return jsonify({'error': 'Invalid file type. Please upload Excel file'}), 400
         
+        timer = g.stage_timer
+        
         # Save uploaded file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        with timer.stage('upload'):
+            filename = secure_filename(file.filename)
+            # Unique path per request so concurrent uploads of the same file name don't collide
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
+            file.save(filepath)
         
         # Read Excel file
-        df = pd.read_excel(filepath)
+        with timer.stage('parse'):
+            df = pd.read_excel(filepath)
         logger.info(f"Processing file: {filename}, Shape: {df.shape}")
         
         # Validate required columns
@@ -262,16 +359,23 @@ def upload_file():
         
         # Initialize comparator and train model
         comparator = LegalNameComparator()
-        X, y = comparator.create_training_data(df)
+        with timer.stage('features'):
+            X, y = comparator.create_training_data(df)
         
         if len(X) == 0:
             return jsonify({'error': 'No valid data pairs found'}), 400
         
         # Train model
-        accuracy = comparator.train_model(X, y)
+        with timer.stage('training'):
+            accuracy = comparator.train_model(X, y)
         
         # Save model to database
-        model_id = save_model_to_db(comparator, accuracy, request.user['user_id'])
+        with timer.stage('persistence'):
+            model_id, active_model_version = save_model_to_db(comparator, accuracy, request.user['user_id'])
+        timer.model_version = active_model_version
+        
+        # Have the other workers pick up the new model when running under serve.py
+        request_model_reload()
         
         # Log prediction metrics
         PREDICTION_ACCURACY.set(accuracy)
@@ -279,7 +383,7 @@ def upload_file():
         # Clean up uploaded file
         os.remove(filepath)
         
-        return jsonify({
+        return stage_response({
             'success': True,
             'message': f'Model trained successfully with {len(X)} data pairs',
             'accuracy': round(accuracy, 4),
@@ -294,6 +398,8 @@ def upload_file():
 @require_auth
 @limiter.limit("100 per minute")
 @track_metrics('predict')
+@profiled('predict')
+@memory_tracked('predict')
 def predict():
     """Handle prediction requests"""
     global comparator
@@ -306,13 +412,18 @@ def predict():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
+        timer = g.stage_timer
+        
         # Save uploaded file
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        with timer.stage('upload'):
+            filename = secure_filename(file.filename)
+            # Unique path per request so concurrent uploads of the same file name don't collide
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
+            file.save(filepath)
         
         # Read Excel file
-        df = pd.read_excel(filepath)
+        with timer.stage('parse'):
+            df = pd.read_excel(filepath)
         
         # Validate required columns
         required_columns = ['name1', 'name2']
@@ -326,29 +437,39 @@ def predict():
         if comparator is None:
             return jsonify({'error': 'No trained model available. Please train a model first.'}), 400
         
-        # Make predictions
-        results = []
-        for _, row in df.iterrows():
-            name1 = str(row['name1'])
-            name2 = str(row['name2'])
-            
-            prediction, probabilities = comparator.predict_materiality(name1, name2)
-            
-            result = {
-                'name1': name1,
-                'name2': name2,
-                'prediction': 'Material' if prediction else 'Immaterial',
-                'is_material': prediction,
-                'materiality_probability': float(probabilities[1]),
-                'immateriality_probability': float(probabilities[0])
-            }
-            results.append(result)
+        # Make predictions (normalize/features/inference, or scoring for pooled batches, are timed inside)
+        names1 = [str(name) for name in df['name1']]
+        names2 = [str(name) for name in df['name2']]
+        if batch_scorer.should_use(len(names1)):
+            predictions, probabilities = batch_scorer.predict_batch(comparator, names1, names2, stage_timer=timer)
+        else:
+            predictions, probabilities = comparator.predict_batch(names1, names2, stage_timer=timer)
+        
+        with timer.stage('response'):
+            results = []
+            for name1, name2, prediction, probability in zip(names1, names2, predictions, probabilities):
+                prediction = bool(prediction)
+                result = {
+                    'name1': name1,
+                    'name2': name2,
+                    'prediction': 'Material' if prediction else 'Immaterial',
+                    'is_material': prediction,
+                    'materiality_probability': float(probability[1]),
+                    'immateriality_probability': float(probability[0])
+                }
+                results.append(result)
         
         # Save predictions to database
-        save_predictions_to_db(results, request.user['user_id'])
+        with timer.stage('persistence'):
+            if app.config['PREDICTION_WRITE_MODE'] == 'deferred':
+                prediction_writer.submit(
+                    save_predictions_in_background, results, request.user['user_id'], active_model_version
+                )
+            else:
+                save_predictions_to_db(results, request.user['user_id'], active_model_version)
         
         # Update metrics
-        PREDICTION_COUNT.labels(model_version='latest').inc()
+        PREDICTION_COUNT.labels(model_version=active_model_version).inc()
         
         # Generate summary
         total_predictions = len(results)
@@ -359,7 +480,7 @@ def predict():
         # Clean up uploaded file
         os.remove(filepath)
         
-        return jsonify({
+        return stage_response({
             'success': True,
             'results': results,
             'summary': {
@@ -374,6 +495,218 @@ def predict():
         logger.error(f"Prediction error: {str(e)}")
         return jsonify({'error': f'Error processing predictions: {str(e)}'}), 500
 
+@app.route('/api/predict/records', methods=['POST'])
+@require_auth
+@track_metrics('predict_records')
+def predict_records():
+    """Score every pair of source names within multi-source records, with a consensus per record"""
+    try:
+        timer = g.stage_timer
+        
+        # JSON {"records": [[name, ...], ...]} or an Excel file with source1..sourceN columns
+        if request.is_json:
+            records = (request.get_json() or {}).get('records')
+            if not isinstance(records, list) or not all(isinstance(r, list) for r in records):
+                return jsonify({'error': 'records must be a list of lists of names'}), 400
+            # Names are hashed and normalized as text; null entries count as blank sources
+            if not all(name is None or isinstance(name, (str, int, float)) for r in records for name in r):
+                return jsonify({'error': 'record names must be strings, numbers or null'}), 400
+        else:
+            if 'file' not in request.files:
+                return jsonify({'error': 'No file uploaded'}), 400
+            
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+            
+            with timer.stage('parse'):
+                df = pd.read_excel(file)
+            records = source_records(df)
+        
+        if comparator is None:
+            return jsonify({'error': 'No trained model available. Please train a model first.'}), 400
+        
+        results = comparator.predict_records(records, stage_timer=timer)
+        
+        PREDICTION_COUNT.labels(model_version=active_model_version).inc()
+        
+        return stage_response({
+            'success': True,
+            'results': results,
+            'summary': {
+                'total_records': len(results),
+                'total_pairs': sum(len(r['pairs']) for r in results),
+                'material_records': sum(1 for r in results if r['consensus'] == 'Material'),
+                'immaterial_records': sum(1 for r in results if r['consensus'] == 'Immaterial')
+            }
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Record prediction error: {str(e)}")
+        return jsonify({'error': f'Error processing records: {str(e)}'}), 500
+
+@app.route('/api/dedupe', methods=['POST'])
+@require_auth
+@limiter.limit("10 per minute")
+@track_metrics('dedupe')
+def dedupe():
+    """Find and score likely-duplicate pairs within one uploaded list of names"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file uploaded'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        timer = g.stage_timer
+        
+        # Read Excel file
+        with timer.stage('parse'):
+            df = pd.read_excel(file)
+        
+        if 'name' not in df.columns:
+            return jsonify({'error': 'Missing required columns: name'}), 400
+        
+        if comparator is None:
+            return jsonify({'error': 'No trained model available. Please train a model first.'}), 400
+        
+        # Blocking tuning: lower threshold finds more pairs and scores more candidates
+        lsh = MinHashLSH(
+            num_perm=int(request.args.get('num_perm', 128)),
+            threshold=float(request.args.get('threshold', 0.5))
+        )
+        min_similarity = request.args.get('min_similarity')
+        duplicates_only = request.args.get('duplicates_only', 'true').lower() == 'true'
+        
+        names = df['name'].dropna().astype(str).tolist()
+        results, report = find_duplicates(
+            comparator, names, lsh,
+            min_similarity=float(min_similarity) if min_similarity is not None else None,
+            recall_sample=int(request.args.get('recall_sample', 0)),
+            scorer=batch_scorer,
+            stage_timer=timer
+        )
+        if request.args.get('cluster', 'false').lower() == 'true':
+            # Group names into entities over the confident Immaterial pairs
+            with timer.stage('clustering'):
+                clusters, cluster_summary = cluster_pairs(
+                    results, min_confidence=float(request.args.get('min_confidence', 0.5))
+                )
+            report['clusters'] = cluster_summary
+        else:
+            clusters = None
+        if duplicates_only:
+            results = [r for r in results if not r['is_material']]
+        
+        PREDICTION_COUNT.labels(model_version=active_model_version).inc()
+        
+        response = {
+            'success': True,
+            'results': results,
+            'summary': report
+        }
+        if clusters is not None:
+            response['clusters'] = group_clusters(clusters)
+        return stage_response(response)
+    
+    except Exception as e:
+        logger.error(f"Dedupe error: {str(e)}")
+        return jsonify({'error': f'Error finding duplicates: {str(e)}'}), 500
+
+def get_registry_index():
+    """The registry index, opened on first use; None when none has been built"""
+    global registry_index
+    if registry_index is None and os.path.exists(os.path.join(app.config['REGISTRY_INDEX_PATH'], 'meta.json')):
+        registry_index = RegistryIndex.load(app.config['REGISTRY_INDEX_PATH'])
+    return registry_index
+
+@app.route('/api/registry/lookup', methods=['GET'])
+@require_auth
+@track_metrics('registry_lookup')
+def registry_lookup():
+    """Find the registry names closest to a name, re-ranked by the model"""
+    try:
+        name = request.args.get('name', '').strip()
+        if not name:
+            return jsonify({'error': 'Name required'}), 400
+        
+        if comparator is None:
+            return jsonify({'error': 'No trained model available. Please train a model first.'}), 400
+        
+        index = get_registry_index()
+        if index is None:
+            return jsonify({'error': 'No registry index available'}), 400
+        
+        results, summary = index.lookup(
+            comparator, name,
+            k=int(request.args.get('k', 10)),
+            rerank=int(request.args.get('rerank', 20))
+        )
+        
+        return stage_response({
+            'success': True,
+            'query': name,
+            'results': results,
+            'summary': summary
+        })
+    
+    except Exception as e:
+        logger.error(f"Registry lookup error: {str(e)}")
+        return jsonify({'error': f'Error looking up name: {str(e)}'}), 500
+
+@app.route('/api/snapshots/diff', methods=['POST'])
+@require_auth
+@limiter.limit("10 per minute")
+@track_metrics('snapshot_diff')
+def snapshot_diff():
+    """Flag entities whose legal name changed materially between two keyed snapshots"""
+    try:
+        for field in ('previous', 'current'):
+            if field not in request.files or request.files[field].filename == '':
+                return jsonify({'error': f'Upload both previous and current snapshots ({field} missing)'}), 400
+        
+        if comparator is None:
+            return jsonify({'error': 'No trained model available. Please train a model first.'}), 400
+        
+        timer = g.stage_timer
+        id_column = request.args.get('id_column', 'id')
+        name_column = request.args.get('name_column', 'name')
+        
+        # Read CSV or Excel snapshots
+        snapshots = {}
+        with timer.stage('parse'):
+            for field in ('previous', 'current'):
+                file = request.files[field]
+                if file.filename.endswith('.csv'):
+                    df = pd.read_csv(file, dtype={name_column: str}, keep_default_na=False)
+                else:
+                    df = pd.read_excel(file, dtype={name_column: str}, keep_default_na=False)
+                snapshots[field] = prepare_snapshot(df, id_column, name_column)
+        
+        flagged, summary = diff_snapshots(
+            comparator, snapshots['previous'], snapshots['current'],
+            min_probability=float(request.args.get('min_probability', 0.5)),
+            scorer=batch_scorer,
+            stage_timer=timer
+        )
+        
+        PREDICTION_COUNT.labels(model_version=active_model_version).inc()
+        
+        return stage_response({
+            'success': True,
+            'results': flagged.to_dict('records'),
+            'summary': summary
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Snapshot diff error: {str(e)}")
+        return jsonify({'error': f'Error comparing snapshots: {str(e)}'}), 500
+
 @app.route('/api/feedback', methods=['POST'])
 @require_auth
 @track_metrics('feedback')
@@ -389,10 +722,10 @@ def submit_feedback():
         if not prediction_id or user_correction is None:
             return jsonify({'error': 'Prediction ID and user correction required'}), 400
         
-        # Save feedback to database
-        feedback_id = save_feedback_to_db(
-            prediction_id, user_correction, confidence_score, feedback_text, request.user['user_id']
-        )
+        # Save feedback to database (acknowledged once its group commit lands)
+        feedback_id = feedback_buffer.submit(
+            (prediction_id, user_correction, confidence_score, feedback_text)
+        ).wait()
         
         return jsonify({
             'success': True,
@@ -411,29 +744,30 @@ def get_daily_analytics():
     """Get daily analytics"""
     try:
         days = int(request.args.get('days', 30))
+        model_version = request.args.get('model_version')
         
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        query = """
+        # Read pre-aggregated daily rollups rather than scanning raw predictions
+        cursor.execute("""
         SELECT 
-            DATE(created_at) as date,
-            COUNT(*) as total_predictions,
-            AVG(confidence) as avg_confidence,
-            COUNT(CASE WHEN prediction = true THEN 1 END) as material_count,
-            COUNT(CASE WHEN prediction = false THEN 1 END) as immaterial_count
-        FROM predictions 
-        WHERE created_at >= NOW() - INTERVAL '%s days'
-        GROUP BY DATE(created_at)
-        ORDER BY date
-        """ % days
-        
-        cursor.execute(query)
+            day as date,
+            SUM(total_predictions) as total_predictions,
+            SUM(confidence_sum) / NULLIF(SUM(total_predictions), 0) as avg_confidence,
+            SUM(material_count) as material_count,
+            SUM(immaterial_count) as immaterial_count
+        FROM prediction_daily_rollups 
+        WHERE day >= CURRENT_DATE - %s
+          AND (%s IS NULL OR model_version = %s)
+        GROUP BY day
+        ORDER BY day
+        """, (days, model_version, model_version))
         results = cursor.fetchall()
         
         return jsonify({
             'success': True,
-            'data': [dict(row) for row in results]
+            'data': [daily_analytics_row(row) for row in results]
         })
     
     except Exception as e:
@@ -443,7 +777,69 @@ def get_daily_analytics():
         if 'conn' in locals():
             conn.close()
 
+@app.route('/api/admin/profiles', methods=['GET'])
+@require_auth
+@require_admin
+def list_profiles():
+    """List stored request profiles, newest first"""
+    try:
+        limit = int(request.args.get('limit', 50))
+        return jsonify({
+            'success': True,
+            'profiles': profile_store.list(limit)
+        })
+    
+    except Exception as e:
+        logger.error(f"Profile list error: {str(e)}")
+        return jsonify({'error': f'Error listing profiles: {str(e)}'}), 500
+
+@app.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+@require_auth
+@require_admin
+def get_profile(profile_id):
+    """Get a profile's top-N summary, or its collapsed stacks with ?format=collapsed"""
+    if request.args.get('format') == 'collapsed':
+        path = profile_store.collapsed_path(profile_id)
+        if path is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        return send_file(path, mimetype='text/plain', as_attachment=True,
+                         download_name=f"{profile_id}.collapsed")
+    
+    summary = profile_store.get(profile_id)
+    if summary is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify({
+        'success': True,
+        'profile': summary
+    })
+
 # Database helper functions
+def load_active_model():
+    """Load the most recent active model recorded in the database, if there is one"""
+    global comparator, active_model_version
+    
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT version, model_path FROM models
+            WHERE is_active
+            ORDER BY created_at DESC
+            LIMIT 1
+        """)
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    
+    if row is None or not os.path.exists(row['model_path']):
+        return False
+    
+    new_comparator = LegalNameComparator()
+    new_comparator.load_model(row['model_path'])
+    comparator = new_comparator
+    active_model_version = row['version']
+    return True
+
 def save_model_to_db(comparator, accuracy, user_id):
     """Save model to database"""
     conn = get_db_connection()
@@ -451,7 +847,8 @@ def save_model_to_db(comparator, accuracy, user_id):
     
     try:
         # Save model file
-        model_path = f"models/model_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.pkl"
+        version = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+        model_path = f"models/model_{version}.pkl"
         os.makedirs('models', exist_ok=True)
         comparator.save_model(model_path)
         
@@ -462,7 +859,7 @@ def save_model_to_db(comparator, accuracy, user_id):
             RETURNING id
         """, (
             'legal_name_comparison',
-            datetime.utcnow().strftime('%Y%m%d_%H%M%S'),
+            version,
             model_path,
             accuracy,
             datetime.utcnow(),
@@ -472,7 +869,7 @@ def save_model_to_db(comparator, accuracy, user_id):
         model_id = cursor.fetchone()['id']
         conn.commit()
         
-        return model_id
+        return model_id, version
     
     except Exception as e:
         conn.rollback()
@@ -480,23 +877,102 @@ def save_model_to_db(comparator, accuracy, user_id):
     finally:
         conn.close()
 
-def save_predictions_to_db(results, user_id):
-    """Save predictions to database"""
+PREDICTION_COLUMNS = ('user_id', 'name1', 'name2', 'prediction', 'confidence')
+
+def iter_prediction_chunks(results, user_id, chunk_size):
+    """Yield prediction rows in bounded chunks"""
+    chunk = []
+    for result in results:
+        chunk.append((
+            user_id,
+            result['name1'],
+            result['name2'],
+            result['is_material'],
+            result['materiality_probability']
+        ))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def copy_prediction_chunk(cursor, rows):
+    """Stream a chunk of prediction rows into Postgres with COPY"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        "COPY predictions (%s) FROM STDIN WITH (FORMAT csv)" % ', '.join(PREDICTION_COLUMNS),
+        buffer
+    )
+
+def insert_prediction_chunk(cursor, rows):
+    """Insert a chunk of prediction rows with multi-row VALUES"""
+    execute_values(
+        cursor,
+        "INSERT INTO predictions (%s) VALUES %%s" % ', '.join(PREDICTION_COLUMNS),
+        rows,
+        page_size=len(rows)
+    )
+
+def daily_analytics_row(row):
+    """JSON-ready daily rollup row; Postgres returns SUM over bigint as numeric (Decimal)"""
+    avg_confidence = row['avg_confidence']
+    return {
+        'date': row['date'],
+        'total_predictions': int(row['total_predictions']),
+        'avg_confidence': float(avg_confidence) if avg_confidence is not None else None,
+        'material_count': int(row['material_count']),
+        'immaterial_count': int(row['immaterial_count'])
+    }
+
+def update_daily_rollup(cursor, results, model_version):
+    """Fold a batch of predictions into today's rollup row for the model"""
+    material_count = sum(1 for r in results if r['is_material'])
+    confidence_sum = sum(float(r['materiality_probability']) for r in results)
+    
+    cursor.execute("""
+        INSERT INTO prediction_daily_rollups
+            (day, model_version, total_predictions, confidence_sum, material_count, immaterial_count)
+        VALUES (CURRENT_DATE, %s, %s, %s, %s, %s)
+        ON CONFLICT (day, model_version) DO UPDATE SET
+            total_predictions = prediction_daily_rollups.total_predictions + EXCLUDED.total_predictions,
+            confidence_sum = prediction_daily_rollups.confidence_sum + EXCLUDED.confidence_sum,
+            material_count = prediction_daily_rollups.material_count + EXCLUDED.material_count,
+            immaterial_count = prediction_daily_rollups.immaterial_count + EXCLUDED.immaterial_count
+    """, (
+        model_version,
+        len(results),
+        confidence_sum,
+        material_count,
+        len(results) - material_count
+    ))
+
+def save_predictions_to_db(results, user_id, model_version='latest'):
+    """Save predictions to database in chunks using COPY, falling back to multi-row INSERTs"""
+    chunk_size = app.config['PREDICTION_WRITE_CHUNK_SIZE']
+    write_chunk = copy_prediction_chunk
+    if app.config['PREDICTION_WRITE_METHOD'] != 'copy':
+        write_chunk = insert_prediction_chunk
+    
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        for result in results:
-            cursor.execute("""
-                INSERT INTO predictions (user_id, name1, name2, prediction, confidence)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (
-                user_id,
-                result['name1'],
-                result['name2'],
-                result['is_material'],
-                result['materiality_probability']
-            ))
+        try:
+            for rows in iter_prediction_chunks(results, user_id, chunk_size):
+                write_chunk(cursor, rows)
+        except psycopg2.Error as e:
+            if write_chunk is not copy_prediction_chunk:
+                raise
+            # COPY can be unavailable behind some poolers/proxies; retry the batch with INSERTs
+            logger.warning(f"COPY failed, falling back to multi-row INSERT: {str(e)}")
+            conn.rollback()
+            for rows in iter_prediction_chunks(results, user_id, chunk_size):
+                insert_prediction_chunk(cursor, rows)
+        
+        if results:
+            update_daily_rollup(cursor, results, model_version)
         
         conn.commit()
     
@@ -506,22 +982,34 @@ def save_predictions_to_db(results, user_id):
     finally:
         conn.close()
 
+def save_predictions_in_background(results, user_id, model_version='latest'):
+    """Persist predictions after the response has been sent"""
+    try:
+        start_time = time.time()
+        save_predictions_to_db(results, user_id, model_version)
+        logger.info(f"Saved {len(results)} predictions in {time.time() - start_time:.3f}s (deferred)")
+    except Exception as e:
+        logger.error(f"Deferred prediction save failed: {str(e)}")
+
 def save_feedback_to_db(prediction_id, user_correction, confidence_score, feedback_text, user_id):
     """Save feedback to database"""
+    return save_feedback_batch_to_db([(prediction_id, user_correction, confidence_score, feedback_text)])[0]
+
+def save_feedback_batch_to_db(rows):
+    """Save a group of feedback rows in one transaction and return their ids in order"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute("""
+        inserted = execute_values(cursor, """
             INSERT INTO feedback (prediction_id, user_correction, confidence_score, feedback_text)
-            VALUES (%s, %s, %s, %s)
+            VALUES %s
             RETURNING id
-        """, (prediction_id, user_correction, confidence_score, feedback_text))
+        """, rows, page_size=len(rows), fetch=True)
         
-        feedback_id = cursor.fetchone()['id']
         conn.commit()
         
-        return feedback_id
+        return [row['id'] for row in inserted]
     
     except Exception as e:
         conn.rollback()
@@ -529,23 +1017,29 @@ def save_feedback_to_db(prediction_id, user_correction, confidence_score, feedba
     finally:
         conn.close()
 
-# System metrics update
-def update_system_metrics():
-    """Update system metrics"""
-    import psutil
-    
-    CPU_USAGE.set(psutil.cpu_percent())
-    MEMORY_USAGE.set(psutil.virtual_memory().percent)
+feedback_buffer = GroupCommitBuffer(
+    save_feedback_batch_to_db,
+    max_items=app.config['FEEDBACK_FLUSH_MAX_ITEMS'],
+    max_delay_ms=app.config['FEEDBACK_FLUSH_INTERVAL_MS'],
+    name='feedback-writer'
+)
 
-# Schedule metrics update
+# Make sure this process has a metrics sampler (workers start without one after fork)
 @app.before_request
 def before_request():
-    """Update system metrics before each request"""
-    update_system_metrics()
+    """Ensure the background metrics sampler is running"""
+    metrics_sampler.ensure_running()
 
-if __name__ == '__main__':
+def init_app():
+    """Create working directories"""
     # Create uploads directory
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+if __name__ == '__main__':
+    init_app()
+    
+    # Start background system metrics sampling
+    metrics_sampler.ensure_running()
     
     # Run the application
     port = int(os.environ.get('PORT', 5001))
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Entity Index
+Persistent name-to-entity index that grows incrementally. Each new name is
+blocked against the names already indexed through their stored MinHash LSH
+band keys, the best candidates are scored with the model, and the name joins
+the entity of its best Immaterial match or starts a new entity. Everything
+lives in one SQLite file and each chunk of new names is committed as it is
+processed, so a daily update costs time proportional to the new names rather
+than to the size of the index.
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from legal_name_comparison import LegalNameComparator
+from blocking import MinHashLSH, shingles, load_names
+
+INDEX_FORMAT_VERSION = 1
+
+# SQLite caps the number of bound parameters per statement
+MAX_SQL_PARAMS = 500
+
+# Blocking settings stored with the index; band keys are only comparable under the same ones
+LSH_SETTINGS = ('num_perm', 'bands', 'threshold', 'shingle_size', 'seed')
+
+class EntityIndex:
+    """Names grouped into entities, with LSH band keys for blocking new names"""
+
+    def __init__(self, db_path='entities.db', lsh=None, busy_timeout_ms=5000):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(
+            db_path,
+            timeout=busy_timeout_ms / 1000.0,
+            isolation_level=None  # explicit transactions via write()
+        )
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.init_schema()
+
+        meta = self.get_meta()
+        if meta:
+            if meta.get('format_version') != INDEX_FORMAT_VERSION:
+                raise ValueError(f"Unsupported entity index format: {meta.get('format_version')}")
+            # An existing index keeps the blocking settings its band keys were built with
+            self.lsh = MinHashLSH(**meta['lsh'])
+        else:
+            self.lsh = lsh or MinHashLSH()
+            self.set_meta({
+                'format_version': INDEX_FORMAT_VERSION,
+                'lsh': {setting: getattr(self.lsh, setting) for setting in LSH_SETTINGS}
+            })
+
+    @contextmanager
+    def write(self):
+        """Run statements in an IMMEDIATE transaction"""
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.conn.cursor()
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+
+    def init_schema(self):
+        """Create the index tables"""
+        with self.write() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS entities (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    canonical_name TEXT NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS names (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL UNIQUE,
+                    normalized TEXT NOT NULL,
+                    entity_id INTEGER NOT NULL REFERENCES entities(id),
+                    matched_name_id INTEGER,
+                    materiality_probability REAL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            # One row per (band, key) of each name; the primary key is the blocking lookup
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS band_keys (
+                    band INTEGER NOT NULL,
+                    key INTEGER NOT NULL,
+                    name_id INTEGER NOT NULL,
+                    PRIMARY KEY (band, key, name_id)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_names_normalized ON names(normalized)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_names_entity ON names(entity_id)')
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS query_keys (row INTEGER, band INTEGER, key INTEGER)')
+
+    def get_meta(self):
+        """Stored index settings, or an empty dict for a new index"""
+        return {key: json.loads(value) for key, value in self.conn.execute('SELECT key, value FROM meta')}
+
+    def set_meta(self, values):
+        """Store index settings"""
+        with self.write() as cursor:
+            cursor.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                               [(key, json.dumps(value)) for key, value in values.items()])
+
+    def _select_in(self, sql, values):
+        """Rows of `sql` (with one {} placeholder list) for values, in chunks under the parameter limit"""
+        rows = []
+        values = list(values)
+        for start in range(0, len(values), MAX_SQL_PARAMS):
+            chunk = values[start:start + MAX_SQL_PARAMS]
+            rows.extend(self.conn.execute(sql.format(', '.join('?' * len(chunk))), chunk).fetchall())
+        return rows
+
+    def add(self, comparator, names, min_confidence=0.5, candidates=20, chunk_size=5000):
+        """Assign each name to an entity, indexing the new ones; yields (results, stats) per chunk.
+
+        A name already in the index keeps its entity ('existing'). A new name
+        whose non-empty normalized form is already indexed joins that entity
+        ('same_normalized'). Otherwise the `candidates` indexed names sharing
+        the most LSH bands with it are scored, and it joins the entity of the
+        best one when that pair is Immaterial with at least min_confidence
+        ('attached'), or starts a new entity ('new'). Names earlier in the same
+        call are candidates too, so a first load builds the entities itself."""
+        seen = set()
+        for start in range(0, len(names), chunk_size):
+            chunk = []
+            for name in names[start:start + chunk_size]:
+                name = str(name)
+                if name not in seen:
+                    seen.add(name)
+                    chunk.append(name)
+            yield self._add_chunk(comparator, chunk, min_confidence, candidates)
+
+    def _add_chunk(self, comparator, names, min_confidence, candidates):
+        """Assign and index one chunk of distinct names"""
+        timings = {}
+        start = time.perf_counter()
+        existing = dict(self._select_in('SELECT name, entity_id FROM names WHERE name IN ({})', names))
+        new_names = [name for name in names if name not in existing]
+        normalized = [comparator.preprocess_legal_name(name) for name in new_names]
+        # Names that normalize to nothing (e.g. a bare 'Ltd') share no identity
+        normalized_entities = dict(self._select_in(
+            'SELECT normalized, MIN(entity_id) FROM names WHERE normalized IN ({}) GROUP BY normalized',
+            set(normalized) - {''}
+        ))
+        timings['lookup'] = time.perf_counter() - start
+
+        # Blocking: band keys of the names that need scoring
+        start = time.perf_counter()
+        first_rows = {}
+        for i, text in enumerate(normalized):
+            first_rows.setdefault(text, i)
+        # Repeats of a normalized name within the chunk follow its first row
+        pending = [i for i, text in enumerate(normalized)
+                   if text not in normalized_entities and first_rows[text] == i]
+        signatures, valid = self.lsh.signatures([shingles(normalized[i], self.lsh.shingle_size) for i in pending])
+        # SQLite integers are signed 64-bit; the view keeps every key bit
+        keys = self.lsh.band_keys(signatures).view(np.int64)
+        row_keys = {i: keys[position] for position, i in enumerate(pending) if valid[position]}
+        candidate_lists, indexed = self._candidates(row_keys, candidates)
+
+        def candidate_name(candidate):
+            kind, value = candidate
+            return new_names[value] if kind == 'row' else indexed[value][0]
+        timings['blocking'] = time.perf_counter() - start
+
+        # One model call for every (new name, candidate) pair in the chunk
+        start = time.perf_counter()
+        pair_rows = [(i, candidate) for i, found in candidate_lists.items() for candidate in found]
+        probabilities = []
+        if pair_rows:
+            _, probabilities = comparator.predict_batch([new_names[i] for i, _ in pair_rows],
+                                                        [candidate_name(candidate) for _, candidate in pair_rows])
+        best = {}
+        for (i, candidate), probability in zip(pair_rows, probabilities):
+            if i not in best or probability[1] < best[i][1]:
+                best[i] = (candidate, float(probability[1]))
+        timings['scoring'] = time.perf_counter() - start
+
+        # Assign in input order, so a name can join an entity started earlier in the chunk
+        start = time.perf_counter()
+        results = {}
+        stats = {'names': len(names), 'existing': 0, 'same_normalized': 0, 'attached': 0, 'new': 0,
+                 'scored_pairs': len(pair_rows)}
+        row_entities = {}
+        row_ids = {}
+        with self.write() as cursor:
+            for name in names:
+                if name in existing:
+                    results[name] = {'name': name, 'entity_id': existing[name], 'status': 'existing'}
+                    stats['existing'] += 1
+            for i, name in enumerate(new_names):
+                result = {'name': name}
+                matched_name_id = None
+                probability = None
+                if normalized[i] and normalized[i] in normalized_entities:
+                    entity_id = normalized_entities[normalized[i]]
+                    result['status'] = 'same_normalized'
+                elif i in best and best[i][1] <= 0.5 and 1.0 - best[i][1] >= min_confidence:
+                    candidate, probability = best[i]
+                    kind, value = candidate
+                    if kind == 'row':
+                        entity_id, matched_name_id = row_entities[value], row_ids[value]
+                    else:
+                        entity_id, matched_name_id = indexed[value][1], value
+                    result.update({'status': 'attached',
+                                   'matched_name': candidate_name(candidate),
+                                   'materiality_probability': probability})
+                else:
+                    cursor.execute('INSERT INTO entities (canonical_name, size) VALUES (?, 0)', (name,))
+                    entity_id = cursor.lastrowid
+                    result['status'] = 'new'
+                    if i in best:
+                        result['materiality_probability'] = best[i][1]
+
+                cursor.execute('''
+                    INSERT INTO names (name, normalized, entity_id, matched_name_id, materiality_probability)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (name, normalized[i], entity_id, matched_name_id, probability))
+                row_ids[i] = cursor.lastrowid
+                row_entities[i] = entity_id
+                if normalized[i]:
+                    normalized_entities.setdefault(normalized[i], entity_id)
+                cursor.execute('UPDATE entities SET size = size + 1 WHERE id = ?', (entity_id,))
+                if i in row_keys:
+                    cursor.executemany('INSERT OR IGNORE INTO band_keys (band, key, name_id) VALUES (?, ?, ?)',
+                                       [(band, int(key), row_ids[i]) for band, key in enumerate(row_keys[i])])
+
+                result['entity_id'] = entity_id
+                stats[result['status']] += 1
+                results[name] = result
+        timings['write'] = time.perf_counter() - start
+
+        stats['timings_ms'] = {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
+        return [results[name] for name in names], stats
+
+    def _candidates(self, row_keys, limit):
+        """Up to `limit` candidates per chunk row, most shared bands first.
+
+        Returns (candidate_lists, indexed): candidates are ('name', name_id) for
+        indexed names and ('row', i) for earlier rows of the same chunk, and
+        indexed maps each candidate name_id to its (name, entity_id)."""
+        shared = {}
+        if row_keys:
+            self.conn.execute('DELETE FROM query_keys')
+            self.conn.executemany('INSERT INTO query_keys (row, band, key) VALUES (?, ?, ?)',
+                                  [(i, band, int(key)) for i, keys in row_keys.items() for band, key in enumerate(keys)])
+            matches = self.conn.execute('''
+                SELECT q.row, b.name_id, COUNT(*)
+                FROM query_keys q
+                JOIN band_keys b ON b.band = q.band AND b.key = q.key
+                GROUP BY q.row, b.name_id
+            ''')
+            for i, name_id, count in matches:
+                shared.setdefault(i, {})[('name', name_id)] = count
+
+        # Earlier rows of this chunk sharing a band
+        buckets = {}
+        for i in sorted(row_keys):
+            for band, key in enumerate(row_keys[i]):
+                bucket = buckets.setdefault((band, int(key)), [])
+                # Oversized buckets (usually one very common name) are not expanded
+                if len(bucket) >= self.lsh.max_bucket_size:
+                    continue
+                for j in bucket:
+                    row_shared = shared.setdefault(i, {})
+                    row_shared[('row', j)] = row_shared.get(('row', j), 0) + 1
+                bucket.append(i)
+
+        candidate_lists = {i: sorted(found, key=lambda c: -found[c])[:limit] for i, found in shared.items()}
+        name_ids = {value for found in candidate_lists.values() for kind, value in found if kind == 'name'}
+        indexed = {name_id: (name, entity_id) for name_id, name, entity_id in self._select_in(
+            'SELECT id, name, entity_id FROM names WHERE id IN ({})', name_ids
+        )}
+        return candidate_lists, indexed
+
+    def entity_of(self, name):
+        """Entity id of an indexed name, or None"""
+        row = self.conn.execute('SELECT entity_id FROM names WHERE name = ?', (str(name),)).fetchone()
+        return row[0] if row else None
+
+    def entity_names(self, entity_id):
+        """Names of one entity, in the order they were added"""
+        rows = self.conn.execute('SELECT name FROM names WHERE entity_id = ? ORDER BY id', (entity_id,))
+        return [row[0] for row in rows]
+
+    def stats(self):
+        """Name, entity and largest-entity counts"""
+        names = self.conn.execute('SELECT COUNT(*) FROM names').fetchone()[0]
+        entities, largest = self.conn.execute('SELECT COUNT(*), COALESCE(MAX(size), 0) FROM entities').fetchone()
+        return {'names': names, 'entities': entities, 'largest_entity': largest,
+                'lsh': {setting: getattr(self.lsh, setting) for setting in LSH_SETTINGS}}
+
+    def export(self):
+        """All indexed names with their entity ids as a DataFrame"""
+        return pd.read_sql_query('''
+            SELECT n.name, n.entity_id, e.canonical_name, e.size AS entity_size
+            FROM names n JOIN entities e ON e.id = n.entity_id
+            ORDER BY n.entity_id, n.id
+        ''', self.conn)
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain a persistent name-to-entity index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    update_parser = subparsers.add_parser('update', help='Assign new names to entities and index them')
+    update_parser.add_argument('names', help='Excel/CSV file of names to add')
+    update_parser.add_argument('--index', default='entities.db', help='Entity index database')
+    update_parser.add_argument('--column', default='name', help='Column holding the names')
+    update_parser.add_argument('--model', default='legal_name_model.pkl', help='Trained model to score with')
+    update_parser.add_argument('--output', default='entity_assignments.csv', help='CSV file for the assignments')
+    update_parser.add_argument('--min-confidence', type=float, default=0.5,
+                               help='Join an entity only when the best match is Immaterial with at least this confidence')
+    update_parser.add_argument('--candidates', type=int, default=20, help='Indexed names scored per new name')
+    update_parser.add_argument('--chunk-size', type=int, default=5000, help='Names committed per transaction')
+    update_parser.add_argument('--threshold', type=float, default=0.5,
+                               help='LSH similarity threshold (used when creating a new index)')
+    update_parser.add_argument('--num-perm', type=int, default=128,
+                               help='MinHash permutations (used when creating a new index)')
+
+    stats_parser = subparsers.add_parser('stats', help='Show index counts')
+    stats_parser.add_argument('--index', default='entities.db', help='Entity index database')
+
+    export_parser = subparsers.add_parser('export', help='Write every indexed name with its entity')
+    export_parser.add_argument('--index', default='entities.db', help='Entity index database')
+    export_parser.add_argument('--output', default='entities.csv', help='CSV file to write')
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        index = EntityIndex(args.index)
+        print(json.dumps(index.stats(), indent=2))
+        return
+    if args.command == 'export':
+        index = EntityIndex(args.index)
+        index.export().to_csv(args.output, index=False)
+        print(f"Exported {index.stats()['names']:,} names -> {args.output}")
+        return
+
+    comparator = LegalNameComparator()
+    comparator.load_model(args.model)
+    index = EntityIndex(args.index, MinHashLSH(num_perm=args.num_perm, threshold=args.threshold))
+    names = load_names(args.names, args.column)
+    print(f"Adding {len(names):,} names to {args.index}...")
+
+    start_time = time.time()
+    totals = {'existing': 0, 'same_normalized': 0, 'attached': 0, 'new': 0, 'scored_pairs': 0}
+    columns = ['name', 'entity_id', 'status', 'matched_name', 'materiality_probability']
+    with open(args.output, 'w', newline='') as f:
+        header = True
+        for results, stats in index.add(comparator, names, args.min_confidence, args.candidates, args.chunk_size):
+            pd.DataFrame(results, columns=columns).to_csv(f, index=False, header=header)
+            header = False
+            for key in totals:
+                totals[key] += stats[key]
+
+    print(f"Names: {totals['existing']:,} already indexed, {totals['same_normalized']:,} same normalized name, "
+          f"{totals['attached']:,} attached, {totals['new']:,} new entities ({totals['scored_pairs']:,} pairs scored)")
+    summary = index.stats()
+    print(f"Index: {summary['names']:,} names in {summary['entities']:,} entities")
+    print(f"Finished in {time.time() - start_time:.1f}s -> {args.output}")
+
+if __name__ == "__main__":
+    main()
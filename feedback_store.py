@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Feedback Store
+SQLite persistence layer for the feedback loop, tuned for concurrent writers:
+WAL journaling, per-thread reusable connections, covering indexes and set-based updates
+"""
+
+import os
+import sqlite3
+import threading
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# SQLite caps the number of bound parameters per statement
+MAX_SQL_PARAMS = 500
+
+class PendingWrite:
+    """Handle for an item queued in a GroupCommitBuffer"""
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the item's batch has been committed and return its result"""
+        if not self._done.wait(timeout):
+            raise TimeoutError('Write was not flushed in time')
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class GroupCommitBuffer:
+    """Write-behind buffer that commits queued items in groups.
+
+    A background thread flushes as soon as items are waiting, lingering up to
+    max_delay_ms to collect up to max_items into one transaction. Callers wait
+    on the returned PendingWrite, so success is only acknowledged once durable.
+    flush_batch must be all-or-nothing: a failed group is split and retried
+    until each failing item gets its own error.
+    """
+
+    def __init__(self, flush_batch, max_items=100, max_delay_ms=5, name='group-commit'):
+        self.flush_batch = flush_batch
+        self.max_items = max_items
+        self.max_delay = max_delay_ms / 1000.0
+        self.name = name
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Locks and threads do not survive a fork; start clean in the child
+        self._cond = threading.Condition()
+        self._pending = []
+        self._thread = None
+
+    def submit(self, item):
+        """Queue an item for the next group commit"""
+        pending = PendingWrite(item)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._pending.append(pending)
+            self._cond.notify()
+        return pending
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.max_delay
+                while len(self._pending) < self.max_items:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[:self.max_items]
+                del self._pending[:self.max_items]
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            results = self.flush_batch([pending.item for pending in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # One bad item must not fail the others: retry each half so the
+                # failure narrows down to the items that actually caused it
+                logger.warning(f"{self.name} flush of {len(batch)} items failed, splitting: {str(e)}")
+                middle = len(batch) // 2
+                self._flush(batch[:middle])
+                self._flush(batch[middle:])
+                return
+            logger.error(f"{self.name} write failed: {str(e)}")
+            batch[0].error = e
+            batch[0]._done.set()
+            return
+
+        for pending, result in zip(batch, results):
+            pending.result = result
+            pending._done.set()
+
+class TTLCache:
+    """Short-lived result cache with explicit invalidation"""
+
+    def __init__(self, ttl_seconds=5):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generations = {}
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() when missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl_seconds:
+                return entry[0]
+            generation = self._generations.get(key, 0)
+
+        value = loader()
+
+        with self._lock:
+            # Skip the store if the key was invalidated while loading
+            if self._generations.get(key, 0) == generation:
+                self._entries[key] = (value, time.monotonic())
+        return value
+
+    def invalidate(self, *keys):
+        """Drop cached values so the next read reloads them"""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+class FeedbackStore:
+    def __init__(self, db_path='feedback.db', busy_timeout_ms=5000, count_refresh_seconds=60,
+                 stats_cache_seconds=5):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.count_refresh_seconds = count_refresh_seconds
+        self._local = threading.local()
+        self._cache = TTLCache(stats_cache_seconds)
+
+        # In-memory feedback counters, resynced from the database periodically
+        self._counts_lock = threading.Lock()
+        self._unprocessed = 0
+        self._total = 0
+        self._counts_loaded_at = None
+
+    def connection(self):
+        """Get this thread's connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        # Connections must not be shared across a fork
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            isolation_level=None,  # explicit transactions via write()
+            check_same_thread=False
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def write(self):
+        """Run statements in an IMMEDIATE transaction so writers queue instead of deadlocking"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn.cursor()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def init_schema(self):
+        """Create feedback tables and indexes"""
+        with self.write() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS feedback (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    prediction_id TEXT,
+                    name1 TEXT NOT NULL,
+                    name2 TEXT NOT NULL,
+                    original_prediction BOOLEAN NOT NULL,
+                    user_correction BOOLEAN NOT NULL,
+                    confidence_score REAL,
+                    feedback_text TEXT,
+                    processed BOOLEAN DEFAULT FALSE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS model_versions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    version TEXT NOT NULL,
+                    accuracy REAL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    is_active BOOLEAN DEFAULT FALSE
+                )
+            ''')
+
+            # Covers the retraining queue query (filter, order and selected columns)
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_feedback_queue
+                ON feedback(processed, created_at DESC, name1, name2,
+                            original_prediction, user_correction, confidence_score)
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_created_at ON feedback(created_at)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_model_versions_created_at ON model_versions(created_at)')
+
+    def save_feedback(self, name1, name2, original_prediction, user_correction, confidence_score, feedback_text=""):
+        """Insert a feedback row and return its id"""
+        return self.save_feedback_batch([
+            (name1, name2, original_prediction, user_correction, confidence_score, feedback_text)
+        ])[0]
+
+    def save_feedback_batch(self, rows):
+        """Insert feedback rows in a single transaction and return their ids in order"""
+        feedback_ids = []
+        with self.write() as cursor:
+            for row in rows:
+                cursor.execute('''
+                    INSERT INTO feedback (name1, name2, original_prediction, user_correction, confidence_score, feedback_text)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', row)
+                feedback_ids.append(cursor.lastrowid)
+
+        with self._counts_lock:
+            self._unprocessed += len(feedback_ids)
+            self._total += len(feedback_ids)
+        self._cache.invalidate('feedback_stats')
+        return feedback_ids
+
+    def get_unprocessed_feedback(self, limit=100):
+        """Get the newest unprocessed feedback rows"""
+        cursor = self.connection().execute('''
+            SELECT name1, name2, original_prediction, user_correction, confidence_score
+            FROM feedback
+            WHERE processed = FALSE
+            ORDER BY created_at DESC
+            LIMIT ?
+        ''', (limit,))
+        return cursor.fetchall()
+
+    def count_feedback(self):
+        """Return (unprocessed, total) feedback counts"""
+        cursor = self.connection().execute('''
+            SELECT COUNT(*), COALESCE(SUM(CASE WHEN processed = FALSE THEN 1 ELSE 0 END), 0)
+            FROM feedback
+        ''')
+        total, unprocessed = cursor.fetchone()
+        return unprocessed, total
+
+    def feedback_counts(self):
+        """Return (unprocessed, total) from the in-memory counters.
+
+        Counters are loaded from the database on first use and resynced every
+        count_refresh_seconds to pick up writes made by other processes.
+        """
+        with self._counts_lock:
+            stale = (
+                self._counts_loaded_at is None
+                or time.monotonic() - self._counts_loaded_at >= self.count_refresh_seconds
+            )
+        if stale:
+            unprocessed, total = self.count_feedback()
+            with self._counts_lock:
+                self._unprocessed, self._total = unprocessed, total
+                self._counts_loaded_at = time.monotonic()
+
+        with self._counts_lock:
+            return self._unprocessed, self._total
+
+    def feedback_stats(self):
+        """Get total, unprocessed and correction counts from one cached table scan"""
+        return self._cache.get('feedback_stats', self._load_feedback_stats)
+
+    def _load_feedback_stats(self):
+        cursor = self.connection().execute('''
+            SELECT
+                COUNT(*),
+                COALESCE(SUM(CASE WHEN processed = FALSE THEN 1 ELSE 0 END), 0),
+                COALESCE(SUM(CASE WHEN original_prediction != user_correction THEN 1 ELSE 0 END), 0)
+            FROM feedback
+        ''')
+        total, unprocessed, corrections = cursor.fetchone()
+        return {
+            'total_feedback': total,
+            'unprocessed_feedback': unprocessed,
+            'corrections_count': corrections
+        }
+
+    def mark_feedback_processed(self, feedback_ids):
+        """Mark the given feedback ids as processed with set-based updates"""
+        feedback_ids = list(feedback_ids)
+        updated = 0
+        with self.write() as cursor:
+            for start in range(0, len(feedback_ids), MAX_SQL_PARAMS):
+                batch = feedback_ids[start:start + MAX_SQL_PARAMS]
+                placeholders = ', '.join('?' * len(batch))
+                cursor.execute(
+                    f'UPDATE feedback SET processed = TRUE WHERE processed = FALSE AND id IN ({placeholders})',
+                    batch
+                )
+                updated += cursor.rowcount
+
+        with self._counts_lock:
+            self._unprocessed = max(0, self._unprocessed - updated)
+        self._cache.invalidate('feedback_stats')
+        return updated
+
+    def mark_all_processed(self):
+        """Mark every unprocessed feedback row as processed"""
+        with self.write() as cursor:
+            cursor.execute('UPDATE feedback SET processed = TRUE WHERE processed = FALSE')
+            updated = cursor.rowcount
+
+        with self._counts_lock:
+            self._unprocessed = 0
+        self._cache.invalidate('feedback_stats')
+        return updated
+
+    def save_model_version(self, accuracy):
+        """Record a new active model version and deactivate the previous one"""
+        version = datetime.now().strftime('%Y%m%d_%H%M%S')
+        with self.write() as cursor:
+            cursor.execute('UPDATE model_versions SET is_active = FALSE WHERE is_active = TRUE')
+            cursor.execute('''
+                INSERT INTO model_versions (version, accuracy, is_active)
+                VALUES (?, ?, TRUE)
+            ''', (version, accuracy))
+            model_id = cursor.lastrowid
+
+        self._cache.invalidate('model_versions')
+        return model_id
+
+    def get_model_versions(self):
+        """Get model version history, newest first (cached)"""
+        return self._cache.get('model_versions', self._load_model_versions)
+
+    def _load_model_versions(self):
+        cursor = self.connection().execute('''
+            SELECT version, accuracy, created_at, is_active
+            FROM model_versions
+            ORDER BY created_at DESC
+        ''')
+        return [
+            {
+                'version': row[0],
+                'accuracy': row[1],
+                'created_at': row[2],
+                'is_active': bool(row[3])
+            }
+            for row in cursor.fetchall()
+        ]
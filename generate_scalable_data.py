@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Scalable synthetic data generator for legal name comparison
+Streams any number of seeded, labelled name pairs to CSV or Parquet in chunks,
+built from the comprehensive and extended scenario generators
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+import pandas as pd
+
+from generate_comprehensive_data import (
+    generate_realistic_legal_names,
+    create_material_changes,
+    create_immaterial_changes
+)
+from generate_extended_data import (
+    generate_special_characters,
+    generate_legal_suffixes,
+    generate_common_words,
+    generate_immaterial_scenarios,
+    generate_material_scenarios,
+    generate_special_character_scenarios,
+    generate_legal_suffix_scenarios
+)
+
+# Relative weight of each scenario family
+DEFAULT_SCENARIO_MIX = {
+    'material': 4,
+    'immaterial': 4,
+    'special_character': 1,
+    'legal_suffix': 1
+}
+
+# Relative weight of short / medium / long base names
+DEFAULT_LENGTH_MIX = {
+    'short': 2,
+    'medium': 6,
+    'long': 2
+}
+
+# Word count of a worst-case long name
+LONG_NAME_WORDS = (30, 60)
+
+LAYOUTS = {
+    'training': ['source1', 'source2', 'source3', 'is_material'],
+    'prediction': ['name1', 'name2', 'is_material']
+}
+
+# Scenario pools, built once per process by init_worker
+_pools = None
+
+def parse_mix(text, defaults):
+    """Parse 'key=weight,key=weight' into a weight dict, keeping defaults for unset keys"""
+    mix = dict(defaults)
+    if not text:
+        return mix
+    for item in text.split(','):
+        key, _, weight = item.partition('=')
+        key = key.strip()
+        if key not in defaults:
+            raise ValueError(f"Unknown mix key '{key}', expected one of {', '.join(defaults)}")
+        mix[key] = float(weight)
+    if sum(mix.values()) <= 0:
+        raise ValueError('Mix weights must not all be zero')
+    return mix
+
+def build_pools(seed):
+    """Build the base names and fixed scenario lists every chunk draws from"""
+    rng_state = random.getstate()
+    random.seed(seed)
+    base_names = []
+    # Each call yields 100 names; a few calls give enough variety for large runs
+    for _ in range(20):
+        base_names.extend(generate_realistic_legal_names())
+    random.setstate(rng_state)
+
+    return {
+        'base_names': sorted(set(base_names)),
+        'extended_immaterial': generate_immaterial_scenarios(),
+        'extended_material': generate_material_scenarios(),
+        'special_character': generate_special_character_scenarios(),
+        'legal_suffix': generate_legal_suffix_scenarios(),
+        'special_characters': generate_special_characters(),
+        'legal_suffixes': generate_legal_suffixes(),
+        'common_words': generate_common_words()
+    }
+
+def init_worker(seed):
+    """Pool initializer: build the scenario pools once per worker process"""
+    global _pools
+    _pools = build_pools(seed)
+
+def short_name(name):
+    """First word and legal suffix of a base name"""
+    words = name.split()
+    return f"{words[0]} {words[-1]}" if len(words) > 2 else name
+
+def long_name(name, pools, rng):
+    """Base name with extra qualifier words inserted before the legal suffix"""
+    words = name.split()
+    extra = rng.sample(pools['common_words'], rng.randint(2, 5))
+    return ' '.join(words[:-1] + extra + words[-1:])
+
+def worst_case_name(pools, rng):
+    """Very long name mixing words, symbols and stacked legal suffixes"""
+    parts = []
+    for _ in range(rng.randint(*LONG_NAME_WORDS)):
+        roll = rng.random()
+        if roll < 0.35:
+            parts.append(rng.choice(pools['common_words']))
+        elif roll < 0.7:
+            parts.append(rng.choice(rng.choice(pools['base_names']).split()))
+        elif roll < 0.85:
+            parts.append(rng.choice(pools['special_characters']))
+        else:
+            parts.append(rng.choice(pools['legal_suffixes']))
+    return ' '.join(parts)
+
+def make_base_name(pools, rng, length_mix):
+    """Draw a base name with the configured length profile"""
+    name = rng.choice(pools['base_names'])
+    profile = rng.choices(list(length_mix), weights=list(length_mix.values()))[0]
+    if profile == 'short':
+        return short_name(name)
+    if profile == 'long':
+        return long_name(name, pools, rng)
+    return name
+
+def make_pair(pools, rng, scenario_mix, length_mix, long_rate):
+    """Generate one (name1, name2, is_material) pair"""
+    scenario = rng.choices(list(scenario_mix), weights=list(scenario_mix.values()))[0]
+
+    if scenario in ('material', 'immaterial'):
+        if rng.random() < long_rate:
+            base = worst_case_name(pools, rng)
+        else:
+            base = make_base_name(pools, rng, length_mix)
+
+        # Mix in the hand-written extended scenarios alongside the generated ones
+        if rng.random() < 0.1:
+            name1, name2, is_material = rng.choice(pools[f'extended_{scenario}'])
+            return name1, name2, int(is_material)
+        if scenario == 'material':
+            name1, name2 = create_material_changes(base)
+            return name1, name2, 1
+        name1, name2 = create_immaterial_changes(base)
+        return name1, name2, 0
+
+    name1, name2, is_material = rng.choice(pools[scenario])
+    return name1, name2, int(is_material)
+
+def generate_chunk(task):
+    """Generate one chunk of pairs as a DataFrame; deterministic in (seed, chunk index)"""
+    chunk_index, rows, options = task
+    pools = _pools if _pools is not None else build_pools(options['seed'])
+
+    # The comprehensive generators draw from the module-level random, so seed both
+    chunk_seed = f"{options['seed']}-{chunk_index}"
+    random.seed(chunk_seed)
+    rng = random.Random(chunk_seed)
+
+    pairs = []
+    for _ in range(rows):
+        if pairs and rng.random() < options['duplicate_rate']:
+            pairs.append(rng.choice(pairs))
+            continue
+        pairs.append(make_pair(pools, rng, options['scenario_mix'], options['length_mix'], options['long_rate']))
+
+    df = pd.DataFrame(pairs, columns=['name1', 'name2', 'is_material'])
+    if options['layout'] == 'training':
+        df = df.rename(columns={'name1': 'source1', 'name2': 'source2'})
+        df.insert(2, 'source3', '')
+    return df[LAYOUTS[options['layout']]]
+
+def chunk_tasks(num_rows, chunk_size, options):
+    """Split num_rows into (chunk index, rows, options) tasks"""
+    for chunk_index, start in enumerate(range(0, num_rows, chunk_size)):
+        yield chunk_index, min(chunk_size, num_rows - start), options
+
+class ChunkWriter:
+    """Appends DataFrame chunks to a single CSV or Parquet file"""
+
+    def __init__(self, path, file_format):
+        self.path = path
+        self.file_format = file_format
+        self._parquet_writer = None
+        self._header_written = False
+
+        if file_format == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise RuntimeError('Parquet output requires pyarrow (pip install pyarrow)')
+        elif file_format != 'csv':
+            raise ValueError(f"Unsupported format: {file_format}")
+
+    def write(self, df):
+        """Append one chunk"""
+        if self.file_format == 'csv':
+            df.to_csv(self.path, mode='a' if self._header_written else 'w',
+                      header=not self._header_written, index=False)
+            self._header_written = True
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+        self._parquet_writer.write_table(table)
+
+    def close(self):
+        """Finish the file"""
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+
+def iter_chunks(num_rows, seed=42, chunk_size=100000, workers=1, layout='prediction',
+                scenario_mix=None, length_mix=None, long_rate=0.001, duplicate_rate=0.05):
+    """Yield generated DataFrame chunks in order; output is identical for any worker count"""
+    options = {
+        'seed': seed,
+        'layout': layout,
+        'scenario_mix': scenario_mix or DEFAULT_SCENARIO_MIX,
+        'length_mix': length_mix or DEFAULT_LENGTH_MIX,
+        'long_rate': long_rate,
+        'duplicate_rate': duplicate_rate
+    }
+    tasks = chunk_tasks(num_rows, chunk_size, options)
+
+    if workers <= 1:
+        init_worker(seed)
+        for task in tasks:
+            yield generate_chunk(task)
+        return
+
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(seed,)) as pool:
+        # imap keeps chunk order while workers run ahead
+        for df in pool.imap(generate_chunk, tasks):
+            yield df
+
+def generate_file(path, num_rows, file_format=None, **kwargs):
+    """Stream num_rows generated pairs to a CSV or Parquet file; returns rows written"""
+    file_format = file_format or ('parquet' if path.endswith('.parquet') else 'csv')
+    writer = ChunkWriter(path, file_format)
+    written = 0
+    try:
+        for df in iter_chunks(num_rows, **kwargs):
+            writer.write(df)
+            written += len(df)
+    finally:
+        writer.close()
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream seeded synthetic legal name pairs to CSV or Parquet')
+    parser.add_argument('--rows', type=int, default=1000000, help='Number of pairs to generate')
+    parser.add_argument('--output', default=None, help='Output file (default: scalable_<layout>_data_<rows>.<format>)')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv', help='Output format')
+    parser.add_argument('--layout', choices=list(LAYOUTS), default='prediction',
+                        help='training: source1/source2/source3/is_material, prediction: name1/name2/is_material')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='Pairs per chunk')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--scenario-mix', default=None,
+                        help='Scenario weights, e.g. material=4,immaterial=4,special_character=1,legal_suffix=1')
+    parser.add_argument('--length-mix', default=None,
+                        help='Base name length weights, e.g. short=2,medium=6,long=2')
+    parser.add_argument('--long-rate', type=float, default=0.001,
+                        help='Fraction of pairs built on a worst-case long name (30-60 words)')
+    parser.add_argument('--duplicate-rate', type=float, default=0.05,
+                        help='Fraction of pairs that repeat an earlier pair in the same chunk')
+    args = parser.parse_args()
+
+    try:
+        scenario_mix = parse_mix(args.scenario_mix, DEFAULT_SCENARIO_MIX)
+        length_mix = parse_mix(args.length_mix, DEFAULT_LENGTH_MIX)
+    except ValueError as e:
+        parser.error(str(e))
+
+    output = args.output or f"scalable_{args.layout}_data_{args.rows}.{args.format}"
+
+    print(f"Generating {args.rows:,} pairs with {args.workers} worker(s) -> {output}")
+    start = time.time()
+    try:
+        written = generate_file(
+            output, args.rows, args.format,
+            seed=args.seed,
+            chunk_size=args.chunk_size,
+            workers=args.workers,
+            layout=args.layout,
+            scenario_mix=scenario_mix,
+            length_mix=length_mix,
+            long_rate=args.long_rate,
+            duplicate_rate=args.duplicate_rate
+        )
+    except RuntimeError as e:
+        parser.error(str(e))
+    elapsed = time.time() - start
+    print(f"Wrote {written:,} pairs in {elapsed:.1f}s ({written / max(elapsed, 1e-9):,.0f} pairs/s)")
+
+if __name__ == "__main__":
+    main()
@@ -57,6 +57,17 @@ CREATE TABLE feedback (
     created_by UUID REFERENCES users(id)
 );
 
+-- Daily prediction rollups, maintained incrementally as predictions are saved
+CREATE TABLE prediction_daily_rollups (
+    day DATE NOT NULL,
+    model_version VARCHAR(50) NOT NULL,
+    total_predictions BIGINT NOT NULL DEFAULT 0,
+    confidence_sum DECIMAL(18,4) NOT NULL DEFAULT 0,
+    material_count BIGINT NOT NULL DEFAULT 0,
+    immaterial_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, model_version)
+);
+
 -- Model performance metrics
 CREATE TABLE model_metrics (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -132,6 +143,20 @@ SELECT
 FROM predictions 
 GROUP BY DATE(created_at);
 
+-- Backfill rollups from existing prediction rows (no-op on a fresh database)
+INSERT INTO prediction_daily_rollups (day, model_version, total_predictions, confidence_sum, material_count, immaterial_count)
+SELECT
+    DATE(p.created_at),
+    COALESCE(m.version, 'latest'),
+    COUNT(*),
+    COALESCE(SUM(p.confidence), 0),
+    COUNT(CASE WHEN p.prediction = true THEN 1 END),
+    COUNT(CASE WHEN p.prediction = false THEN 1 END)
+FROM predictions p
+LEFT JOIN models m ON m.id = p.model_id
+GROUP BY DATE(p.created_at), COALESCE(m.version, 'latest')
+ON CONFLICT (day, model_version) DO NOTHING;
+
 CREATE VIEW model_performance AS
 SELECT 
     m.name,
@@ -4,16 +4,20 @@ import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 from sklearn.preprocessing import LabelEncoder
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from fuzzywuzzy import fuzz
 import jellyfish
+import math
 import re
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 import pickle
 import os
+import time
+import threading
+from contextlib import nullcontext
+
+from cpu_budget import default_budget
 
 # Download required NLTK data
 try:
@@ -25,11 +29,224 @@ try:
 except LookupError:
     nltk.download('stopwords')
 
-class LegalNameComparator:
+def _stage(stage_timer, name):
+    """Time a pipeline stage when a stage timer is supplied"""
+    return stage_timer.stage(name) if stage_timer is not None else nullcontext()
+
+def _ratio(numerator, denominator):
+    """Divide, returning 0 for an empty denominator"""
+    return numerator / denominator if denominator > 0 else 0
+
+# Word tokens TfidfVectorizer uses by default (two or more word characters)
+_TFIDF_TOKEN = re.compile(r"(?u)\b\w\w+\b")
+
+# Smoothed idf, ln((1 + n) / (1 + df)) + 1, over a two-name corpus: a term in
+# both names gets 1 and a term in only one gets ln(1.5) + 1 (squared here)
+_IDF_UNIQUE_SQUARED = (math.log(1.5) + 1) ** 2
+
+def _tfidf_terms(text):
+    """Unigram and bigram counts of a name, as TfidfVectorizer(ngram_range=(1, 2)) tokenizes it"""
+    tokens = _TFIDF_TOKEN.findall(text.lower())
+    counts = {}
+    for term in tokens + [' '.join(pair) for pair in zip(tokens, tokens[1:])]:
+        counts[term] = counts.get(term, 0) + 1
+    return counts
+
+def _tfidf_cosine(terms1, weight1, terms2, weight2):
+    """Cosine of two names' TF-IDF vectors with the vectorizer fitted on just the pair.
+
+    weight is the sum of squared term counts. Only shared terms are visited:
+    they carry idf 1 and the remaining terms of each name share one idf, so
+    each norm follows from the shared part and the weight."""
+    if len(terms2) < len(terms1):
+        terms1, weight1, terms2, weight2 = terms2, weight2, terms1, weight1
+    dot = shared1 = shared2 = 0
+    for term, count in terms1.items():
+        other = terms2.get(term)
+        if other:
+            dot += count * other
+            shared1 += count * count
+            shared2 += other * other
+    if not dot:
+        return 0.0
+    norm1 = math.sqrt(_IDF_UNIQUE_SQUARED * (weight1 - shared1) + shared1)
+    norm2 = math.sqrt(_IDF_UNIQUE_SQUARED * (weight2 - shared2) + shared2)
+    return dot / (norm1 * norm2)
+
+# Fixed bit positions for ASCII characters in NameSignature.char_mask; the
+# common ones come first so typical masks fit in a machine word or two
+_COMMON_CHARS = 'abcdefghijklmnopqrstuvwxyz0123456789_'
+_ASCII_BITS = {char: bit for bit, char in enumerate(
+    _COMMON_CHARS + ''.join(chr(code) for code in range(128) if chr(code) not in _COMMON_CHARS)
+)}
+
+# int.bit_count arrived in Python 3.10
+_popcount = int.bit_count if hasattr(int, 'bit_count') else (lambda value: bin(value).count('1'))
+
+def _char_mask(chars):
+    """(bitmask of the ASCII characters, sorted code points of all others)"""
+    mask = 0
+    others = []
+    for char in chars:
+        bit = _ASCII_BITS.get(char)
+        if bit is None:
+            others.append(ord(char))
+        else:
+            mask |= 1 << bit
+    return mask, tuple(sorted(others))
+
+def _shared_count(ids1, ids2):
+    """Number of values two sorted id tuples have in common (merge intersection)"""
+    i = j = shared = 0
+    length1 = len(ids1)
+    length2 = len(ids2)
+    while i < length1 and j < length2:
+        id1 = ids1[i]
+        id2 = ids2[j]
+        if id1 == id2:
+            shared += 1
+            i += 1
+            j += 1
+        elif id1 < id2:
+            i += 1
+        else:
+            j += 1
+    return shared
+
+def _acronym(text):
+    """First letter of each word, uppercased"""
+    return ''.join([word[0].upper() for word in text.split()])
+
+def _acronym_ratio(acronym1, acronym2):
+    """Fuzzy ratio of two acronyms, 0 when either is empty"""
+    if not acronym1 or not acronym2:
+        return 0.0
+    return fuzz.ratio(acronym1, acronym2) / 100.0
+
+class NameSignature:
+    """Everything the pair features need from one name, computed once per name:
+    normalized text and its length, word ids, character mask, acronym, legal
+    indicator count and TF-IDF term counts.
+
+    Words are kept as a sorted tuple of distinct token ids (the tokens' string
+    hashes, so no shared vocabulary has to grow) and characters as a bitmask
+    over a fixed ASCII alphabet plus a sorted tuple of any other code points,
+    which keeps signatures small and lets the set features count overlaps
+    without building sets per pair. Word ids are only comparable within one
+    process."""
+    __slots__ = ('name', 'normalized', 'length', 'word_ids', 'char_mask', 'char_others', 'char_count',
+                 'acronym', 'legal_indicators', 'terms', 'term_weight')
+    
+    def __init__(self, name, normalized, legal_indicators, acronym=None, terms=None):
+        self.name = name
+        self.normalized = normalized
+        self.length = len(normalized)
+        self.word_ids = tuple(sorted({hash(word) for word in normalized.split()}))
+        chars = set(normalized.replace(' ', ''))
+        self.char_mask, self.char_others = _char_mask(chars)
+        self.char_count = len(chars)
+        self.acronym = _acronym(normalized) if acronym is None else acronym
+        self.legal_indicators = legal_indicators
+        self.terms = _tfidf_terms(normalized) if terms is None else terms
+        self.term_weight = sum(count * count for count in self.terms.values())
+
+class _PairContext:
+    """Two name signatures, with the word and character overlaps several features share"""
+    __slots__ = ('sig1', 'sig2', 'proc_name1', 'proc_name2', 'shared_words', 'shared_chars')
+    
+    def __init__(self, sig1, sig2):
+        self.sig1 = sig1
+        self.sig2 = sig2
+        self.proc_name1 = sig1.normalized
+        self.proc_name2 = sig2.normalized
+        self.shared_words = _shared_count(sig1.word_ids, sig2.word_ids)
+        self.shared_chars = _popcount(sig1.char_mask & sig2.char_mask)
+        if sig1.char_others and sig2.char_others:
+            self.shared_chars += _shared_count(sig1.char_others, sig2.char_others)
+
+class FeatureProfiler:
+    """Accumulates call counts and cumulative time per feature over a batch"""
+    
     def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+    
+    def record(self, feature, seconds):
+        """Add one timed call for a feature"""
+        self.calls[feature] = self.calls.get(feature, 0) + 1
+        self.seconds[feature] = self.seconds.get(feature, 0.0) + seconds
+    
+    def report(self, importance=None):
+        """Cost-versus-importance table, most expensive feature first"""
+        importance = importance or {}
+        total_seconds = sum(self.seconds.values()) or 1.0
+        rows = []
+        for feature, seconds in self.seconds.items():
+            calls = self.calls[feature]
+            rows.append({
+                'feature': feature,
+                'calls': calls,
+                'total_ms': seconds * 1000,
+                'mean_us': seconds / calls * 1e6,
+                'time_share': seconds / total_seconds,
+                'importance': float(importance[feature]) if feature in importance else np.nan
+            })
+        return pd.DataFrame(rows).sort_values('total_ms', ascending=False).reset_index(drop=True)
+
+class LegalNameComparator:
+    def __init__(self, cpu_budget=None):
         self.model = None
         self.label_encoder = LabelEncoder()
         self.feature_names = []
+        self.cpu_budget = cpu_budget or default_budget()
+        # Booster copies pinned to a thread count, so concurrent requests never
+        # change nthread on a booster another request is predicting with
+        self._boosters = {}
+        self._boosters_model = None
+        self._boosters_lock = threading.Lock()
+    
+    # Feature computations in the column order the model is trained on.
+    # Each takes the comparator and a _PairContext of two NameSignatures.
+    FEATURES = [
+        # Basic string similarity metrics
+        ('exact_match', lambda self, c: 1.0 if c.proc_name1 == c.proc_name2 else 0.0),
+        ('length_diff', lambda self, c: abs(c.sig1.length - c.sig2.length)),
+        ('length_ratio', lambda self, c: _ratio(min(c.sig1.length, c.sig2.length),
+                                                max(c.sig1.length, c.sig2.length))),
+        
+        # Fuzzy string matching
+        ('fuzzy_ratio', lambda self, c: fuzz.ratio(c.proc_name1, c.proc_name2) / 100.0),
+        ('fuzzy_partial_ratio', lambda self, c: fuzz.partial_ratio(c.proc_name1, c.proc_name2) / 100.0),
+        ('fuzzy_token_sort_ratio', lambda self, c: fuzz.token_sort_ratio(c.proc_name1, c.proc_name2) / 100.0),
+        ('fuzzy_token_set_ratio', lambda self, c: fuzz.token_set_ratio(c.proc_name1, c.proc_name2) / 100.0),
+        
+        # Jellyfish string metrics
+        ('levenshtein_distance', lambda self, c: jellyfish.levenshtein_distance(c.proc_name1, c.proc_name2)),
+        ('jaro_similarity', lambda self, c: jellyfish.jaro_similarity(c.proc_name1, c.proc_name2)),
+        ('jaro_winkler_similarity', lambda self, c: jellyfish.jaro_winkler_similarity(c.proc_name1, c.proc_name2)),
+        ('hamming_distance', lambda self, c: jellyfish.hamming_distance(c.proc_name1, c.proc_name2)
+                                             if c.sig1.length == c.sig2.length else -1),
+        
+        # Word-level features
+        ('word_overlap', lambda self, c: _ratio(c.shared_words, max(len(c.sig1.word_ids), len(c.sig2.word_ids)))),
+        ('word_jaccard', lambda self, c: _ratio(c.shared_words,
+                                                len(c.sig1.word_ids) + len(c.sig2.word_ids) - c.shared_words)),
+        
+        # Character-level features
+        ('char_overlap', lambda self, c: _ratio(c.shared_chars, max(c.sig1.char_count, c.sig2.char_count))),
+        ('char_jaccard', lambda self, c: _ratio(c.shared_chars,
+                                                c.sig1.char_count + c.sig2.char_count - c.shared_chars)),
+        
+        # Cosine similarity using TF-IDF
+        ('cosine_similarity', lambda self, c: _tfidf_cosine(c.sig1.terms, c.sig1.term_weight,
+                                                            c.sig2.terms, c.sig2.term_weight)),
+        
+        # Common legal entity indicators
+        ('legal_indicators_diff', lambda self, c: abs(c.sig1.legal_indicators - c.sig2.legal_indicators)),
+        
+        # Acronym detection
+        ('acronym_similarity', lambda self, c: _acronym_ratio(c.sig1.acronym, c.sig2.acronym)),
+    ]
         
     def preprocess_legal_name(self, name):
         """Preprocess legal name for comparison"""
@@ -56,57 +273,77 @@ class LegalNameComparator:
         
         return ' '.join(filtered_words)
     
+    def name_signature(self, name):
+        """Preprocess a name once into the signature its pair features are derived from"""
+        return NameSignature(name, self.preprocess_legal_name(name), self.count_legal_indicators(name))
+    
+    def _signatures(self, names, signatures=None):
+        """Signatures for names keyed by str(name), computing each distinct name once.
+
+        Keys are the text that gets normalized: raw cell values would let 1234
+        and 1234.0 (equal, with equal hashes) share one entry."""
+        signatures = {} if signatures is None else signatures
+        for name in names:
+            key = str(name)
+            if key not in signatures:
+                signatures[key] = self.name_signature(key)
+        return signatures
+    
     def extract_features(self, name1, name2):
         """Extract multiple similarity features between two legal names"""
-        # Preprocess names
-        proc_name1 = self.preprocess_legal_name(name1)
-        proc_name2 = self.preprocess_legal_name(name2)
-        
-        features = {}
-        
-        # Basic string similarity metrics
-        features['exact_match'] = 1.0 if proc_name1 == proc_name2 else 0.0
-        features['length_diff'] = abs(len(proc_name1) - len(proc_name2))
-        features['length_ratio'] = min(len(proc_name1), len(proc_name2)) / max(len(proc_name1), len(proc_name2)) if max(len(proc_name1), len(proc_name2)) > 0 else 0
-        
-        # Fuzzy string matching
-        features['fuzzy_ratio'] = fuzz.ratio(proc_name1, proc_name2) / 100.0
-        features['fuzzy_partial_ratio'] = fuzz.partial_ratio(proc_name1, proc_name2) / 100.0
-        features['fuzzy_token_sort_ratio'] = fuzz.token_sort_ratio(proc_name1, proc_name2) / 100.0
-        features['fuzzy_token_set_ratio'] = fuzz.token_set_ratio(proc_name1, proc_name2) / 100.0
-        
-        # Jellyfish string metrics
-        features['levenshtein_distance'] = jellyfish.levenshtein_distance(proc_name1, proc_name2)
-        features['jaro_similarity'] = jellyfish.jaro_similarity(proc_name1, proc_name2)
-        features['jaro_winkler_similarity'] = jellyfish.jaro_winkler_similarity(proc_name1, proc_name2)
-        features['hamming_distance'] = jellyfish.hamming_distance(proc_name1, proc_name2) if len(proc_name1) == len(proc_name2) else -1
-        
-        # Word-level features
-        words1 = set(proc_name1.split())
-        words2 = set(proc_name2.split())
-        
-        features['word_overlap'] = len(words1.intersection(words2)) / max(len(words1), len(words2)) if max(len(words1), len(words2)) > 0 else 0
-        features['word_jaccard'] = len(words1.intersection(words2)) / len(words1.union(words2)) if len(words1.union(words2)) > 0 else 0
-        
-        # Character-level features
-        chars1 = set(proc_name1.replace(' ', ''))
-        chars2 = set(proc_name2.replace(' ', ''))
-        
-        features['char_overlap'] = len(chars1.intersection(chars2)) / max(len(chars1), len(chars2)) if max(len(chars1), len(chars2)) > 0 else 0
-        features['char_jaccard'] = len(chars1.intersection(chars2)) / len(chars1.union(chars2)) if len(chars1.union(chars2)) > 0 else 0
-        
-        # Cosine similarity using TF-IDF
-        features['cosine_similarity'] = self.calculate_cosine_similarity(proc_name1, proc_name2)
-        
-        # Common legal entity indicators
-        legal_indicators1 = self.count_legal_indicators(name1)
-        legal_indicators2 = self.count_legal_indicators(name2)
-        features['legal_indicators_diff'] = abs(legal_indicators1 - legal_indicators2)
-        
-        # Acronym detection
-        features['acronym_similarity'] = self.acronym_similarity(proc_name1, proc_name2)
+        return self.signature_features(self.name_signature(name1), self.name_signature(name2))
+    
+    def signature_features(self, sig1, sig2):
+        """Compute similarity features from two name signatures"""
+        context = _PairContext(sig1, sig2)
+        return {feature: compute(self, context) for feature, compute in self.FEATURES}
+    
+    def profile_features(self, names1, names2):
+        """Profile per-feature extraction cost over a batch of name pairs
+        
+        Returns a DataFrame with call count, cumulative and mean time for each feature,
+        alongside the feature's importance in the trained model when one is available.
+        Work done once per name in the signature is timed in its own rows, since the
+        features that use it then cost almost nothing per pair:
+        '(signatures) normalize' (every feature), '(signatures) indicators'
+        (legal_indicators_diff), '(signatures) tfidf' (cosine_similarity),
+        '(signatures) acronym' (acronym_similarity) and '(signatures) words/chars'
+        (length, word and character features, including their shared counts).
+        """
+        profiler = FeatureProfiler()
+        clock = time.perf_counter
+        
+        def signature(name):
+            start = clock()
+            normalized = self.preprocess_legal_name(name)
+            profiler.record('(signatures) normalize', clock() - start)
+            start = clock()
+            legal_indicators = self.count_legal_indicators(name)
+            profiler.record('(signatures) indicators', clock() - start)
+            start = clock()
+            terms = _tfidf_terms(normalized)
+            profiler.record('(signatures) tfidf', clock() - start)
+            start = clock()
+            acronym = _acronym(normalized)
+            profiler.record('(signatures) acronym', clock() - start)
+            start = clock()
+            sig = NameSignature(name, normalized, legal_indicators, acronym, terms)
+            profiler.record('(signatures) words/chars', clock() - start)
+            return sig
+        
+        for name1, name2 in zip(names1, names2):
+            sig1 = signature(name1)
+            sig2 = signature(name2)
+            start = clock()
+            context = _PairContext(sig1, sig2)
+            profiler.record('(signatures) words/chars', clock() - start)
+            
+            for feature, compute in self.FEATURES:
+                start = clock()
+                compute(self, context)
+                profiler.record(feature, clock() - start)
         
-        return features
+        return profiler.report(self.get_feature_importance())
     
     def count_legal_indicators(self, name):
         """Count legal entity indicators in name"""
@@ -123,41 +360,15 @@ class LegalNameComparator:
     
     def acronym_similarity(self, name1, name2):
         """Calculate similarity based on acronyms"""
-        def get_acronym(name):
-            words = name.split()
-            return ''.join([word[0].upper() for word in words if word])
-        
-        acronym1 = get_acronym(name1)
-        acronym2 = get_acronym(name2)
-        
-        if not acronym1 or not acronym2:
-            return 0.0
-        
-        return fuzz.ratio(acronym1, acronym2) / 100.0
+        return _acronym_ratio(_acronym(name1), _acronym(name2))
     
     def calculate_cosine_similarity(self, name1, name2):
-        """Calculate cosine similarity using TF-IDF vectors"""
-        if not name1.strip() or not name2.strip():
-            return 0.0
-        
-        # Create TF-IDF vectorizer
-        vectorizer = TfidfVectorizer(
-            analyzer='word',
-            ngram_range=(1, 2),  # Use unigrams and bigrams
-            min_df=1,
-            max_df=1.0
-        )
-        
-        try:
-            # Fit and transform the names
-            tfidf_matrix = vectorizer.fit_transform([name1, name2])
-            
-            # Calculate cosine similarity
-            cosine_sim = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
-            
-            return float(cosine_sim)
-        except:
-            return 0.0
+        """Calculate cosine similarity using TF-IDF vectors (unigrams and bigrams),
+        with the vectorizer fitted on just these two names"""
+        terms1 = _tfidf_terms(name1)
+        terms2 = _tfidf_terms(name2)
+        return _tfidf_cosine(terms1, sum(c * c for c in terms1.values()),
+                             terms2, sum(c * c for c in terms2.values()))
     
     def create_training_data(self, data):
         """Create training data from Excel file"""
@@ -192,10 +403,11 @@ class LegalNameComparator:
             if len(sources) < 2:
                 continue
             
-            # Create pairs from all sources
+            # Preprocess each source once, then create pairs from all sources
+            signatures = [self.name_signature(source) for source in sources]
             for i in range(len(sources)):
                 for j in range(i + 1, len(sources)):
-                    features = self.extract_features(sources[i], sources[j])
+                    features = self.signature_features(signatures[i], signatures[j])
                     features_list.append(features)
                     labels.append(row[is_material_col])
         
@@ -221,8 +433,8 @@ class LegalNameComparator:
             'random_state': 42
         }
         
-        # Train model
-        self.model = xgb.XGBClassifier(**params)
+        # Train model on a capped share of the cores
+        self.model = xgb.XGBClassifier(**params, n_jobs=self.cpu_budget.training_threads())
         self.model.fit(X_train, y_train)
         
         # Evaluate
@@ -249,38 +461,160 @@ class LegalNameComparator:
         features = self.extract_features(name1, name2)
         features_df = pd.DataFrame([features])
         
-        # Make prediction
-        prediction = self.model.predict(features_df)
-        probability = self.model.predict_proba(features_df)
-        
-        # Handle joblib 1.5.0 compatibility - ensure we get the first element properly
-        if isinstance(prediction, (list, np.ndarray)):
-            prediction = prediction[0]
-        if isinstance(probability, (list, np.ndarray)):
-            probability = probability[0]
+        # Make prediction (a single pair always runs single-threaded)
+        probability = self._predict_proba(features_df)[0]
+        prediction = probability[1] > 0.5
         
         # Return tuple format expected by the apps
         return bool(prediction), probability
     
-    def save_model(self, filepath):
-        """Save the trained model"""
-        model_data = {
+    def predict_batch(self, names1, names2, stage_timer=None):
+        """Predict materiality for many name pairs with a single model call
+        
+        Returns (predictions, probabilities): a boolean array and an (n, 2) array of
+        [immaterial, material] probabilities aligned with the input pairs.
+        stage_timer, if given, times the normalize/features/inference stages.
+        """
+        if self.model is None:
+            raise ValueError("Model not trained. Please train the model first.")
+        
+        if len(names1) == 0:
+            return np.zeros(0, dtype=bool), np.zeros((0, 2))
+        
+        # Names repeated across pairs are preprocessed once
+        with _stage(stage_timer, 'normalize'):
+            signatures = self._signatures(names2, self._signatures(names1))
+        
+        with _stage(stage_timer, 'features'):
+            features_df = pd.DataFrame([
+                self.signature_features(signatures[str(name1)], signatures[str(name2)])
+                for name1, name2 in zip(names1, names2)
+            ])
+        
+        with _stage(stage_timer, 'inference'):
+            probabilities = self._predict_proba(features_df)
+        
+        # Same decision rule XGBClassifier.predict applies for binary:logistic
+        predictions = probabilities[:, 1] > 0.5
+        return predictions, probabilities
+    
+    def predict_records(self, records, stage_timer=None):
+        """Predict materiality across the source names of many records
+        
+        Each record is a list of N source names (blank ones are dropped, as in
+        create_training_data). Every distinct name gets one signature and all
+        N(N-1)/2 pairs of a record are scored from signatures in a single model
+        call, so per-name work grows with N rather than with the pair count.
+        Returns one dict per record with its pairwise verdicts and a consensus:
+        Material when the mean materiality probability over its pairs is above
+        0.5, since every pair of a training record carries the record's label.
+        The outlier is the source with the highest mean probability against the
+        others (records with three or more sources).
+        """
+        if self.model is None:
+            raise ValueError("Model not trained. Please train the model first.")
+        
+        records = [[s for s in sources if pd.notna(s) and str(s).strip() != ''] for sources in records]
+        
+        with _stage(stage_timer, 'normalize'):
+            signatures = {}
+            for sources in records:
+                self._signatures(sources, signatures)
+        
+        pair_index = [(r, i, j) for r, sources in enumerate(records)
+                      for i in range(len(sources)) for j in range(i + 1, len(sources))]
+        with _stage(stage_timer, 'features'):
+            features_df = pd.DataFrame([
+                self.signature_features(signatures[str(records[r][i])], signatures[str(records[r][j])])
+                for r, i, j in pair_index
+            ])
+        
+        with _stage(stage_timer, 'inference'):
+            material = self._predict_proba(features_df)[:, 1] if pair_index else np.zeros(0)
+        
+        results = [{'sources': sources, 'pairs': []} for sources in records]
+        for (r, i, j), probability in zip(pair_index, material):
+            sources = records[r]
+            results[r]['pairs'].append({
+                'source1': i,
+                'source2': j,
+                'name1': sources[i],
+                'name2': sources[j],
+                'prediction': 'Material' if probability > 0.5 else 'Immaterial',
+                'is_material': bool(probability > 0.5),
+                'materiality_probability': float(probability)
+            })
+        
+        for result in results:
+            pairs = result['pairs']
+            if not pairs:
+                result.update({'consensus': None, 'consensus_probability': None,
+                               'material_pairs': 0, 'outlier_source': None})
+                continue
+            
+            consensus_probability = float(np.mean([p['materiality_probability'] for p in pairs]))
+            result['consensus'] = 'Material' if consensus_probability > 0.5 else 'Immaterial'
+            result['consensus_probability'] = consensus_probability
+            result['material_pairs'] = sum(1 for p in pairs if p['is_material'])
+            
+            # Source that disagrees most with the rest
+            result['outlier_source'] = None
+            if len(result['sources']) >= 3 and result['material_pairs']:
+                totals = np.zeros(len(result['sources']))
+                for p in pairs:
+                    totals[p['source1']] += p['materiality_probability']
+                    totals[p['source2']] += p['materiality_probability']
+                result['outlier_source'] = int(np.argmax(totals))
+        
+        return results
+    
+    def _booster(self, nthread):
+        """Booster copy of the current model that predicts with nthread threads"""
+        with self._boosters_lock:
+            if self._boosters_model is not self.model:
+                self._boosters = {}
+                self._boosters_model = self.model
+            booster = self._boosters.get(nthread)
+            if booster is None:
+                booster = self.model.get_booster().copy()
+                booster.set_param({'nthread': nthread})
+                self._boosters[nthread] = booster
+            return booster
+    
+    def _predict_proba(self, features_df):
+        """[immaterial, material] probabilities, as XGBClassifier.predict_proba returns them,
+        using the thread count the CPU budget allows for this many rows"""
+        booster = self._booster(self.cpu_budget.inference_threads(len(features_df)))
+        material = booster.inplace_predict(features_df)
+        return np.column_stack([1.0 - material, material])
+    
+    def get_model_data(self):
+        """The trained state save_model pickles"""
+        return {
             'model': self.model,
             'label_encoder': self.label_encoder,
             'feature_names': self.feature_names
         }
-        with open(filepath, 'wb') as f:
-            pickle.dump(model_data, f)
     
-    def load_model(self, filepath):
-        """Load a trained model"""
-        with open(filepath, 'rb') as f:
-            model_data = pickle.load(f)
-        
+    def set_model_data(self, model_data):
+        """Restore trained state produced by get_model_data"""
         self.model = model_data['model']
         self.label_encoder = model_data['label_encoder']
         self.feature_names = model_data['feature_names']
     
+    def save_model(self, filepath):
+        """Save the trained model"""
+        # Write then rename, so a concurrent load_model never sees a partial file
+        tmp_path = f"{filepath}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.get_model_data(), f)
+        os.replace(tmp_path, filepath)
+    
+    def load_model(self, filepath):
+        """Load a trained model"""
+        with open(filepath, 'rb') as f:
+            self.set_model_data(pickle.load(f))
+    
     def get_feature_importance(self):
         """Get feature importance from the trained model"""
         if self.model is None:
@@ -291,6 +625,14 @@ class LegalNameComparator:
         
         return dict(zip(feature_names, importance))
 
+def source_records(data):
+    """Source name lists from a frame's source1..sourceN columns, in column order"""
+    columns = sorted((col for col in data.columns if re.fullmatch(r'source\d+', str(col))),
+                     key=lambda col: int(str(col)[len('source'):]))
+    if len(columns) < 2:
+        raise ValueError('At least two source columns (source1, source2, ...) are required')
+    return data[columns].values.tolist()
+
 def create_sample_training_data():
     """Create sample training data for demonstration"""
     sample_data = {
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Load test driver for the Flask apps
+Runs a weighted mix of test_prediction / predict / feedback calls against a local
+app_with_feedback.py or enterprise_app.py, either closed-loop (N concurrent users)
+or open-loop (fixed request rate), and reports throughput and latency percentiles
+per endpoint
+"""
+
+import argparse
+import http.client
+import io
+import itertools
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+
+from generate_scalable_data import iter_chunks
+
+# Endpoints per app: name -> (method, path, body kind)
+APP_ENDPOINTS = {
+    'feedback': {
+        'test_prediction': ('POST', '/test_prediction', 'json_pair'),
+        'predict': ('POST', '/predict', 'file'),
+        'feedback': ('POST', '/feedback', 'json_feedback')
+    },
+    'enterprise': {
+        'predict': ('POST', '/api/predict', 'file'),
+        'feedback': ('POST', '/api/feedback', 'json_feedback')
+    }
+}
+
+APP_SCRIPTS = {
+    'feedback': 'app_with_feedback.py',
+    'enterprise': 'enterprise_app.py'
+}
+
+DEFAULT_MIX = {
+    'feedback': 'test_prediction=8,predict=1,feedback=1',
+    'enterprise': 'predict=9,feedback=1'
+}
+
+# Prediction seeded by loadtest_seed.sql, referenced by enterprise feedback calls
+LOADTEST_PREDICTION_ID = '00000000-0000-0000-0000-00000000f00d'
+
+class Client:
+    """Minimal keep-alive HTTP client; one per worker thread"""
+
+    def __init__(self, base_url, headers=None, timeout=60):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self._conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request and return (status, headers, body bytes), reconnecting once on a dropped connection"""
+        all_headers = dict(self.headers)
+        all_headers.update(headers or {})
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._conn.request(method, path, body=body, headers=all_headers)
+                response = self._conn.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close' or response.version == 10:
+                    self.close()
+                return response.status, response.headers, data
+            except (http.client.HTTPException, ConnectionError, OSError):
+                self.close()
+                if attempt == 1:
+                    raise
+
+    def close(self):
+        """Close the underlying connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+def encode_multipart(field, filename, content, content_type):
+    """Encode a single file field as multipart/form-data; returns (body, content type header)"""
+    boundary = uuid.uuid4().hex
+    body = b''.join([
+        f'--{boundary}\r\n'.encode(),
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'.encode(),
+        f'Content-Type: {content_type}\r\n\r\n'.encode(),
+        content,
+        f'\r\n--{boundary}--\r\n'.encode()
+    ])
+    return body, f'multipart/form-data; boundary={boundary}'
+
+def excel_bytes(df):
+    """Serialize a DataFrame to an in-memory xlsx file"""
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+def generated_frame(rows, seed, layout):
+    """First `rows` generated pairs in the given layout"""
+    return next(iter_chunks(rows, seed=seed, chunk_size=rows, layout=layout))
+
+def login(app_name, base_url, username, password):
+    """Authenticate and return the headers every request must carry"""
+    client = Client(base_url)
+    try:
+        if app_name == 'enterprise':
+            status, _, data = client.request(
+                'POST', '/auth/login',
+                body=json.dumps({'email': username, 'password': password}),
+                headers={'Content-Type': 'application/json'}
+            )
+            if status != 200:
+                raise RuntimeError(f"Login failed ({status}): {data[:200]!r}")
+            return {'Authorization': f"Bearer {json.loads(data)['token']}"}
+
+        # Session login: a successful form post redirects and sets the session cookie
+        status, headers, data = client.request(
+            'POST', '/login',
+            body=urlencode({'username': username, 'password': password}),
+            headers={'Content-Type': 'application/x-www-form-urlencoded'}
+        )
+        cookie = headers.get('Set-Cookie')
+        if status != 302 or not cookie:
+            raise RuntimeError(f"Login failed ({status}): check username and password")
+        return {'Cookie': cookie.split(';', 1)[0]}
+    finally:
+        client.close()
+
+def train_model(app_name, base_url, auth_headers, rows, seed):
+    """Upload a generated training file so the app has a model to serve"""
+    path = '/api/upload' if app_name == 'enterprise' else '/upload'
+    body, content_type = encode_multipart(
+        'file', 'loadtest_training.xlsx',
+        excel_bytes(generated_frame(rows, seed, 'training')),
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    client = Client(base_url, auth_headers, timeout=600)
+    try:
+        status, _, data = client.request('POST', path, body=body, headers={'Content-Type': content_type})
+    finally:
+        client.close()
+    if status != 200:
+        raise RuntimeError(f"Training upload failed ({status}): {data[:200]!r}")
+    print(f"Trained model on {rows:,} generated pairs")
+
+class RequestFactory:
+    """Builds request bodies for each endpoint from a pool of generated pairs"""
+
+    def __init__(self, app_name, batch_rows, seed, prediction_id):
+        self.app_name = app_name
+        self.prediction_id = prediction_id
+        pairs = generated_frame(max(batch_rows, 1000), seed, 'prediction')
+        self.pairs = list(zip(pairs['name1'], pairs['name2'], pairs['is_material']))
+
+        # Every predict call uploads the same workbook, like repeated batch submissions
+        self.file_content = excel_bytes(pairs[['name1', 'name2']].head(batch_rows))
+        self._uploads = itertools.count()
+
+    def build(self, kind, rng):
+        """Return (body, headers) for a request of the given body kind"""
+        if kind == 'file':
+            # A distinct file name per request, as separate clients would send
+            body, content_type = encode_multipart(
+                'file', f'loadtest_predictions_{next(self._uploads)}.xlsx', self.file_content,
+                'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
+            return body, {'Content-Type': content_type}
+
+        name1, name2, is_material = rng.choice(self.pairs)
+        if kind == 'json_pair':
+            payload = {'name1': name1, 'name2': name2}
+        elif self.app_name == 'enterprise':
+            payload = {
+                'prediction_id': self.prediction_id,
+                'user_correction': bool(is_material),
+                'confidence_score': round(rng.random(), 4),
+                'feedback_text': 'load test'
+            }
+        else:
+            payload = {
+                'name1': name1,
+                'name2': name2,
+                'original_prediction': bool(rng.random() < 0.5),
+                'user_correction': bool(is_material),
+                'confidence_score': round(rng.random(), 4),
+                'feedback_text': 'load test'
+            }
+        return json.dumps(payload), {'Content-Type': 'application/json'}
+
+class Recorder:
+    """Collects per-endpoint latencies and outcomes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+        self.recording = False
+
+    def record(self, endpoint, latency, status):
+        """Record one completed request (status None on a connection error)"""
+        if not self.recording:
+            return
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(latency)
+            self.statuses.setdefault(endpoint, {})
+            key = str(status)
+            self.statuses[endpoint][key] = self.statuses[endpoint].get(key, 0) + 1
+            if status is None or status >= 400:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, elapsed):
+        """Throughput and latency percentiles per endpoint, plus an overall row"""
+        rows = {}
+        everything = []
+        for endpoint, latencies in sorted(self.latencies.items()):
+            everything.extend(latencies)
+            rows[endpoint] = summarize(latencies, self.errors.get(endpoint, 0), elapsed)
+            rows[endpoint]['statuses'] = self.statuses[endpoint]
+        rows['overall'] = summarize(everything, sum(self.errors.values()), elapsed)
+        return rows
+
+def summarize(latencies, errors, elapsed):
+    """Summary statistics for a list of latencies in seconds"""
+    if not latencies:
+        return {'requests': 0, 'errors': errors, 'throughput_per_sec': 0.0}
+    values = np.array(latencies) * 1000
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'error_rate': round(errors / len(values), 4),
+        'throughput_per_sec': round(len(values) / elapsed, 2),
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p90_ms': round(float(np.percentile(values, 90)), 2),
+        'p99_ms': round(float(np.percentile(values, 99)), 2),
+        'max_ms': round(float(values.max()), 2)
+    }
+
+def send(client, factory, endpoints, endpoint, rng, recorder, scheduled=None):
+    """Issue one request; latency counts from the scheduled time in open-loop mode"""
+    method, path, kind = endpoints[endpoint]
+    body, headers = factory.build(kind, rng)
+    start = scheduled if scheduled is not None else time.perf_counter()
+    try:
+        status, _, _ = client.request(method, path, body=body, headers=headers)
+    except Exception:
+        status = None
+    recorder.record(endpoint, time.perf_counter() - start, status)
+
+def run_closed_loop(base_url, auth_headers, factory, endpoints, mix, concurrency, stop, recorder, seed):
+    """N virtual users, each sending its next request as soon as the previous one returns"""
+    names, weights = list(mix), list(mix.values())
+
+    def user(index):
+        rng = random.Random(seed + index)
+        client = Client(base_url, auth_headers)
+        try:
+            while not stop.is_set():
+                endpoint = rng.choices(names, weights=weights)[0]
+                send(client, factory, endpoints, endpoint, rng, recorder)
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def run_open_loop(base_url, auth_headers, factory, endpoints, mix, rate, max_inflight, stop, recorder, seed):
+    """Fixed arrival rate; requests queue behind max_inflight connections rather than slowing arrivals"""
+    names, weights = list(mix), list(mix.values())
+    local = threading.local()
+    executor = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix='loadtest')
+
+    def task(endpoint, scheduled, task_seed):
+        if not hasattr(local, 'client'):
+            local.client = Client(base_url, auth_headers)
+        if stop.is_set():
+            return
+        send(local.client, factory, endpoints, endpoint, random.Random(task_seed), recorder, scheduled)
+
+    def schedule():
+        rng = random.Random(seed)
+        interval = 1.0 / rate
+        next_time = time.perf_counter()
+        sequence = 0
+        while not stop.is_set():
+            now = time.perf_counter()
+            if now < next_time:
+                time.sleep(min(next_time - now, 0.05))
+                continue
+            endpoint = rng.choices(names, weights=weights)[0]
+            executor.submit(task, endpoint, next_time, seed + sequence)
+            sequence += 1
+            next_time += interval
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    thread = threading.Thread(target=schedule, daemon=True)
+    thread.start()
+    return [thread]
+
+def wait_for_health(base_url, timeout=120):
+    """Poll /health until the app answers 200"""
+    deadline = time.time() + timeout
+    client = Client(base_url, timeout=5)
+    while time.time() < deadline:
+        try:
+            status, _, data = client.request('GET', '/health')
+            if status == 200:
+                return
+        except Exception:
+            pass
+        client.close()
+        time.sleep(0.5)
+    raise RuntimeError(f"App at {base_url} did not become healthy within {timeout}s")
+
+def start_app(app_name, port):
+    """Start the app as a subprocess in its own process group"""
+    env = dict(os.environ)
+    env['PORT'] = str(port)
+    if app_name == 'enterprise':
+        # The per-client limits would reject a load test outright
+        env.setdefault('RATELIMIT_ENABLED', 'false')
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), APP_SCRIPTS[app_name])
+    print(f"Starting {APP_SCRIPTS[app_name]} on port {port}...")
+    return subprocess.Popen(
+        [sys.executable, script],
+        cwd=os.path.dirname(script),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+
+def stop_app(process):
+    """Stop an app started by start_app, including any reloader child"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+def parse_mix(text, endpoints):
+    """Parse 'endpoint=weight,...' for the endpoints this app serves"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in endpoints:
+            raise ValueError(f"Unknown endpoint '{name}', expected one of {', '.join(endpoints)}")
+        mix[name] = float(weight or 1)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+def print_report(report):
+    """Print the per-endpoint table"""
+    print(f"\n{'endpoint':<18}{'requests':>10}{'errors':>8}{'req/s':>10}"
+          f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for endpoint, row in report.items():
+        if not row['requests']:
+            print(f"{endpoint:<18}{0:>10}{row['errors']:>8}")
+            continue
+        print(f"{endpoint:<18}{row['requests']:>10}{row['errors']:>8}{row['throughput_per_sec']:>10}"
+              f"{row['p50_ms']:>10}{row['p90_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test app_with_feedback.py or enterprise_app.py')
+    parser.add_argument('--app', choices=list(APP_ENDPOINTS), default='feedback', help='Which app is under test')
+    parser.add_argument('--url', default=None, help='Base URL (default: http://127.0.0.1:<port>)')
+    parser.add_argument('--port', type=int, default=5001, help='Port to start or reach the app on')
+    parser.add_argument('--start', action='store_true', help='Start the app as a subprocess for the run')
+    parser.add_argument('--mix', default=None,
+                        help='Endpoint weights, e.g. test_prediction=8,predict=1,feedback=1')
+    parser.add_argument('--concurrency', type=int, default=10, help='Closed-loop virtual users')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='Open-loop requests per second (overrides --concurrency)')
+    parser.add_argument('--max-inflight', type=int, default=200, help='Connection cap in open-loop mode')
+    parser.add_argument('--duration', type=float, default=60, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='Unmeasured seconds before measuring')
+    parser.add_argument('--batch-rows', type=int, default=100, help='Rows in each /predict upload')
+    parser.add_argument('--train-rows', type=int, default=2000,
+                        help='Train a model on this many generated pairs first (0 to skip)')
+    parser.add_argument('--username', default=None,
+                        help='Login user (default: admin / admin@company.com)')
+    parser.add_argument('--password', default='admin123', help='Login password')
+    parser.add_argument('--prediction-id', default=LOADTEST_PREDICTION_ID,
+                        help='Existing prediction id used by enterprise feedback calls')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for payloads and the mix')
+    parser.add_argument('--output', default=None, help='Write the report JSON here')
+    args = parser.parse_args()
+
+    endpoints = APP_ENDPOINTS[args.app]
+    try:
+        mix = parse_mix(args.mix or DEFAULT_MIX[args.app], endpoints)
+    except ValueError as e:
+        parser.error(str(e))
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+    username = args.username or ('admin@company.com' if args.app == 'enterprise' else 'admin')
+
+    process = start_app(args.app, args.port) if args.start else None
+    try:
+        wait_for_health(base_url)
+        auth_headers = login(args.app, base_url, username, args.password)
+        if args.train_rows:
+            train_model(args.app, base_url, auth_headers, args.train_rows, args.seed)
+        factory = RequestFactory(args.app, args.batch_rows, args.seed, args.prediction_id)
+
+        recorder = Recorder()
+        stop = threading.Event()
+        if args.rate:
+            mode = f"{args.rate:g} req/s open loop"
+            threads = run_open_loop(base_url, auth_headers, factory, endpoints, mix,
+                                    args.rate, args.max_inflight, stop, recorder, args.seed)
+        else:
+            mode = f"{args.concurrency} concurrent users"
+            threads = run_closed_loop(base_url, auth_headers, factory, endpoints, mix,
+                                      args.concurrency, stop, recorder, args.seed)
+
+        print(f"Running {mode} against {base_url} for {args.duration:g}s "
+              f"(+{args.warmup:g}s warmup), mix {mix}")
+        time.sleep(args.warmup)
+        recorder.recording = True
+        start = time.perf_counter()
+        time.sleep(args.duration)
+        recorder.recording = False
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=30)
+
+        report = recorder.report(elapsed)
+        print_report(report)
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({
+                    'meta': {
+                        'timestamp': datetime.now().isoformat(),
+                        'app': args.app,
+                        'url': base_url,
+                        'mode': mode,
+                        'mix': mix,
+                        'duration': args.duration,
+                        'batch_rows': args.batch_rows
+                    },
+                    'endpoints': report
+                }, f, indent=2)
+            print(f"\nReport saved to {args.output}")
+    except RuntimeError as e:
+        print(f"Error: {str(e)}")
+        sys.exit(1)
+    finally:
+        if process is not None:
+            stop_app(process)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+-- Fixtures for load testing enterprise_app.py against a throwaway database
+-- Loaded after init.sql by docker-compose.loadtest.yml
+
+-- Model and prediction referenced by /api/feedback calls from load_test.py
+INSERT INTO models (id, name, version, model_path, accuracy, is_active, created_by)
+SELECT '00000000-0000-0000-0000-0000000000aa', 'loadtest_model', 'loadtest', 'models/loadtest.pkl', 0.0, FALSE, id
+FROM users WHERE email = 'admin@company.com';
+
+INSERT INTO predictions (id, user_id, model_id, name1, name2, prediction, confidence)
+SELECT '00000000-0000-0000-0000-00000000f00d', id, '00000000-0000-0000-0000-0000000000aa',
+       'Load Test Holdings Ltd', 'Load Test Holdings Limited', FALSE, 0.5
+FROM users WHERE email = 'admin@company.com';
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Monitoring
+Prometheus instrumentation shared by the serving entry points
+"""
+
+import gc
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+
+import psutil
+from prometheus_client import Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+# System gauges, published by SystemMetricsSampler
+CPU_USAGE = Gauge('cpu_usage_percent', 'CPU usage')
+MEMORY_USAGE = Gauge('memory_usage_percent', 'Memory usage')
+PROCESS_RSS = Gauge('process_rss_bytes', 'Resident set size of the serving process')
+PROCESS_THREADS = Gauge('process_thread_count', 'OS threads in the serving process')
+GC_GENERATION_COUNT = Gauge(
+    'gc_generation_count',
+    'Allocations minus deallocations since the generation was last collected (gc.get_count)',
+    ['generation']
+)
+GC_COLLECTIONS = Gauge('gc_collections', 'Garbage collections run', ['generation'])
+
+# Per-stage request latency
+STAGE_DURATION = Histogram(
+    'pipeline_stage_duration_seconds',
+    'Time spent in each request pipeline stage',
+    ['endpoint', 'stage', 'model_version'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+
+# Traced allocations of memory-profiled requests (?memory=1)
+REQUEST_MEMORY_PEAK = Gauge(
+    'request_traced_memory_peak_bytes',
+    'Peak traced Python allocations of the last memory-profiled request',
+    ['endpoint']
+)
+STAGE_MEMORY_PEAK = Gauge(
+    'request_stage_traced_memory_peak_bytes',
+    'Peak traced Python allocations per stage of the last memory-profiled request',
+    ['endpoint', 'stage']
+)
+
+def publish_memory_report(endpoint, report):
+    """Set the memory gauges from a MemoryTracker report"""
+    REQUEST_MEMORY_PEAK.labels(endpoint=endpoint).set(report['peak_mb'] * 1024 * 1024)
+    for stage in report['stages']:
+        STAGE_MEMORY_PEAK.labels(endpoint=endpoint, stage=stage['stage']).set(stage['peak_mb'] * 1024 * 1024)
+
+class StageTimer:
+    """Accumulates wall time per named pipeline stage for one request"""
+
+    def __init__(self, endpoint, model_version='latest'):
+        self.endpoint = endpoint
+        self.model_version = model_version
+        self.stages = {}
+        # Set while a request_profiler.MemoryTracker is tracing this request
+        self.memory_tracker = None
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block as the given stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+            if self.memory_tracker is not None:
+                self.memory_tracker.checkpoint(name)
+
+    def record(self, name, seconds):
+        """Add elapsed seconds to a stage"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def breakdown(self):
+        """Stage durations in milliseconds, in the order stages first ran"""
+        return {name: round(seconds * 1000, 3) for name, seconds in self.stages.items()}
+
+    def publish(self):
+        """Observe each stage's total in the Prometheus histogram"""
+        for name, seconds in self.stages.items():
+            STAGE_DURATION.labels(
+                endpoint=self.endpoint,
+                stage=name,
+                model_version=self.model_version
+            ).observe(seconds)
+
+class SystemMetricsSampler:
+    """Background thread that samples system and process metrics on an interval,
+    keeping psutil calls off the request path"""
+
+    def __init__(self, interval_seconds=15.0):
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def ensure_running(self):
+        """Start the sampler if it is not running in this process (e.g. after a fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), name='metrics-sampler', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        """Stop sampling; a later ensure_running starts a fresh sampler"""
+        with self._lock:
+            self._stop.set()
+            self._pid = None
+
+    def sample(self):
+        """Take one sample and publish it to the gauges"""
+        process = psutil.Process()
+        CPU_USAGE.set(psutil.cpu_percent(interval=None))
+        MEMORY_USAGE.set(psutil.virtual_memory().percent)
+        PROCESS_RSS.set(process.memory_info().rss)
+        PROCESS_THREADS.set(process.num_threads())
+
+        for generation, count in enumerate(gc.get_count()):
+            GC_GENERATION_COUNT.labels(generation=str(generation)).set(count)
+        for generation, stats in enumerate(gc.get_stats()):
+            GC_COLLECTIONS.labels(generation=str(generation)).set(stats['collections'])
+
+    def _run(self, stop):
+        # The first cpu_percent call only primes the counter
+        psutil.cpu_percent(interval=None)
+        # Each thread watches its own event, so a restart never revives a stopped thread
+        while not stop.wait(self.interval_seconds):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"System metrics sample failed: {str(e)}")
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Profile per-feature extraction cost against feature importance
+Runs extract_features over a batch of name pairs and reports where the time goes
+"""
+
+import argparse
+
+import pandas as pd
+
+from legal_name_comparison import LegalNameComparator
+
+def load_pairs(filepath, limit=None):
+    """Load name1/name2 pairs from an Excel or CSV prediction file"""
+    if filepath.endswith('.csv'):
+        df = pd.read_csv(filepath)
+    else:
+        df = pd.read_excel(filepath)
+
+    if 'name1' not in df.columns or 'name2' not in df.columns:
+        raise ValueError('Input file must have name1 and name2 columns')
+
+    df = df[['name1', 'name2']].dropna()
+    if limit:
+        df = df.head(limit)
+    return df['name1'].astype(str).tolist(), df['name2'].astype(str).tolist()
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-feature cost versus importance report')
+    parser.add_argument('pairs', help='Excel/CSV file with name1 and name2 columns')
+    parser.add_argument('--model', default='legal_name_model.pkl', help='Trained model to read importances from')
+    parser.add_argument('--limit', type=int, default=None, help='Only profile the first N pairs')
+    parser.add_argument('--output', help='Write the report to this CSV file')
+    args = parser.parse_args()
+
+    comparator = LegalNameComparator()
+    comparator.load_model(args.model)
+
+    names1, names2 = load_pairs(args.pairs, args.limit)
+    print(f"Profiling {len(names1)} pairs...")
+    report = comparator.profile_features(names1, names2)
+
+    with pd.option_context('display.max_rows', None, 'display.width', 120):
+        print(report.to_string(index=False, float_format=lambda x: f"{x:.4f}"))
+
+    if args.output:
+        report.to_csv(args.output, index=False)
+        print(f"\nReport saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Two-List Reconciliation
+Matches every name in list A (e.g. a vendor extract) against list B (e.g. the
+internal book) without scoring the full cross product. B is indexed by token;
+an A name's candidates are the B names sharing a token, pruned with cheap
+bounds on length ratio and token overlap (the model's own length_ratio and
+word_overlap features), and only the best few survivors are scored with the
+model. A is processed in chunks across worker processes and each A row's best
+match is written out in order.
+"""
+
+import argparse
+import multiprocessing
+import time
+
+import numpy as np
+import pandas as pd
+
+from legal_name_comparison import LegalNameComparator
+from cpu_budget import CpuBudget, available_cores
+
+OUTPUT_COLUMNS = ['a_index', 'name_a', 'b_index', 'name_b', 'candidates',
+                  'word_overlap', 'length_ratio', 'materiality_probability', 'prediction']
+
+class TokenIndex:
+    """Inverted index from normalized tokens to ascending B row ids"""
+
+    def __init__(self, normalized_names, max_df=0.05):
+        postings = {}
+        for i, text in enumerate(normalized_names):
+            for token in set(text.split()):
+                postings.setdefault(token, []).append(i)
+        self.postings = {token: np.array(ids, dtype=np.int32) for token, ids in postings.items()}
+        self.lengths = np.array([len(text) for text in normalized_names], dtype=np.int32)
+        self.token_counts = np.array([len(set(text.split())) for text in normalized_names], dtype=np.int32)
+        # Tokens in more than this many names are not used to generate candidates
+        self.max_postings = max(100, int(len(normalized_names) * max_df))
+
+    def candidates(self, text, min_length_ratio=0.5, min_word_overlap=0.3, limit=10):
+        """Best B rows for one normalized A name.
+
+        Returns (ids, word_overlap, length_ratio, considered, within_bounds): the
+        kept rows with their bound values, plus how many rows shared a token and
+        how many of those passed the bounds.
+
+        Candidates share at least one token with the name, through its rarer
+        tokens when it has any. Token overlap is then counted exactly over all
+        shared tokens, and rows below either bound are dropped before the best
+        `limit` by overlap and length ratio are kept."""
+        tokens = set(text.split())
+        postings = [self.postings[token] for token in tokens if token in self.postings]
+        if not postings:
+            return np.zeros(0, dtype=np.int32), np.zeros(0), np.zeros(0), 0, 0
+
+        rare = [p for p in postings if len(p) <= self.max_postings]
+        common = [p for p in postings if len(p) > self.max_postings]
+        if not rare:
+            rare, common = common, []
+
+        ids, shared = np.unique(np.concatenate(rare), return_counts=True)
+        considered = len(ids)
+        # Exact overlap: add the common tokens by binary search in their sorted postings
+        for posting in common:
+            positions = np.searchsorted(posting, ids)
+            positions[positions == len(posting)] = 0
+            shared += posting[positions] == ids
+
+        length_a = len(text)
+        lengths_b = self.lengths[ids]
+        length_ratio = np.minimum(length_a, lengths_b) / np.maximum(np.maximum(length_a, lengths_b), 1)
+        word_overlap = shared / np.maximum(len(tokens), self.token_counts[ids])
+
+        keep = (length_ratio >= min_length_ratio) & (word_overlap >= min_word_overlap)
+        ids, word_overlap, length_ratio = ids[keep], word_overlap[keep], length_ratio[keep]
+        within_bounds = len(ids)
+        if len(ids) > limit:
+            order = np.lexsort((-length_ratio, -word_overlap))[:limit]
+            ids, word_overlap, length_ratio = ids[order], word_overlap[order], length_ratio[order]
+        return ids, word_overlap, length_ratio, considered, within_bounds
+
+# Per-process reconciliation state, set by _init_worker
+_state = {}
+
+def _init_worker(model_data, names_b, settings):
+    """Load the model and index list B once per worker process"""
+    comparator = LegalNameComparator(cpu_budget=CpuBudget(cores=1))
+    comparator.set_model_data(model_data)
+    normalized_b = [comparator.preprocess_legal_name(name) for name in names_b]
+    _state['comparator'] = comparator
+    _state['names_b'] = names_b
+    _state['index'] = TokenIndex(normalized_b, settings['max_df'])
+    _state['settings'] = settings
+
+def _reconcile_chunk(task):
+    """Best match for each A name in a chunk; returns (rows, stats)"""
+    start, names_a = task
+    comparator = _state['comparator']
+    names_b = _state['names_b']
+    index = _state['index']
+    settings = _state['settings']
+
+    stats = {'sharing_token': 0, 'within_bounds': 0}
+    pair_rows = []
+    candidates = []
+    for offset, name_a in enumerate(names_a):
+        ids, overlap, ratio, considered, within_bounds = index.candidates(
+            comparator.preprocess_legal_name(name_a),
+            settings['min_length_ratio'], settings['min_word_overlap'], settings['candidates']
+        )
+        stats['sharing_token'] += considered
+        stats['within_bounds'] += within_bounds
+        candidates.append(len(ids))
+        pair_rows.extend((offset, int(b), o, r) for b, o, r in zip(ids, overlap, ratio))
+
+    # One model call for every surviving pair in the chunk
+    _, probabilities = comparator.predict_batch(
+        [names_a[offset] for offset, _, _, _ in pair_rows],
+        [names_b[b] for _, b, _, _ in pair_rows]
+    )
+
+    best = {}
+    for (offset, b, overlap, ratio), probability in zip(pair_rows, probabilities):
+        if offset not in best or probability[1] < best[offset][3]:
+            best[offset] = (b, overlap, ratio, float(probability[1]))
+
+    rows = []
+    for offset, name_a in enumerate(names_a):
+        row = {'a_index': start + offset, 'name_a': name_a, 'candidates': candidates[offset]}
+        if offset in best:
+            b, overlap, ratio, probability = best[offset]
+            material = probability > 0.5
+            row.update({
+                'b_index': b,
+                'name_b': names_b[b],
+                'word_overlap': round(float(overlap), 4),
+                'length_ratio': round(float(ratio), 4),
+                'materiality_probability': probability,
+                'prediction': 'Material' if material else 'Immaterial'
+            })
+        else:
+            row['prediction'] = 'No candidate'
+        rows.append(row)
+    stats['scored'] = len(pair_rows)
+    return rows, stats
+
+def reconcile(comparator, names_a, names_b, processes=1, chunk_size=2000, candidates=10,
+              min_length_ratio=0.5, min_word_overlap=0.3, max_df=0.05):
+    """Yield (rows, stats) per chunk of A, in A order.
+
+    rows hold each A name's best match in B (the lowest materiality
+    probability among its scored candidates); Immaterial means the names are
+    judged the same entity."""
+    settings = {
+        'candidates': candidates,
+        'min_length_ratio': min_length_ratio,
+        'min_word_overlap': min_word_overlap,
+        'max_df': max_df
+    }
+    initargs = (comparator.get_model_data(), names_b, settings)
+    tasks = ((start, names_a[start:start + chunk_size]) for start in range(0, len(names_a), chunk_size))
+
+    if processes <= 1:
+        _init_worker(*initargs)
+        for task in tasks:
+            yield _reconcile_chunk(task)
+        return
+
+    # spawn: the same start method as the batch scorer, safe on every platform
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+        for result in pool.imap(_reconcile_chunk, tasks):
+            yield result
+
+def load_names(filepath, column):
+    """Load one column of names from an Excel, CSV or Parquet file"""
+    if filepath.endswith('.csv'):
+        df = pd.read_csv(filepath)
+    elif filepath.endswith('.parquet'):
+        df = pd.read_parquet(filepath)
+    else:
+        df = pd.read_excel(filepath)
+
+    if column not in df.columns:
+        raise ValueError(f'{filepath} must have a {column} column')
+    return df[column].fillna('').astype(str).tolist()
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconcile two lists of legal names')
+    parser.add_argument('list_a', help='Excel/CSV/Parquet file to find matches for (one output row per name)')
+    parser.add_argument('list_b', help='Excel/CSV/Parquet file to match against')
+    parser.add_argument('--column-a', default='name', help='Name column in list A')
+    parser.add_argument('--column-b', default='name', help='Name column in list B')
+    parser.add_argument('--model', default='legal_name_model.pkl', help='Trained model to score with')
+    parser.add_argument('--output', default='reconciliation.csv', help='CSV file for the best matches')
+    parser.add_argument('--processes', type=int, default=available_cores(), help='Worker processes')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='A rows per work unit')
+    parser.add_argument('--candidates', type=int, default=10, help='Candidates scored per A row')
+    parser.add_argument('--min-length-ratio', type=float, default=0.5,
+                        help='Drop pairs whose normalized lengths differ by more than this ratio')
+    parser.add_argument('--min-word-overlap', type=float, default=0.3,
+                        help='Drop pairs sharing less than this share of the longer name\'s tokens')
+    parser.add_argument('--max-df', type=float, default=0.05,
+                        help='Tokens in more than this share of B only refine overlap, not generate candidates')
+    args = parser.parse_args()
+
+    comparator = LegalNameComparator()
+    comparator.load_model(args.model)
+    names_a = load_names(args.list_a, args.column_a)
+    names_b = load_names(args.list_b, args.column_b)
+    print(f"Reconciling {len(names_a):,} x {len(names_b):,} names with {args.processes} processes...")
+
+    start_time = time.time()
+    totals = {'sharing_token': 0, 'within_bounds': 0, 'scored': 0}
+    counts = {'Immaterial': 0, 'Material': 0, 'No candidate': 0}
+    with open(args.output, 'w', newline='') as f:
+        header = True
+        for rows, stats in reconcile(comparator, names_a, names_b, args.processes, args.chunk_size,
+                                     args.candidates, args.min_length_ratio, args.min_word_overlap,
+                                     args.max_df):
+            chunk = pd.DataFrame(rows, columns=OUTPUT_COLUMNS)
+            # Nullable ints: A rows without a candidate have no B index
+            chunk['b_index'] = chunk['b_index'].astype('Int64')
+            chunk.to_csv(f, index=False, header=header)
+            header = False
+            for key in totals:
+                totals[key] += stats[key]
+            for row in rows:
+                counts[row['prediction']] += 1
+
+    all_pairs = len(names_a) * len(names_b)
+    print(f"Pairs: {all_pairs:,} in the cross product, {totals['sharing_token']:,} sharing a token, "
+          f"{totals['within_bounds']:,} within bounds, {totals['scored']:,} scored")
+    print(f"Matches: {counts['Immaterial']:,} immaterial, {counts['Material']:,} material, "
+          f"{counts['No candidate']:,} without a candidate")
+    print(f"Finished in {time.time() - start_time:.1f}s -> {args.output}")
+
+if __name__ == "__main__":
+    main()
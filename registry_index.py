@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Registry Index
+Nearest-name lookup against a large reference registry of legal entities.
+Normalized registry names are indexed by character trigram in a compressed
+(CSR) inverted index: a sorted array of trigram keys, an offsets array and one
+flat array of name ids. The index is saved as .npy files and memory-mapped on
+load, so opening a multi-million-name registry is instant and shares pages
+between worker processes. Lookups gather candidates from the postings, rank
+them by trigram Dice similarity and re-rank the best with the model.
+"""
+
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from legal_name_comparison import LegalNameComparator
+
+INDEX_FORMAT_VERSION = 1
+
+# Files making up a saved index, memory-mapped on load
+INDEX_ARRAYS = ('keys', 'offsets', 'postings', 'gram_counts',
+                'names', 'name_offsets', 'normalized', 'normalized_offsets',
+                'ids', 'id_offsets')
+
+def trigram_keys(text):
+    """Sorted unique trigram keys of a normalized name, padded so short names
+    and word boundaries still produce trigrams.
+
+    Each key packs three code points (21 bits each) into one integer, so keys
+    are exact and need no vocabulary."""
+    if not text:
+        return np.zeros(0, dtype=np.uint64)
+    padded = f"  {text} "
+    codes = np.fromiter((ord(char) for char in padded), dtype=np.uint64, count=len(padded))
+    keys = (codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:]
+    return np.unique(keys)
+
+def encode_strings(values):
+    """UTF-8 blob and int64 offsets for a list of strings"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+def decode_string(blob, offsets, i):
+    """String i of a blob written by encode_strings"""
+    return bytes(blob[offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+class RegistryIndex:
+    """Trigram inverted index over normalized registry names"""
+
+    def __init__(self, arrays, meta=None):
+        self.meta = meta or {}
+        self.keys = arrays['keys']
+        self.offsets = arrays['offsets']
+        self.postings = arrays['postings']
+        self.gram_counts = arrays['gram_counts']
+        self.names = arrays['names']
+        self.name_offsets = arrays['name_offsets']
+        self.normalized = arrays['normalized']
+        self.normalized_offsets = arrays['normalized_offsets']
+        self.ids = arrays.get('ids')
+        self.id_offsets = arrays.get('id_offsets')
+
+    def __len__(self):
+        return len(self.gram_counts)
+
+    @classmethod
+    def build(cls, names, ids=None, comparator=None, chunk_size=100000):
+        """Index a list of registry names (and optional entity ids)"""
+        comparator = comparator or LegalNameComparator()
+        names = [str(name) for name in names]
+        normalized = [comparator.preprocess_legal_name(name) for name in names]
+
+        # (key, name id) pairs, collected per chunk as arrays to keep memory flat
+        key_chunks = []
+        id_chunks = []
+        gram_counts = np.zeros(len(names), dtype=np.int32)
+        for start in range(0, len(names), chunk_size):
+            grams = [trigram_keys(text) for text in normalized[start:start + chunk_size]]
+            counts = np.fromiter((len(g) for g in grams), dtype=np.int32, count=len(grams))
+            gram_counts[start:start + len(grams)] = counts
+            if counts.sum():
+                key_chunks.append(np.concatenate(grams))
+                id_chunks.append(np.repeat(np.arange(start, start + len(grams), dtype=np.int32), counts))
+
+        all_keys = np.concatenate(key_chunks) if key_chunks else np.zeros(0, dtype=np.uint64)
+        all_ids = np.concatenate(id_chunks) if id_chunks else np.zeros(0, dtype=np.int32)
+        # Stable sort keeps each trigram's postings in ascending name order
+        order = np.argsort(all_keys, kind='stable')
+        all_keys = all_keys[order]
+        postings = all_ids[order]
+        del order
+
+        keys, starts = np.unique(all_keys, return_index=True)
+        offsets = np.append(starts, len(postings)).astype(np.int64)
+
+        name_blob, name_offsets = encode_strings(names)
+        normalized_blob, normalized_offsets = encode_strings(normalized)
+        arrays = {
+            'keys': keys,
+            'offsets': offsets,
+            'postings': postings,
+            'gram_counts': gram_counts,
+            'names': name_blob,
+            'name_offsets': name_offsets,
+            'normalized': normalized_blob,
+            'normalized_offsets': normalized_offsets
+        }
+        if ids is not None:
+            arrays['ids'], arrays['id_offsets'] = encode_strings([str(value) for value in ids])
+
+        meta = {
+            'format_version': INDEX_FORMAT_VERSION,
+            'names': len(names),
+            'trigrams': int(len(keys)),
+            'postings': int(len(postings)),
+            'has_ids': ids is not None
+        }
+        return cls(arrays, meta)
+
+    def save(self, directory):
+        """Write the index as .npy files plus meta.json"""
+        os.makedirs(directory, exist_ok=True)
+        for name in INDEX_ARRAYS:
+            array = getattr(self, name)
+            if array is not None:
+                np.save(os.path.join(directory, f"{name}.npy"), np.asarray(array))
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """Open a saved index; arrays are memory-mapped unless mmap is False"""
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('format_version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported registry index format: {meta.get('format_version')}")
+
+        arrays = {}
+        for name in INDEX_ARRAYS:
+            path = os.path.join(directory, f"{name}.npy")
+            if os.path.exists(path):
+                arrays[name] = np.load(path, mmap_mode='r' if mmap else None)
+        return cls(arrays, meta)
+
+    def name(self, i):
+        """Registry name i"""
+        return decode_string(self.names, self.name_offsets, i)
+
+    def normalized_name(self, i):
+        """Normalized registry name i"""
+        return decode_string(self.normalized, self.normalized_offsets, i)
+
+    def entity_id(self, i):
+        """Entity id of registry name i, or None when the registry had no ids"""
+        if self.ids is None:
+            return None
+        return decode_string(self.ids, self.id_offsets, i)
+
+    def candidates(self, normalized_query, limit=200, max_postings=None):
+        """Registry ids sharing the most trigrams with the query, and their Dice similarity.
+
+        Trigrams whose postings are longer than max_postings (default 5% of the
+        registry) only count when the query has nothing rarer, so very common
+        trigrams do not dominate lookup time."""
+        query = trigram_keys(normalized_query)
+        if len(query) == 0 or len(self.keys) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        positions = np.searchsorted(self.keys, query)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == query[found]
+        positions = positions[found]
+        if len(positions) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        starts = self.offsets[positions]
+        lengths = self.offsets[positions + 1] - starts
+        max_postings = max_postings or max(1000, len(self) // 20)
+        rare = lengths <= max_postings
+        if rare.any():
+            starts, lengths = starts[rare], lengths[rare]
+
+        hits = np.concatenate([self.postings[start:start + length] for start, length in zip(starts, lengths)])
+        ids, shared = np.unique(hits, return_counts=True)
+        if len(ids) > limit:
+            top = np.argpartition(-shared, limit - 1)[:limit]
+            ids, shared = ids[top], shared[top]
+
+        # Dice over the trigrams counted for these candidates (all of them when none were skipped)
+        dice = 2.0 * shared / (len(query) + self.gram_counts[ids])
+        order = np.argsort(-dice, kind='stable')
+        return ids[order].astype(np.int64), dice[order]
+
+    def lookup(self, comparator, name, k=10, candidate_limit=200, rerank=20):
+        """Top-k registry names closest to name, re-ranked by the model.
+
+        The best `rerank` trigram candidates are scored with the model and
+        returned most-likely-same-entity first (lowest materiality probability)."""
+        timings = {}
+        start = time.perf_counter()
+        normalized_query = comparator.preprocess_legal_name(name)
+        ids, dice = self.candidates(normalized_query, candidate_limit)
+        ids, dice = ids[:rerank], dice[:rerank]
+        timings['candidates'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        registry_names = [self.name(i) for i in ids]
+        results = []
+        if registry_names:
+            predictions, probabilities = comparator.predict_batch([str(name)] * len(registry_names), registry_names)
+            for i, registry_name, similarity, prediction, probability in zip(
+                    ids, registry_names, dice, predictions, probabilities):
+                results.append({
+                    'index': int(i),
+                    'id': self.entity_id(i),
+                    'name': registry_name,
+                    'trigram_similarity': round(float(similarity), 4),
+                    'prediction': 'Material' if prediction else 'Immaterial',
+                    'is_material': bool(prediction),
+                    'materiality_probability': float(probability[1])
+                })
+            results.sort(key=lambda r: (r['materiality_probability'], -r['trigram_similarity']))
+        timings['rerank'] = time.perf_counter() - start
+
+        summary = {
+            'candidates': int(len(ids)),
+            'timings_ms': {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+        }
+        return results[:k], summary
+
+def load_registry(filepath, column='name', id_column=None):
+    """Load registry names (and ids) from an Excel, CSV or Parquet file"""
+    if filepath.endswith('.csv'):
+        df = pd.read_csv(filepath)
+    elif filepath.endswith('.parquet'):
+        df = pd.read_parquet(filepath)
+    else:
+        df = pd.read_excel(filepath)
+
+    if column not in df.columns:
+        raise ValueError(f'Registry file must have a {column} column')
+    df = df.dropna(subset=[column])
+    ids = df[id_column].tolist() if id_column else None
+    return df[column].astype(str).tolist(), ids
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or query a registry trigram index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Index a registry file')
+    build_parser.add_argument('registry', help='Excel/CSV/Parquet file of registry names')
+    build_parser.add_argument('--output', default='registry_index', help='Directory to write the index to')
+    build_parser.add_argument('--column', default='name', help='Column holding the names')
+    build_parser.add_argument('--id-column', default=None, help='Column holding entity ids')
+
+    lookup_parser = subparsers.add_parser('lookup', help='Find the closest registry names')
+    lookup_parser.add_argument('names', nargs='+', help='Names to look up')
+    lookup_parser.add_argument('--index', default='registry_index', help='Index directory')
+    lookup_parser.add_argument('--model', default='legal_name_model.pkl', help='Trained model to re-rank with')
+    lookup_parser.add_argument('-k', type=int, default=10, help='Results per name')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start = time.time()
+        names, ids = load_registry(args.registry, args.column, args.id_column)
+        index = RegistryIndex.build(names, ids)
+        index.save(args.output)
+        print(f"Indexed {index.meta['names']:,} names ({index.meta['trigrams']:,} trigrams, "
+              f"{index.meta['postings']:,} postings) in {time.time() - start:.1f}s -> {args.output}")
+        return
+
+    comparator = LegalNameComparator()
+    comparator.load_model(args.model)
+    index = RegistryIndex.load(args.index)
+    for name in args.names:
+        results, summary = index.lookup(comparator, name, args.k)
+        print(f"\n{name}  ({summary['candidates']} candidates, {summary['timings_ms']})")
+        for rank, result in enumerate(results, 1):
+            print(f"  {rank:>2}. {result['name']:<50} {result['prediction']:<10} "
+                  f"p={result['materiality_probability']:.3f} dice={result['trigram_similarity']:.3f}")
+
+if __name__ == "__main__":
+    main()
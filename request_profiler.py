@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Request Profiler
+On-demand sampling profiler for individual requests, producing collapsed stacks
+(flame graph input) and a top-N function summary, and an opt-in tracemalloc
+allocation tracker reporting peak memory and top allocation sites per stage
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import threading
+import logging
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from functools import wraps
+
+from flask import request, make_response, g
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_\-]+$')
+
+# tracemalloc is process-wide, so only one request is traced at a time
+MEMORY_TRACE_LOCK = threading.Lock()
+
+def profile_requested():
+    """Whether the caller asked for a profile (?profile=1)"""
+    return request.args.get('profile', '').lower() in ('1', 'true', 'yes')
+
+def memory_requested():
+    """Whether the caller asked for memory tracking (?memory=1)"""
+    return request.args.get('memory', '').lower() in ('1', 'true', 'yes')
+
+def _mb(num_bytes):
+    return round(num_bytes / (1024 * 1024), 3)
+
+class SamplingProfiler:
+    """Samples one thread's Python stack on an interval from a background thread"""
+
+    def __init__(self, interval_ms=5):
+        self.interval = interval_ms / 1000.0
+        self.samples = Counter()
+        self.sample_count = 0
+        self.duration = 0.0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._target = None
+        self._root = None
+        self._started = None
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+            self._labels[code] = label
+        return label
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._target)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None and frame is not self._root:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        if not stack:
+            return
+        stack.reverse()
+        self.samples[tuple(stack)] += 1
+        self.sample_count += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self, root_frame=None):
+        """Start sampling the calling thread, keeping only frames called from root_frame"""
+        self._target = threading.get_ident()
+        self._root = root_frame
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling"""
+        self._stop.set()
+        self._thread.join()
+        self._root = None
+        self.duration = time.perf_counter() - self._started
+
+    def collapsed(self):
+        """Samples in collapsed-stack format: 'frame;frame;frame count' per line"""
+        lines = [f"{';'.join(stack)} {count}" for stack, count in self.samples.most_common()]
+        return '\n'.join(lines) + '\n'
+
+    def top(self, n=25):
+        """Top-N functions by self and inclusive samples"""
+        self_counts = Counter()
+        total_counts = Counter()
+        for stack, count in self.samples.items():
+            self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+
+        ms_per_sample = self.duration * 1000 / self.sample_count if self.sample_count else 0.0
+
+        def rows(counts):
+            return [{
+                'function': label,
+                'samples': count,
+                'share': round(count / self.sample_count, 4),
+                'est_ms': round(count * ms_per_sample, 2)
+            } for label, count in counts.most_common(n)]
+
+        return {'self': rows(self_counts), 'inclusive': rows(total_counts)}
+
+class ProfileStore:
+    """Stores profiles as <id>.collapsed and <id>.json files in a directory"""
+
+    def __init__(self, directory='profiles'):
+        self.directory = directory
+
+    def _path(self, profile_id, extension):
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            raise ValueError(f"Invalid profile id: {profile_id}")
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+    def save(self, profiler, endpoint, user=None, status_code=None, top_n=25):
+        """Write a finished profile; returns its id"""
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{endpoint}_{uuid.uuid4().hex[:8]}"
+
+        with open(self._path(profile_id, 'collapsed'), 'w') as f:
+            f.write(profiler.collapsed())
+
+        summary = {
+            'id': profile_id,
+            'endpoint': endpoint,
+            'user': user,
+            'status_code': status_code,
+            'created_at': datetime.now().isoformat(),
+            'duration_ms': round(profiler.duration * 1000, 2),
+            'interval_ms': round(profiler.interval * 1000, 3),
+            'samples': profiler.sample_count,
+            'top': profiler.top(top_n)
+        }
+        with open(self._path(profile_id, 'json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        return profile_id
+
+    def list(self, limit=50):
+        """Newest profiles first, without their top-N tables"""
+        if not os.path.isdir(self.directory):
+            return []
+        ids = sorted((name[:-5] for name in os.listdir(self.directory) if name.endswith('.json')), reverse=True)
+        profiles = []
+        for profile_id in ids[:limit]:
+            summary = self.get(profile_id)
+            if summary:
+                summary.pop('top', None)
+                profiles.append(summary)
+        return profiles
+
+    def get(self, profile_id):
+        """Summary JSON for a profile, or None"""
+        try:
+            with open(self._path(profile_id, 'json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def collapsed_path(self, profile_id):
+        """Path of a profile's collapsed stacks, or None"""
+        try:
+            path = self._path(profile_id, 'collapsed')
+        except ValueError:
+            return None
+        return path if os.path.exists(path) else None
+
+def profile_request(endpoint, store, is_admin, current_user=None, interval_ms=5):
+    """Decorator: profile the wrapped view when an admin passes ?profile=1.
+
+    The profile id is returned in the X-Profile-Id response header. Without the
+    flag the view is called directly."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not profile_requested() or not is_admin():
+                return f(*args, **kwargs)
+
+            profiler = SamplingProfiler(interval_ms)
+            # Only keep frames below this wrapper, not the server and framework frames above it
+            profiler.start(sys._getframe())
+            try:
+                response = make_response(f(*args, **kwargs))
+            finally:
+                profiler.stop()
+
+            try:
+                profile_id = store.save(
+                    profiler, endpoint,
+                    user=current_user() if current_user else None,
+                    status_code=response.status_code
+                )
+                response.headers['X-Profile-Id'] = profile_id
+            except Exception as e:
+                logger.error(f"Error saving request profile: {str(e)}")
+            return response
+        return decorated_function
+    return decorator
+
+class MemoryTracker:
+    """Traces Python allocations for one request with tracemalloc.
+
+    Each checkpoint records the memory held and the peak since the previous
+    checkpoint (relative to the start of the request) and the allocation sites
+    that grew the most. Figures include tracemalloc's own snapshot overhead."""
+
+    def __init__(self, top_n=10, sites_per_stage=3):
+        self.top_n = top_n
+        self.sites_per_stage = sites_per_stage
+        self.stages = []
+        self.peak = 0
+        self.retained = 0
+        self._baseline = 0
+        self._snapshot = None
+        self._owns_tracing = False
+        self._active = False
+
+    def _take_snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>')
+        ))
+
+    def start(self):
+        """Start tracing; returns False if another request is already being traced"""
+        if not MEMORY_TRACE_LOCK.acquire(blocking=False):
+            return False
+        try:
+            # Leave tracing running afterwards if it was enabled outside this tracker
+            self._owns_tracing = not tracemalloc.is_tracing()
+            if self._owns_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._baseline = tracemalloc.get_traced_memory()[0]
+            self._snapshot = self._take_snapshot()
+            self._active = True
+        except Exception:
+            MEMORY_TRACE_LOCK.release()
+            raise
+        return True
+
+    def checkpoint(self, stage):
+        """Record memory at the end of a stage"""
+        if not self._active:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = self._take_snapshot()
+        growth = [diff for diff in snapshot.compare_to(self._snapshot, 'lineno') if diff.size_diff > 0]
+        self._snapshot = snapshot
+
+        self.peak = max(self.peak, peak - self._baseline)
+        self.stages.append({
+            'stage': stage,
+            'current_mb': _mb(current - self._baseline),
+            'peak_mb': _mb(peak - self._baseline),
+            'top_sites': [{
+                'site': f"{diff.traceback[0].filename}:{diff.traceback[0].lineno}",
+                'size_mb': _mb(diff.size_diff),
+                'count': diff.count_diff
+            } for diff in growth[:self.sites_per_stage]]
+        })
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name):
+        """Checkpoint at the end of the enclosed block"""
+        try:
+            yield
+        finally:
+            self.checkpoint(name)
+
+    def stop(self):
+        """Stop tracing and release the trace lock"""
+        if not self._active:
+            return
+        try:
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak = max(self.peak, peak - self._baseline)
+            self.retained = current - self._baseline
+        finally:
+            self._active = False
+            self._snapshot = None
+            if self._owns_tracing:
+                tracemalloc.stop()
+            MEMORY_TRACE_LOCK.release()
+
+    def report(self):
+        """Peak and retained memory, per-stage figures and the largest allocation sites"""
+        sites = [dict(site, stage=stage['stage']) for stage in self.stages for site in stage['top_sites']]
+        sites.sort(key=lambda site: site['size_mb'], reverse=True)
+        return {
+            'peak_mb': _mb(self.peak),
+            'retained_mb': _mb(self.retained),
+            'stages': self.stages,
+            'top_sites': sites[:self.top_n]
+        }
+
+def memory_stage(name):
+    """Checkpoint the request's memory tracker at the end of a block; a no-op when not tracking"""
+    tracker = g.get('memory_tracker')
+    return tracker.stage(name) if tracker is not None else nullcontext()
+
+def _attach_debug(response, key, value):
+    """Add value under debug.<key> in a JSON response body"""
+    payload = response.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return
+    payload.setdefault('debug', {})[key] = value
+    response.set_data(json.dumps(payload))
+
+def track_memory(endpoint, is_allowed, on_report=None, top_n=10):
+    """Decorator: trace allocations for the wrapped view when an allowed user passes ?memory=1.
+
+    Stages timed with the request's StageTimer (g.stage_timer) or memory_stage()
+    become checkpoints. The report is added to the JSON response as debug.memory
+    and passed to on_report(endpoint, report)."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not memory_requested() or not is_allowed():
+                return f(*args, **kwargs)
+
+            tracker = MemoryTracker(top_n)
+            if not tracker.start():
+                response = make_response(f(*args, **kwargs))
+                _attach_debug(response, 'memory', {'skipped': 'Another request is being memory-profiled'})
+                return response
+
+            timer = g.get('stage_timer')
+            g.memory_tracker = tracker
+            if timer is not None:
+                timer.memory_tracker = tracker
+            try:
+                response = make_response(f(*args, **kwargs))
+            finally:
+                tracker.stop()
+                g.memory_tracker = None
+                if timer is not None:
+                    timer.memory_tracker = None
+
+            report = tracker.report()
+            if on_report:
+                try:
+                    on_report(endpoint, report)
+                except Exception as e:
+                    logger.error(f"Error publishing memory report: {str(e)}")
+            _attach_debug(response, 'memory', report)
+            return response
+        return decorated_function
+    return decorator
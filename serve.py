@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Production serving entry point
+Runs one of the Flask apps under gunicorn with the model loaded in the master
+before forking, so workers share it copy-on-write. SIGHUP (sent by the apps
+when a new model is promoted) reloads the active model in the master and
+gracefully replaces the workers.
+"""
+
+import argparse
+import importlib
+import logging
+import multiprocessing
+import os
+
+from gunicorn.app.base import BaseApplication
+
+from serving import MASTER_PID_ENV, WORKERS_ENV, THREADS_ENV
+from cpu_budget import default_budget
+
+logger = logging.getLogger(__name__)
+
+APPS = {
+    'basic': 'app',
+    'feedback': 'app_with_feedback',
+    'enterprise': 'enterprise_app'
+}
+
+class ModelServer(BaseApplication):
+    """gunicorn application that preloads an app module and its active model"""
+
+    def __init__(self, module_name, options):
+        self.module_name = module_name
+        self.options = options
+        self.module = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key.lower(), value)
+
+    def load(self):
+        # Runs once in the master (preload_app), before any worker is forked
+        self.module = importlib.import_module(self.module_name)
+        if hasattr(self.module, 'init_app'):
+            self.module.init_app()
+        self.load_model()
+        logger.info(f"CPU budget: {default_budget().describe()}")
+        return self.module.app
+
+    def load_model(self):
+        """Load the active model into the app module's global comparator"""
+        try:
+            if self.module.load_active_model():
+                logger.info(f"Loaded active model for {self.module_name}")
+            else:
+                logger.info(f"No trained model found for {self.module_name}")
+        except Exception as e:
+            logger.error(f"Error loading active model: {str(e)}")
+
+    def reload(self):
+        # SIGHUP: gunicorn re-reads the config and then forks fresh workers from
+        # this process, so load the newly promoted model here first
+        super().reload()
+        if self.module is not None:
+            self.load_model()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a legal name comparison app with gunicorn')
+    parser.add_argument('--app', choices=list(APPS), default='feedback', help='Which app to serve')
+    parser.add_argument('--bind', default=f"0.0.0.0:{os.environ.get('PORT', 5001)}", help='Address to bind')
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count())),
+                        help='Worker processes (default: WEB_CONCURRENCY or the core count)')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SERVE_THREADS', 1)),
+                        help='Threads per worker (more than 1 uses the gthread worker)')
+    parser.add_argument('--max-requests', type=int, default=1000,
+                        help='Recycle a worker after this many requests (0 disables)')
+    parser.add_argument('--max-requests-jitter', type=int, default=50,
+                        help='Random jitter added to --max-requests so workers do not recycle together')
+    parser.add_argument('--timeout', type=int, default=300,
+                        help='Seconds before a silent worker is killed (uploads train synchronously)')
+    parser.add_argument('--graceful-timeout', type=int, default=60,
+                        help='Seconds in-flight requests get to finish on reload or shutdown')
+    parser.add_argument('--log-level', default='info', help='gunicorn log level')
+    args = parser.parse_args()
+
+    # Workers inherit these: the master pid for reload requests, the sizing for CPU budgeting
+    os.environ[MASTER_PID_ENV] = str(os.getpid())
+    os.environ[WORKERS_ENV] = str(args.workers)
+    os.environ[THREADS_ENV] = str(args.threads)
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests_jitter,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'loglevel': args.log_level,
+        'preload_app': True
+    }
+    ModelServer(APPS[args.app], options).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Serving
+Helpers shared by the apps and serve.py for running under the prefork server
+"""
+
+import os
+import signal
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Set by serve.py in the master before workers are forked
+MASTER_PID_ENV = 'SERVE_MASTER_PID'
+WORKERS_ENV = 'SERVE_WORKERS'
+THREADS_ENV = 'SERVE_THREADS'
+
+def under_prefork_server():
+    """Whether this process is a worker forked by serve.py"""
+    master_pid = os.environ.get(MASTER_PID_ENV)
+    return bool(master_pid) and int(master_pid) != os.getpid()
+
+def request_model_reload():
+    """Ask the serve.py master to load the newly promoted model and replace its workers.
+
+    Returns False when not running under serve.py."""
+    if not under_prefork_server():
+        return False
+    try:
+        os.kill(int(os.environ[MASTER_PID_ENV]), signal.SIGHUP)
+        logger.info("Requested model reload from the serving master")
+        return True
+    except OSError as e:
+        logger.error(f"Error requesting model reload: {str(e)}")
+        return False
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Snapshot Diff
+Detects material legal name changes between two daily snapshots keyed by
+entity id. The snapshots are hash-joined on id; names that are byte-identical
+or identical after normalization are skipped without feature extraction, and
+only the remaining changed names are scored with the model. The output holds
+just the entities whose change is flagged as Material.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from legal_name_comparison import LegalNameComparator
+from batch_scorer import BatchScorer
+
+OUTPUT_COLUMNS = ['id', 'previous_name', 'current_name', 'prediction', 'materiality_probability']
+
+def load_snapshot(filepath, id_column='id', name_column='name'):
+    """Load the id and name columns of a snapshot from a CSV, Parquet or Excel file.
+
+    Ids keep the type they are read with: numeric ids stay integers, which
+    read and join much faster than strings."""
+    columns = [id_column, name_column]
+    if filepath.endswith('.csv'):
+        df = pd.read_csv(filepath, usecols=columns, dtype={name_column: str}, keep_default_na=False)
+    elif filepath.endswith('.parquet'):
+        df = pd.read_parquet(filepath, columns=columns)
+    else:
+        df = pd.read_excel(filepath, usecols=columns, dtype={name_column: str}, keep_default_na=False)
+    return prepare_snapshot(df, id_column, name_column)
+
+def prepare_snapshot(df, id_column='id', name_column='name'):
+    """Snapshot frame with id and (string) name columns"""
+    missing = [col for col in (id_column, name_column) if col not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+    return pd.DataFrame({
+        'id': df[id_column].to_numpy(),
+        'name': df[name_column].fillna('').astype(str).to_numpy()
+    })
+
+def _id_keys(ids):
+    """Mask of usable ids and the usable ids as join keys.
+
+    Missing and empty ids are not keys. A float column whose ids are all whole
+    numbers (what one blank cell turns an integer id column into) is joined as
+    integers."""
+    ids = pd.Series(ids)
+    valid = ids.notna().to_numpy()
+    if not pd.api.types.is_numeric_dtype(ids):
+        valid = valid & ids.ne('').to_numpy()
+    keys = ids.to_numpy()[valid]
+    if keys.dtype.kind == 'f' and np.all(np.mod(keys, 1) == 0):
+        keys = keys.astype(np.int64)
+    return valid, keys
+
+def diff_snapshots(comparator, previous, current, min_probability=0.5, scorer=None, stage_timer=None):
+    """Score the names that changed between two (id, name) snapshots.
+
+    Returns (flagged, summary): a frame of the entities whose name change is
+    Material (materiality probability above min_probability), and counts for
+    every step. Rows with a missing or empty id are skipped and counted as
+    null_ids. A BatchScorer passed as scorer scores large change sets
+    across its process pool."""
+    timings = {}
+    summary = {'previous_rows': len(previous), 'current_rows': len(current)}
+
+    # Hash join on id: one hash table over the previous ids, probed with the current ones
+    start = time.perf_counter()
+    previous_valid, previous_ids = _id_keys(previous['id'])
+    current_valid, current_ids = _id_keys(current['id'])
+    summary['null_ids'] = int((~previous_valid).sum() + (~current_valid).sum())
+    numeric = previous_ids.dtype.kind in 'iuf' and current_ids.dtype.kind in 'iuf'
+    if previous_ids.dtype != current_ids.dtype and not numeric:
+        # Numeric ids against text ids only match as text; mixed numeric dtypes join as they are
+        previous_ids, current_ids = previous_ids.astype(str), current_ids.astype(str)
+    previous_names = previous['name'].to_numpy()[previous_valid]
+    current_names = current['name'].to_numpy()[current_valid]
+    if len(previous_ids) == len(current_ids) and np.array_equal(previous_ids, current_ids):
+        # Snapshots exported in the same id order line up without a join
+        positions = np.arange(len(current_ids))
+        summary['duplicate_ids'] = 0
+    else:
+        index = pd.Index(previous_ids)
+        if not index.is_unique:
+            # A repeated previous id keeps its last row
+            keep = ~index.duplicated(keep='last')
+            previous_ids, previous_names = previous_ids[keep], previous_names[keep]
+            index = pd.Index(previous_ids)
+        summary['duplicate_ids'] = int(previous_valid.sum()) - len(previous_ids)
+        positions = index.get_indexer(current_ids)
+    matched = positions >= 0
+    ids = current_ids[matched]
+    previous_names = previous_names[positions[matched]]
+    current_names = current_names[matched]
+    seen = np.zeros(len(previous_ids), dtype=bool)
+    seen[positions[matched]] = True
+    summary['matched_ids'] = len(ids)
+    summary['added_ids'] = int((~matched).sum())
+    summary['removed_ids'] = int((~seen).sum())
+    timings['join'] = time.perf_counter() - start
+
+    # Byte-identical names need nothing further
+    start = time.perf_counter()
+    changed = np.flatnonzero(previous_names != current_names)
+    summary['unchanged'] = len(ids) - len(changed)
+
+    # Names equal after normalization (case, punctuation, legal suffix) are not material changes
+    normalized_previous = [comparator.preprocess_legal_name(previous_names[i]) for i in changed]
+    normalized_current = [comparator.preprocess_legal_name(current_names[i]) for i in changed]
+    keep = np.array([a != b for a, b in zip(normalized_previous, normalized_current)], dtype=bool)
+    changed = changed[keep]
+    summary['normalization_identical'] = len(keep) - len(changed)
+    timings['filter'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    names1 = [previous_names[i] for i in changed]
+    names2 = [current_names[i] for i in changed]
+    probabilities = np.zeros((0, 2))
+    if names1:
+        if scorer is not None and scorer.should_use(len(names1)):
+            _, probabilities = scorer.predict_batch(comparator, names1, names2, stage_timer=stage_timer)
+        else:
+            _, probabilities = comparator.predict_batch(names1, names2, stage_timer=stage_timer)
+    summary['scored'] = len(names1)
+    timings['scoring'] = time.perf_counter() - start
+
+    materiality = np.asarray(probabilities, dtype=np.float64).reshape(-1, 2)[:, 1]
+    flagged_rows = materiality > min_probability
+    flagged = pd.DataFrame({
+        'id': ids[changed][flagged_rows],
+        'previous_name': np.array(names1, dtype=object)[flagged_rows],
+        'current_name': np.array(names2, dtype=object)[flagged_rows],
+        'prediction': 'Material',
+        'materiality_probability': materiality[flagged_rows]
+    }, columns=OUTPUT_COLUMNS)
+    summary['flagged'] = len(flagged)
+    summary['min_probability'] = min_probability
+    summary['timings_ms'] = {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
+    return flagged, summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Flag material legal name changes between two snapshots')
+    parser.add_argument('previous', help='Earlier snapshot (CSV, Parquet or Excel)')
+    parser.add_argument('current', help='Later snapshot (CSV, Parquet or Excel)')
+    parser.add_argument('--id-column', default='id', help='Column holding the entity id')
+    parser.add_argument('--name-column', default='name', help='Column holding the legal name')
+    parser.add_argument('--model', default='legal_name_model.pkl', help='Trained model to score with')
+    parser.add_argument('--output', default='material_changes.csv', help='CSV file for the flagged entities')
+    parser.add_argument('--min-probability', type=float, default=0.5,
+                        help='Flag changes whose materiality probability is above this')
+    parser.add_argument('--processes', type=int, default=1, help='Score changed names across this many processes')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    comparator = LegalNameComparator()
+    comparator.load_model(args.model)
+    previous = load_snapshot(args.previous, args.id_column, args.name_column)
+    current = load_snapshot(args.current, args.id_column, args.name_column)
+    print(f"Loaded {len(previous):,} and {len(current):,} rows in {time.time() - start_time:.1f}s")
+
+    scorer = BatchScorer(processes=args.processes, min_rows=0) if args.processes > 1 else None
+    try:
+        flagged, summary = diff_snapshots(comparator, previous, current, args.min_probability, scorer)
+    finally:
+        if scorer is not None:
+            scorer.close()
+    flagged.to_csv(args.output, index=False)
+
+    print(f"Ids: {summary['matched_ids']:,} in both, {summary['added_ids']:,} added, {summary['removed_ids']:,} removed, "
+          f"{summary['null_ids']:,} rows without an id skipped")
+    print(f"Names: {summary['unchanged']:,} unchanged, {summary['normalization_identical']:,} identical after "
+          f"normalization, {summary['scored']:,} scored, {summary['flagged']:,} flagged")
+    print(f"Timings (ms): {summary['timings_ms']}")
+    print(f"Finished in {time.time() - start_time:.1f}s -> {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Clustering Tests
+"""
+
+import unittest
+
+from clustering import cluster_pairs
+
+class ClusterPairsTest(unittest.TestCase):
+    def test_material_pairs_never_merge(self):
+        """A low min_confidence still only clusters Immaterial pairs"""
+        pairs = [
+            {'name1': 'a', 'name2': 'b', 'materiality_probability': 0.1},
+            {'name1': 'b', 'name2': 'c', 'materiality_probability': 0.6}
+        ]
+
+        clusters, summary = cluster_pairs(pairs, min_confidence=0.3)
+
+        self.assertEqual(summary['edges'], 1)
+        self.assertEqual(sorted(clusters['name']), ['a', 'b'])
+        self.assertEqual(summary['largest_cluster'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Enterprise App Tests
+"""
+
+import os
+import unittest
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+
+import jwt
+
+import enterprise_app
+
+class FakeConnection:
+    """Connection whose cursor returns fixed rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self):
+        return self
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+class DailyAnalyticsTest(unittest.TestCase):
+    def test_rollup_sums_are_json_numbers(self):
+        """SUMs come back from Postgres as numeric (Decimal) but are served as numbers"""
+        rows = [{
+            'date': date(2024, 6, 1),
+            'total_predictions': Decimal('12'),
+            'avg_confidence': Decimal('0.81250000000000000000'),
+            'material_count': Decimal('5'),
+            'immaterial_count': Decimal('7')
+        }]
+        token = jwt.encode({'user_id': 'u1', 'email': 'u1@example.com', 'role': 'user'},
+                           enterprise_app.app.config['SECRET_KEY'], algorithm='HS256')
+
+        with mock.patch.object(enterprise_app, 'get_db_connection', return_value=FakeConnection(rows)):
+            response = enterprise_app.app.test_client().get(
+                '/api/analytics/daily', headers={'Authorization': f'Bearer {token}'}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        row = response.get_json()['data'][0]
+        self.assertEqual(row['total_predictions'], 12)
+        self.assertIsInstance(row['total_predictions'], int)
+        self.assertIsInstance(row['material_count'], int)
+        self.assertIsInstance(row['immaterial_count'], int)
+        self.assertIsInstance(row['avg_confidence'], float)
+        self.assertAlmostEqual(row['avg_confidence'], 0.8125)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Entity Index Tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from legal_name_comparison import LegalNameComparator
+from entity_index import EntityIndex
+
+class FixedComparator(LegalNameComparator):
+    """Comparator that scores every pair with one materiality probability"""
+
+    def __init__(self, probability):
+        super().__init__()
+        self.probability = probability
+
+    def predict_batch(self, names1, names2, stage_timer=None):
+        probabilities = np.tile([1.0 - self.probability, self.probability], (len(names1), 1))
+        return probabilities[:, 1] > 0.5, probabilities
+
+class EntityIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.index = EntityIndex(os.path.join(self.directory, 'entities.db'))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.directory)
+
+    def add(self, comparator, names, min_confidence):
+        return [result for results, _ in self.index.add(comparator, names, min_confidence) for result in results]
+
+    def test_material_best_match_starts_new_entity(self):
+        """A low min_confidence never attaches a name to a Material match"""
+        self.add(FixedComparator(0.6), ['Acme Holdings Group'], min_confidence=0.3)
+        result = self.add(FixedComparator(0.6), ['Acme Holding Group'], min_confidence=0.3)[0]
+
+        self.assertEqual(result['status'], 'new')
+        self.assertEqual(result['materiality_probability'], 0.6)
+
+    def test_immaterial_best_match_attaches(self):
+        self.add(FixedComparator(0.1), ['Acme Holdings Group'], min_confidence=0.3)
+        result = self.add(FixedComparator(0.1), ['Acme Holding Group'], min_confidence=0.3)[0]
+
+        self.assertEqual(result['status'], 'attached')
+        self.assertEqual(result['matched_name'], 'Acme Holdings Group')
+
+    def test_empty_normalized_names_are_separate_entities(self):
+        results = self.add(FixedComparator(0.6), ['Ltd', 'Inc', 'Corporation'], min_confidence=0.5)
+
+        self.assertEqual([r['status'] for r in results], ['new', 'new', 'new'])
+        self.assertEqual(len({r['entity_id'] for r in results}), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Feedback Store Tests
+"""
+
+import threading
+import unittest
+
+from feedback_store import GroupCommitBuffer
+
+class GroupCommitBufferTest(unittest.TestCase):
+    def test_bad_item_only_fails_its_own_write(self):
+        """A group with one bad row commits the good rows and fails only the bad one"""
+        committed = []
+        lock = threading.Lock()
+
+        def flush_batch(items):
+            # All-or-nothing, like a single INSERT ... VALUES transaction
+            if 'bad' in items:
+                raise ValueError('foreign key violation')
+            with lock:
+                committed.extend(items)
+            return [f'id-{item}' for item in items]
+
+        buffer = GroupCommitBuffer(flush_batch, max_items=100, max_delay_ms=50)
+        items = [f'row{i}' for i in range(10)]
+        items.insert(4, 'bad')
+        pending = [buffer.submit(item) for item in items]
+
+        for item, write in zip(items, pending):
+            if item == 'bad':
+                with self.assertRaises(ValueError):
+                    write.wait(timeout=5)
+            else:
+                self.assertEqual(write.wait(timeout=5), f'id-{item}')
+        self.assertEqual(sorted(committed), sorted(item for item in items if item != 'bad'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Legal Name Comparison Tests
+"""
+
+import unittest
+
+from legal_name_comparison import LegalNameComparator
+
+class SignatureCacheTest(unittest.TestCase):
+    def test_equal_numeric_names_keep_their_own_text(self):
+        """1234 and 1234.0 compare equal but normalize to different names"""
+        comparator = LegalNameComparator()
+
+        signatures = comparator._signatures([1234, 1234.0, '1234'])
+
+        self.assertEqual(sorted(signatures), ['1234', '1234.0'])
+        self.assertEqual(signatures['1234.0'].normalized, '1234 0')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Snapshot Diff Tests
+"""
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from legal_name_comparison import LegalNameComparator
+from snapshot_diff import diff_snapshots
+
+class DiffSnapshotsTest(unittest.TestCase):
+    def setUp(self):
+        # Unchanged names are never scored, so no trained model is needed
+        self.comparator = LegalNameComparator()
+
+    def test_null_and_duplicate_ids_are_counted_once(self):
+        """A null id counts as null only; a repeated id counts as one duplicate"""
+        previous = pd.DataFrame({
+            'id': [1.0, 2.0, np.nan, 4.0, 4.0],
+            'name': ['Acme Ltd', 'Beta Inc', 'Gamma LLC', 'Delta Corp', 'Delta Corp']
+        })
+        current = pd.DataFrame({'id': [1, 2, 4], 'name': ['Acme Ltd', 'Beta Inc', 'Delta Corp']})
+
+        flagged, summary = diff_snapshots(self.comparator, previous, current)
+
+        self.assertEqual(summary['null_ids'], 1)
+        self.assertEqual(summary['duplicate_ids'], 1)
+        self.assertEqual(summary['matched_ids'], 3)
+        self.assertEqual(summary['added_ids'], 0)
+        self.assertEqual(summary['removed_ids'], 0)
+        self.assertEqual(len(flagged), 0)
+
+    def test_null_ids_are_not_duplicates(self):
+        """Previous ids [1, 2, None, 4] have no repeats"""
+        previous = pd.DataFrame({'id': [1, 2, None, 4], 'name': ['a', 'b', 'c', 'd']})
+        current = pd.DataFrame({'id': [1, 2, 4], 'name': ['a', 'b', 'd']})
+
+        _, summary = diff_snapshots(self.comparator, previous, current)
+
+        self.assertEqual(summary['null_ids'], 1)
+        self.assertEqual(summary['duplicate_ids'], 0)
+        self.assertEqual(summary['matched_ids'], 3)
+
+if __name__ == '__main__':
+    unittest.main()